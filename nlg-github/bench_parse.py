@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+import tracemalloc
+from json_stream import loads_fields, CATEGORIES_FIELDS
+
+
+'''
+Parsing benchmark: json.loads against the field-selective reader of json_stream on
+semantic topic widgets of several sizes. The larger widgets repeat the topics of the
+sample file, so they have its shape (sample documents, sentence sentiment spans).
+'''
+
+
+def widget_line(json_file_name, copies):
+    """ One widget line with the topics of json_file_name repeated copies times.
+    """
+
+    with open(json_file_name, 'r') as f:
+        line = f.readline().strip()
+    return '[' + ','.join([line[1:-1]] * copies) + ']'
+
+
+def measure(parse, line, repeat):
+    """ Best wall-clock time (s) and peak traced memory (bytes) of parse(line).
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parse(line)
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    parse(line)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare json.loads with the field-selective reader.')
+    parser.add_argument('json_file_name', nargs='?', default='data/categories.json')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 4, 16], help='topic repetitions per widget')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs, the best one is kept')
+    args = parser.parse_args(argv)
+
+    print('%8s %10s %12s %12s %12s %12s' % ('copies', 'size MB', 'loads ms', 'fields ms', 'loads MB', 'fields MB'))
+    for copies in args.copies:
+        line = widget_line(args.json_file_name, copies)
+        t_loads, m_loads = measure(json.loads, line, args.repeat)
+        t_fields, m_fields = measure(lambda s: loads_fields(s, CATEGORIES_FIELDS), line, args.repeat)
+        print('%8d %10.1f %12.1f %12.1f %12.1f %12.1f' % (copies, len(line) / 1e6, t_loads * 1e3, t_fields * 1e3,
+                                                        m_loads / 1e6, m_fields / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from json_cache import content_key
+from json_methods import mad_based_outlier, mk_test, time_series_analysis, top_cat_words
+from json_process_sementic_topics_alpha import SemanticTopicReport
+from json_process_tempral_trend_func_version import temp_trend_widget
+from json_synthetic import semantic_widget, temporal_widget
+
+
+'''
+Scaling benchmark of the narrators on synthetic widgets (json_synthetic).
+One size is varied at a time along each axis (topics, slots, buzzwords per topic,
+vocabulary), the others staying at their defaults, and every benchmark is run on the
+widget of that size: the best wall time of --repeat runs and the peak memory traced by
+tracemalloc in one more run are recorded, with a digest of the result.
+The exponent column is the log-log slope of the time against the previous size.
+--save writes the measurements to a json baseline; --compare reads one back and reports
+the time and memory ratios, flagging the benchmarks that got slower than --tolerance
+times the baseline (and by more than --min-ms, as sub-millisecond times are noisy)
+or whose results changed; the exit status is then 1.
+'''
+
+
+defaults = {'topics': 12, 'slots': 24, 'buzzwords': 100, 'vocabulary': 2000}
+axes = {'topics': [12, 48, 192, 768],
+        'slots': [24, 96, 384, 1536],
+        'buzzwords': [100, 400, 1600],
+        'vocabulary': [2000, 20000, 200000]}
+
+
+def benchmarks(sizes):
+    """ (name, function) pairs to time on a widget of the given sizes.
+    """
+
+    widget = semantic_widget(**sizes)
+    timebin = temporal_widget(topics=sizes['topics'], slots=sizes['slots'], vocabulary=sizes['vocabulary'])
+
+    count = np.array([[elm['c'], i] for i, elm in enumerate(widget)], dtype=float)
+    prop = count[count[:, 0].argsort()]
+    total = np.sum([elm['c'] for elm in timebin['bins']], axis=0)
+    buzzword_counts = np.array([bzw['c'] for elm in widget for bzw in elm['buzzwords']], dtype=float)
+
+    def temp_trend():
+        out = io.StringIO()
+        temp_trend_widget(timebin, out=out)
+        return out.getvalue()
+
+    return [('mk_test', lambda: mk_test(total)),
+            ('time_series_analysis', lambda: time_series_analysis(total, 'hour')),
+            ('top_cat_words', lambda: top_cat_words(widget, prop, 5)),
+            ('mad_based_outlier', lambda: mad_based_outlier(buzzword_counts)),
+            ('temp_trend', temp_trend),
+            ('semantic_report', lambda: SemanticTopicReport(widget).text)]
+
+
+def digest(result):
+    """ Short content hash of a benchmark result, to notice changed outputs.
+    """
+
+    if isinstance(result, (str, np.ndarray)):
+        return content_key(result)[:12]
+    return content_key(repr(result))[:12]
+
+
+def measure(func, repeat):
+    """ Best wall-clock time (s), peak traced memory (bytes) and digest of the result of func().
+    """
+
+    result = func()  # warm up: lazy imports, memoized labels
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, digest(result)
+
+
+def run(names, repeat):
+    """ Measurements along the axes in names, as a list of dicts.
+    """
+
+    records = []
+    for axis in names:
+        for value in axes[axis]:
+            sizes = dict(defaults, **{axis: value})
+            for bench, func in benchmarks(sizes):
+                seconds, peak, key = measure(func, repeat)
+                records.append({'axis': axis, 'value': value, 'bench': bench,
+                                'seconds': seconds, 'peak_bytes': peak, 'digest': key})
+    return records
+
+
+def exponents(records):
+    """ Log-log slope of the time of each record against the previous size on its axis (None for the first).
+    """
+
+    previous = {}
+    slopes = []
+    for record in records:
+        key = (record['axis'], record['bench'])
+        last = previous.get(key)
+        if last is None or last['seconds'] <= 0 or record['seconds'] <= 0:
+            slopes.append(None)
+        else:
+            slopes.append(math.log(record['seconds'] / last['seconds']) / math.log(record['value'] / last['value']))
+        previous[key] = record
+    return slopes
+
+
+def compare(records, baseline, tolerance, min_seconds=0.0):
+    """ Print the ratios to the baseline records; returns the number of regressions.
+    """
+
+    stored = dict(((r['axis'], r['value'], r['bench']), r) for r in baseline['records'])
+    regressions = 0
+    print('%-10s %8s %-22s %10s %10s  %s' % ('axis', 'value', 'benchmark', 'time x', 'memory x', 'status'))
+    for record in records:
+        old = stored.get((record['axis'], record['value'], record['bench']))
+        if old is None:
+            print('%-10s %8d %-22s %10s %10s  new' % (record['axis'], record['value'], record['bench'], '-', '-'))
+            continue
+        time_ratio = record['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        memory_ratio = record['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else float('inf')
+        status = []
+        if time_ratio > tolerance and record['seconds'] - old['seconds'] > min_seconds:
+            status.append('SLOWER')
+        if record['digest'] != old['digest']:
+            status.append('CHANGED')
+        regressions += bool(status)
+        print('%-10s %8d %-22s %10.2f %10.2f  %s' % (record['axis'], record['value'], record['bench'], time_ratio,
+                                                     memory_ratio, ' '.join(status) or 'ok'))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory of the narrators along the scaling axes.')
+    parser.add_argument('--axes', nargs='+', choices=sorted(axes), default=list(axes), help='axes to run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs, the best one is kept')
+    parser.add_argument('--save', help='write the measurements to this json baseline')
+    parser.add_argument('--compare', help='compare the measurements with this json baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='time ratio above which a benchmark is slower')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='smallest slow-down (ms) reported as slower')
+    args = parser.parse_args(argv)
+
+    records = run(args.axes, args.repeat)
+
+    print('%-10s %8s %-22s %10s %10s %8s  %s' % ('axis', 'value', 'benchmark', 'ms', 'peak MB', 'exponent', 'digest'))
+    for record, slope in zip(records, exponents(records)):
+        print('%-10s %8d %-22s %10.2f %10.2f %8s  %s' % (record['axis'], record['value'], record['bench'],
+                                                       record['seconds'] * 1e3, record['peak_bytes'] / 1e6,
+                                                       '-' if slope is None else '%.2f' % slope, record['digest']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'defaults': defaults,
+                       'records': records}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print('')
+        return 1 if compare(records, baseline, args.tolerance, args.min_ms / 1e3) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import sys
+
+
+'''
+Start-up benchmark of the narration scripts, measured with python -X importtime.
+It compares importing the entry point as it is (scipy is loaded on first use and
+pandas is no longer used) with importing it together with the heavy modules, which
+is what every run paid before.
+'''
+
+
+heavy_modules = ['scipy.stats', 'scipy.signal', 'pandas']
+
+
+def import_time(statement, repeat):
+    """ Best total and per-module cumulative import time (in ms) of a python -c statement.
+    """
+
+    best_total, best_modules = None, {}
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                              stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        total, modules = 0.0, {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            cumulative = int(cumulative) / 1000
+            if not name.startswith('  '):  # top level import, its cumulative time includes its children.
+                total += cumulative
+            modules[name.strip()] = cumulative
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+    return best_total, best_modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the import time of the narration entry point.')
+    parser.add_argument('--module', default='json_process_sementic_topics_alpha', help='entry point module')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the best one is kept')
+    args = parser.parse_args(argv)
+
+    lazy, lazy_modules = import_time('import ' + args.module, args.repeat)
+    eager, eager_modules = import_time('import ' + ', '.join([args.module] + heavy_modules), args.repeat)
+
+    print('import %s: %.1f ms' % (args.module, lazy))
+    print('with %s loaded up front: %.1f ms' % (', '.join(heavy_modules), eager))
+    print('saving at start-up: %.1f ms (%.0f%%)' % (eager - lazy, 100 * (eager - lazy) / eager))
+    for name in heavy_modules:
+        print('  %-12s %8.1f ms, loaded at start-up: %s' % (name, eager_modules.get(name, 0.0),
+                                                            'yes' if name in lazy_modules else 'no'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from json_columnar import SemanticColumns
+from json_profile import Profiler, active, emit_profile, profile_requested, stage
+from json_process_sementic_topics_alpha import SemanticTopicReport
+from json_process_tempral_trend_func_version import temp_trend_widget
+from json_stream import loads_fields, CATEGORIES_FIELDS, TIMEBIN_FIELDS
+
+
+'''
+Batch narration of widget files.
+Every line of a categories.json style file (a list of topics) gets the semantic topic
+narrative, and every line of a temporal.json style file (a timebin with 'bins') the
+temporal trend narrative. Files are spread over a process pool; the narratives are
+written in the sorted order of the input files, and a file that fails is reported
+without stopping the others.
+'''
+
+
+def widget_fields(line):
+    """ The field spec of a widget line: semantic topic widgets are lists, temporal ones objects.
+    """
+
+    if line.lstrip()[:1] == '[':
+        return CATEGORIES_FIELDS
+    return TIMEBIN_FIELDS
+
+
+def narrate(widget, cache=None):
+    """ The narrative of one parsed widget (or one loaded by json_columnar).
+    cache is an optional json_cache.ResultCache.
+    """
+
+    if isinstance(widget, (list, SemanticColumns)):
+        return SemanticTopicReport(widget, cache=cache).text
+
+    out = io.StringIO()
+    temp_trend_widget(widget, out=out, cache=cache)
+    return out.getvalue()
+
+
+def narrate_file(json_file_name):
+    """ Narrate every widget line of a file. Returns (file name, narrative, error message).
+    With NLG_PROFILE set, the profile of the file is emitted (see json_profile).
+    """
+
+    profiler = Profiler() if profile_requested() else None
+    try:
+        texts = []
+        with active(profiler), open(json_file_name, 'r') as f:
+            for line in f:
+                if line.strip():
+                    with stage('parse'):
+                        widget = loads_fields(line, widget_fields(line))
+                    texts.append(narrate(widget))
+        return json_file_name, ''.join(texts), None
+    except Exception as e:
+        return json_file_name, None, '%s: %s' % (type(e).__name__, e)
+    finally:
+        if profiler is not None:
+            emit_profile(profiler.report(), json_file_name)
+
+
+def warm_imports():
+    """ Pool initializer: load the modules the analysis imports on first use, once per worker.
+    """
+
+    import scipy.stats
+
+
+def find_files(paths, pattern='*.json*'):
+    """ Sorted list of the files named by paths, which can be files, directories or glob patterns.
+    """
+
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(f for f in glob.glob(os.path.join(path, pattern)) if os.path.isfile(f))
+        elif glob.has_magic(path):
+            files.update(f for f in glob.glob(path) if os.path.isfile(f))
+        else:
+            files.add(path)
+    return sorted(files)
+
+
+def narrate_files(files, workers=None, chunksize=4):
+    """ Yield narrate_file results for files, in order, using a pool of workers processes.
+    """
+
+    if workers == 1:
+        for json_file_name in files:
+            yield narrate_file(json_file_name)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_imports) as executor:
+        for result in executor.map(narrate_file, files, chunksize=chunksize):
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Narrate directories of widget json(l) files.')
+    parser.add_argument('paths', nargs='+', help='widget files, directories or glob patterns')
+    parser.add_argument('--pattern', default='*.json*', help='file pattern inside directories (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=4, help='files handed to a worker at a time')
+    parser.add_argument('--output', help='write the narratives to this file instead of stdout')
+    parser.add_argument('--errors', help='write the failed files as json lines to this file instead of stderr')
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths, args.pattern)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    errors = open(args.errors, 'w') if args.errors else sys.stderr
+
+    failed = 0
+    t0 = time.time()
+    try:
+        for json_file_name, text, error in narrate_files(files, args.workers, args.chunksize):
+            if error is None:
+                out.write('==> ' + json_file_name + ' <==\n' + text + '\n')
+            else:
+                failed += 1
+                if args.errors:
+                    errors.write(json.dumps({'file': json_file_name, 'error': error}) + '\n')
+                else:
+                    errors.write(json_file_name + ': ' + error + '\n')
+    finally:
+        if args.output:
+            out.close()
+        if args.errors:
+            errors.close()
+    elapsed = time.time() - t0
+
+    sys.stderr.write('%d files (%d failed) in %.2f s: %.1f files/s\n'
+                     % (len(files), failed, elapsed, len(files) / elapsed if elapsed > 0 else 0.0))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+'''
+Content-addressed cache for narrations and the statistics behind them.
+A key is the hash of the content the value was computed from (a widget, a series),
+so a re-sent widget finds its narrative no matter where it comes from, and any
+change to the widget gives a new key: entries never have to be invalidated.
+The values are kept in an in-memory LRU tier and, if a directory is given, in an
+on-disk tier of pickle files that is trimmed to max_bytes, least recently used first.
+'''
+
+
+def _feed(h, obj):
+    """ Feed a canonical byte form of obj into the hash h.
+    """
+
+    if isinstance(obj, np.ndarray):
+        h.update(b'a' + str(obj.dtype).encode() + str(obj.shape).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, bytes):
+        h.update(b'b%d:' % len(obj) + obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        h.update(b's%d:' % len(data) + data)
+    else:
+        # widgets and scalars: key order of the dicts does not change the key.
+        data = json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        h.update(b'j%d:' % len(data) + data)
+
+
+def content_key(*parts):
+    """ Hex digest of parts (arrays, strings, bytes or json-like objects), e.g.
+    content_key('temp_trend', interval, widget).
+    """
+
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """ Two-tier LRU cache: max_items values in memory and, if directory is given,
+    up to max_bytes of pickled values on disk.
+
+    Values handed out from the memory tier are shared, so treat them as read-only.
+    """
+
+    _missing = object()
+
+    def __init__(self, max_items=1024, directory=None, max_bytes=256 * 1024 * 1024):
+        self.max_items = max_items
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()  # key -> size in bytes, least recently used first
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(directory):
+                if name.endswith('.pkl'):
+                    st = os.stat(os.path.join(directory, name))
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+            for mtime, key, size in sorted(entries):
+                self.disk[key] = size
+                self.disk_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key, default=None):
+        """ The value stored under key, or default.
+        """
+
+        with self.lock:
+            value = self.memory.get(key, self._missing)
+            if value is not self._missing:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if key in self.disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        value = pickle.load(f)
+                    os.utime(self._path(key))
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    # removed by another process sharing the directory, or half written.
+                    self.disk_bytes -= self.disk.pop(key)
+                else:
+                    self.disk.move_to_end(key)
+                    self._remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """ Store value under key in both tiers.
+        """
+
+        with self.lock:
+            self._remember(key, value)
+            if self.directory is None:
+                return
+
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(data) > self.max_bytes:
+                return
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))  # readers never see a partial file
+
+            self.disk_bytes += len(data) - self.disk.pop(key, 0)
+            self.disk[key] = len(data)
+            while self.disk_bytes > self.max_bytes:
+                old, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old))
+                except OSError:
+                    pass
+
+    def get_or_compute(self, key, compute):
+        """ The value under key; compute() is called and stored on a miss.
+        """
+
+        value = self.get(key, self._missing)
+        if value is self._missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.directory is not None:
+                for key in self.disk:
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+                self.disk.clear()
+                self.disk_bytes = 0
+
+    def stats(self):
+        """ Hit/miss counters and the size of both tiers.
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else None,
+                    'memory_items': len(self.memory), 'disk_items': len(self.disk),
+                    'disk_bytes': self.disk_bytes, 'evictions': self.evictions}
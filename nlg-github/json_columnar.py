@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+from json_cache import content_key
+from json_stream import loads_fields, CATEGORIES_FIELDS, TIMEBIN_FIELDS
+from json_table import RegionTable, TermMatrix, TopicTable
+
+
+'''
+Binary columnar copies of parsed widgets, for narrating the same widget again.
+write(widget, directory) keeps only what the narrators use, as one .npy file per array
+and a manifest.json with the strings and the scalars:
+  topics      c, n, p, weight                       (one entry per topic)
+  buzzwords   topic, term, term_c, term_n, term_p   (TopicTable columns)
+  regions     region_topic, region, region_c, region_n, region_p
+  timebin     count, positive, negative             (topic x slot matrices)
+  keywords    totals, first, data, indices, indptr  (TermMatrix, CSR)
+load(directory) maps the arrays into memory (np.load(mmap_mode='r')): nothing is decoded
+or copied until the analysis reads it, and SemanticTopicReport, temp_trend_widget and
+json_batch.narrate take the loaded widget in place of the parsed json.
+The manifest also stores the content key of the source widget, used as the cache key.
+
+Convert a widget file (one directory per widget line, widget-0000, widget-0001, ...):
+python3 json_columnar.py data/categories.json data/categories.cols
+'''
+
+
+version = 1
+
+# file names of the RegionTable columns.
+region_files = {'topic': 'region_topic', 'region': 'region', 'c': 'region_c', 'n': 'region_n', 'p': 'region_p'}
+
+
+class TimebinColumns(object):
+    """ A temporal trend widget (timebin) loaded from its columns.
+
+    Indexing works as on the parsed widget for the fields the narrators read:
+    'bucket_start', 'bucket_end', 'interval' and 'bins', whose 'c', 'p' and 'n' are
+    views of the rows of the count, positive and negative matrices. The keywords are
+    the TermMatrix.
+    """
+
+    def __init__(self, count, positive, negative, keywords, start, end, interval, key):
+        self.count = count
+        self.positive = positive
+        self.negative = negative
+        self.keywords = keywords
+        self.key = key
+        self.fields = {'bucket_start': start, 'bucket_end': end, 'interval': interval}
+
+    def __getitem__(self, name):
+        if name == 'bins':
+            return [{'c': c, 'p': p, 'n': n} for c, p, n in zip(self.count, self.positive, self.negative)]
+        return self.fields[name]
+
+    def __contains__(self, name):
+        return name == 'bins' or name in self.fields
+
+
+class SemanticColumns(object):
+    """ A semantic topic widget loaded from its columns: the TopicTable, the RegionTable and
+    the timebin of the topics (the bin of every topic, as TimebinColumns).
+    """
+
+    def __init__(self, table, regions, timebin, key):
+        self.table = table
+        self.regions = regions
+        self.timebin = timebin
+        self.key = key
+
+    def __len__(self):
+        return len(self.table)
+
+
+def _bins_arrays(bins):
+    return {'count': np.array([elm['c'] for elm in bins]),
+            'positive': np.array([elm['p'] for elm in bins]),
+            'negative': np.array([elm['n'] for elm in bins])}
+
+
+def _keywords_arrays(bins):
+    keywords = TermMatrix(bins)
+    return dict((name, getattr(keywords, name)) for name in TermMatrix.arrays), keywords.terms
+
+
+def _save(directory, arrays, manifest):
+    """ Write the arrays and then the manifest, which is replaced last so that a reader
+    never finds a manifest without its arrays.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = dict(manifest, version=version, arrays=sorted(arrays))
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(array))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, 'manifest.json'))
+
+
+def write(widget, directory):
+    """ Write the columns of a parsed widget (semantic topic list or temporal timebin) to directory.
+    """
+
+    key = content_key(widget)
+    if isinstance(widget, list):
+        table = TopicTable(widget)
+        arrays = dict((name, getattr(table, name)) for name in TopicTable.columns)
+
+        regions = RegionTable(widget)
+        arrays.update((region_files[name], getattr(regions, name)) for name in RegionTable.columns)
+
+        # the report analyzes the bin of every topic in its timebin.
+        bins = [elm['timebin']['bins'][i] for i, elm in enumerate(widget)]
+        timebin = widget[0]['timebin']
+        arrays.update(_bins_arrays(bins))
+        keywords, keyword_terms = _keywords_arrays(bins)
+        arrays.update(keywords)
+        manifest = {'kind': 'semantic', 'terms': table.terms, 'region_names': regions.names}
+    else:
+        timebin = widget
+        arrays = _bins_arrays(widget['bins'])
+        keywords, keyword_terms = _keywords_arrays(widget['bins'])
+        arrays.update(keywords)
+        manifest = {'kind': 'temporal'}
+
+    manifest.update({'key': key, 'keyword_terms': keyword_terms, 'bucket_start': timebin['bucket_start'],
+                     'bucket_end': timebin['bucket_end'], 'interval': timebin['interval']})
+    _save(directory, arrays, manifest)
+
+
+def load(directory):
+    """ The widget written to directory, as SemanticColumns or TimebinColumns over memory-mapped arrays.
+    """
+
+    with open(os.path.join(directory, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != version:
+        raise ValueError('%s: columnar format version %r, expected %d' % (directory, manifest.get('version'), version))
+    arrays = dict((name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+                  for name in manifest['arrays'])
+
+    timebin = TimebinColumns(arrays['count'], arrays['positive'], arrays['negative'],
+                             TermMatrix.from_arrays(arrays, manifest['keyword_terms']),
+                             manifest['bucket_start'], manifest['bucket_end'], manifest['interval'], manifest['key'])
+    if manifest['kind'] == 'temporal':
+        return timebin
+
+    regions = dict((name, arrays[region_files[name]]) for name in RegionTable.columns)
+    return SemanticColumns(TopicTable.from_columns(arrays, manifest['terms']),
+                           RegionTable.from_columns(regions, manifest['region_names']), timebin, manifest['key'])
+
+
+def write_file(json_file_name, directory):
+    """ Write every widget line of a file to directory/widget-0000, widget-0001, ...
+    Returns the number of widgets.
+    """
+
+    n = 0
+    with open(json_file_name, 'r') as f:
+        for line in f:
+            if line.strip():
+                fields = CATEGORIES_FIELDS if line.lstrip()[:1] == '[' else TIMEBIN_FIELDS
+                write(loads_fields(line, fields), os.path.join(directory, 'widget-%04d' % n))
+                n += 1
+    return n
+
+
+def load_file(directory):
+    """ Yield the widgets written by write_file, in order.
+    """
+
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('widget-'):
+            yield load(os.path.join(directory, name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a widget file to binary columns for repeat narration.')
+    parser.add_argument('json_file_name', help='widget file, one widget per line')
+    parser.add_argument('directory', help='output directory, one sub-directory per widget')
+    args = parser.parse_args(argv)
+
+    n = write_file(args.json_file_name, args.directory)
+    print('%d widgets written to %s' % (n, args.directory), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+import numpy as np
+from json_methods import _dominant_period, _mk_decision, _mk_score, _periodogram, _trend_wording, seasonal_decompose
+from json_table import TermCounts
+
+
+'''
+Incremental temporal trend analysis for widgets that grow a few bins at a time.
+A TemporalState keeps what temp_trend reads from the widget: the topic x slot count and
+sentiment matrices and the keyword counts (json_table.TermCounts), appended to as slots
+are added, so an update analyzes only the k new slots of the tpc topics (O(tpc * k) in the
+interpreter). The slots taken in before are compared with the values kept for them (list
+equality, at C speed, O(tpc * n) but without building any array); a widget that does not
+continue the state (another start, interval or number of topics, fewer slots, or a revised
+slot) makes it start over.
+
+A TrendState keeps a series (the total count and sentiment of temp_trend, or a topic)
+with the de-periodized trend it was last analyzed with, the Mann-Kendall S of that trend,
+the trend values in sorted order and their tie correction. When the detected period does
+not change, the old trend values stay the same: the new ones are scored against them with
+a binary search each and merged into the sorted values (np.searchsorted/np.insert), which
+is O(k log n) plus an O(n) copy instead of the O(n log n) test.
+What is still taken over the whole series on every update: the periodogram (O(n log n)),
+the seasonal decomposition (O(n)), and in temp_trend the column sums of the matrices and
+the correlations of the topics (vectorized, O(tpc * n)) and the keyword ranking (O(cells)).
+The statuses and narratives are the same as time_series_analysis and temp_trend give on the
+whole widget. Both states can be saved with to_dict and restored with from_dict.
+'''
+
+
+def _ties(t):
+    return t * (t - 1) * (2 * t + 5)
+
+
+def _tie_var(sorted_values):
+    """ Tie correction of the variance of S: the sum of t(t - 1)(2t + 5) over the tie groups,
+    which are the runs of equal values in the sorted values.
+    """
+
+    edges = np.flatnonzero(np.diff(sorted_values) != 0)
+    return np.sum(_ties(np.diff(np.concatenate([[-1], edges, [sorted_values.shape[0] - 1]])).astype(float)))
+
+
+class _Growing(object):
+    """ A float array that grows along its last axis, with room kept for appending
+    (the capacity doubles, so appending k values costs O(k) amortized).
+    """
+
+    def __init__(self, rows=None, values=None):
+        shape = () if rows is None else (rows,)
+        self.buffer = np.zeros(shape + (16,))
+        self.size = 0
+        if values is not None:
+            self.append(values)
+
+    def append(self, values):
+        values = np.asarray(values, dtype=float)
+        k = values.shape[-1]
+        if self.size + k > self.buffer.shape[-1]:
+            buffer = np.zeros(self.buffer.shape[:-1] + (max(2 * self.buffer.shape[-1], self.size + k),))
+            buffer[..., :self.size] = self.buffer[..., :self.size]
+            self.buffer = buffer
+        self.buffer[..., self.size:self.size + k] = values
+        self.size += k
+
+    @property
+    def values(self):
+        return self.buffer[..., :self.size]
+
+
+class TrendState(object):
+    """ Running time_series_analysis of one series. interval is the unit name, e.g. 'hour'.
+    """
+
+    def __init__(self, interval, values=()):
+        self.interval = interval
+        self.series = _Growing(values=values)
+        self.frq = None  # period the trend below was computed with
+        self.trend = np.zeros(0)  # the de-periodized trend (without the NaN ends)
+        self.sorted_trend = np.zeros(0)
+        self.tie_var = 0.0  # _tie_var of the trend
+        self.s = 0.0  # Mann-Kendall S of the trend
+        self._status = None
+
+    @property
+    def values(self):
+        return self.series.values
+
+    def extend(self, values):
+        """ Append new observations to the series.
+        """
+
+        values = np.asarray(values, dtype=float)
+        if values.shape[0]:
+            self.series.append(values)
+            self._status = None
+
+    def _score(self, trend):
+        """ Mann-Kendall S and variance of trend, reusing the score of the previous trend
+        when that is a prefix of it.
+        """
+
+        m = self.trend.shape[0]
+        if m and trend.shape[0] >= m and np.array_equal(trend[:m], self.trend):
+            new = np.sort(trend[m:])
+            less = np.searchsorted(self.sorted_trend, new, side='left')
+            greater = np.searchsorted(self.sorted_trend, new, side='right')
+            s = self.s + np.sum(less - (m - greater))
+            if new.shape[0] > 1:
+                s += _mk_score(trend[None, m:])[0][0]
+
+            # a tie group of t old values that gains u new ones adds f(t + u) - f(t).
+            _, first, added = np.unique(new, return_index=True, return_counts=True)
+            old = (greater - less)[first].astype(float)
+            tie_var = self.tie_var + np.sum(_ties(old + added) - _ties(old))
+            sorted_trend = np.insert(self.sorted_trend, less, new)
+        else:
+            s = _mk_score(trend[None, :])[0][0]
+            sorted_trend = np.sort(trend)
+            tie_var = _tie_var(sorted_trend)
+
+        n = float(trend.shape[0])
+        var_s = (n * (n - 1) * (2 * n + 5) - tie_var) / 18
+
+        self.trend, self.sorted_trend, self.tie_var, self.s = trend, sorted_trend, tie_var, s
+        return s, var_s
+
+    def status(self):
+        """ The [trend, periodicity, apratio, frq, p] record of time_series_analysis.
+        """
+
+        if self._status is not None:
+            return self._status
+
+        x = self.values[None, :]
+        n = x.shape[1]
+        freqcandidate, Pxx_den = _periodogram(x)
+        frq = int(_dominant_period(freqcandidate, Pxx_den, n)[0])
+
+        decomposition = seasonal_decompose(x, freq=frq, model='additive')
+        apratio = np.max(np.abs(decomposition.seasonal), axis=1) / np.mean(x, axis=1)
+        trend = decomposition.trend[0, ~np.isnan(decomposition.trend[0])]
+
+        if frq != self.frq:
+            self.trend = np.zeros(0)
+        s, var_s = self._score(trend)
+        self.frq = frq
+
+        result, h, p, z = _mk_decision(np.array([s]), np.array([var_s]), 0.5)
+        self._status = _trend_wording(str(result[0]), apratio[0], frq, p[0], self.interval)
+        return self._status
+
+    def to_dict(self):
+        return {'interval': self.interval, 'values': self.values.tolist(), 'frq': self.frq,
+                'trend': self.trend.tolist(), 's': float(self.s)}
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls(d['interval'], d['values'])
+        state.frq = d['frq']
+        state.trend = np.asarray(d['trend'], dtype=float)
+        state.sorted_trend = np.sort(state.trend)
+        state.tie_var = _tie_var(state.sorted_trend)
+        state.s = d['s']
+        return state
+
+
+class TemporalState(object):
+    """ The slots of a temporal widget taken in so far, and the TrendStates of its topics
+    and of the total count and sentiment.
+
+    update(l, interval, start) takes the whole, grown widget and reads only the bins added
+    since the last update. count and sent are the topic x slot count and summed sentiment
+    (n + p) matrices and keywords() the TermMatrix of all the slots, which temp_trend uses
+    instead of reading the widget again.
+    """
+
+    def __init__(self):
+        self.slots = 0
+        self.interval = None
+        self.start = None
+        self.bins = []  # the values of the slots taken in, per topic, to check the prefix of the next widget
+        self._count = _Growing(0)
+        self._sent = _Growing(0)
+        self.terms = None  # TermCounts, if the bins have terms
+        self.topics = []
+        self.total = None
+        self.sentiment = None
+        self.sentiment_sum = _Growing()  # summed sentiment per bin, before dividing by the total
+
+    def _reset(self, tpc, interval, start, terms):
+        self.__init__()
+        self.interval = interval
+        self.start = start
+        self.bins = [dict((field, []) for field in (_fields + ('terms',) if terms else _fields)) for _ in range(tpc)]
+        self._count = _Growing(tpc)
+        self._sent = _Growing(tpc)
+        self.terms = TermCounts(tpc) if terms else None
+        self.topics = [TrendState(interval) for _ in range(tpc)]
+        self.total = TrendState(interval)
+        self.sentiment = TrendState(interval)
+
+    @property
+    def count(self):
+        return self._count.values
+
+    @property
+    def sent(self):
+        return self._sent.values
+
+    def keywords(self):
+        return self.terms.matrix()
+
+    def _continues(self, bins, interval, start, keywords):
+        """ Whether bins are the bins taken in so far with slots added: the same unit and
+        topics, and every slot taken in unchanged (a revised slot makes the state start over).
+        """
+
+        if interval != self.interval or start != self.start or len(bins) != len(self.topics):
+            return False
+        if keywords and self.terms is None and bins and 'terms' in bins[0]:
+            return False
+        if not bins or len(bins[0]['c']) < self.slots:
+            return False
+        # the lists of a parsed widget are compared at C speed, without converting them.
+        old = slice(0, self.slots)
+        return all(_same(elm[field][old], taken[field]) for elm, taken in zip(bins, self.bins) for field in taken)
+
+    def _take(self, bins, new):
+        """ Append the slots new of bins to the values, the matrices and the keyword counts.
+        Returns the new columns of the count and sent matrices.
+        """
+
+        for elm, taken in zip(bins, self.bins):
+            for field in taken:
+                taken[field].extend(_values(elm[field][new]))
+        shape = (len(bins), new.stop - new.start)
+        count = np.array([elm['c'][new] for elm in bins], dtype=float).reshape(shape)
+        sent = (np.array([elm['n'][new] for elm in bins], dtype=float).reshape(shape)
+                + np.array([elm['p'][new] for elm in bins], dtype=float).reshape(shape))
+        self._count.append(count)
+        self._sent.append(sent)
+        if self.terms is not None:
+            self.terms.add(bins, new.start)
+        self.slots = new.stop
+        return count, sent
+
+    def update(self, l, interval, start=None, keywords=True):
+        """ Take in the bins of widget l that are new since the last update.
+        interval is the unit name of a bin (the third value of time_unit), start the
+        bucket start of the widget. With keywords=False the keyword counts are not kept
+        (temp_trend with a sketch does not use them).
+        """
+
+        bins = l['bins']
+        if not self._continues(bins, interval, start, keywords):
+            self._reset(len(bins), interval, start, keywords and bool(bins) and 'terms' in bins[0])
+
+        count, sent = self._take(bins, slice(self.slots, len(bins[0]['c']) if bins else 0))
+        for i, x in enumerate(count):
+            self.topics[i].extend(x[np.nonzero(x)])
+
+        # the sums of temp_trend for the new columns (a column is summed down the topics
+        # whatever the other columns, so these are the values of the whole matrix).
+        sumx = np.sum(count, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sumsentx = np.sum(np.divide(sent, count), axis=0)
+        sumsentx[np.argwhere(np.isnan(sumsentx))] = 0
+        self.total.extend(sumx[np.nonzero(sumx)])
+        self.sentiment_sum.append(sumsentx[np.nonzero(sumsentx)])
+        if self.sentiment_sum.size != self.total.values.shape[0]:
+            raise ValueError('the sentiment (%d bins) and count (%d bins) series do not line up'
+                             % (self.sentiment_sum.size, self.total.values.shape[0]))
+        done = self.sentiment.values.shape[0]
+        self.sentiment.extend(self.sentiment_sum.values[done:] / self.total.values[done:])
+
+    def to_dict(self):
+        return {'slots': self.slots, 'interval': self.interval, 'start': self.start, 'bins': self.bins,
+                'topics': [state.to_dict() for state in self.topics],
+                'total': self.total.to_dict(), 'sentiment': self.sentiment.to_dict(),
+                'sentiment_sum': self.sentiment_sum.values.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls()
+        bins = d['bins']
+        state._reset(len(bins), d['interval'], d['start'], bool(bins) and 'terms' in bins[0])
+        # the matrices and keyword counts are taken in again from the saved values.
+        state._take(bins, slice(0, d['slots']))
+        state.topics = [TrendState.from_dict(t) for t in d['topics']]
+        state.total = TrendState.from_dict(d['total'])
+        state.sentiment = TrendState.from_dict(d['sentiment'])
+        state.sentiment_sum = _Growing(values=d['sentiment_sum'])
+        return state
+
+
+# the fields of a bin that temp_trend reads, besides its terms.
+_fields = ('c', 'n', 'p')
+
+
+def _values(values):
+    """ The values of a slice of a bin field as a list (of python numbers for arrays).
+    """
+
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def _same(values, taken):
+    if isinstance(values, list):
+        return values == taken
+    return np.array_equal(values, taken)
@@ -1,17 +1,19 @@
 import numpy as np
-from scipy.stats import norm
-from statsmodels.tsa.seasonal import seasonal_decompose
-from scipy import signal
 import datetime
 from math import ceil
 import math
-from operator import itemgetter
+from collections import OrderedDict, namedtuple
+from json_cache import content_key
+from json_profile import stage
 
 
 '''
 This is a file containing widget methods for analysis
 '''
 
+# components of a seasonal decomposition, one row per series for 2-D input.
+Decomposition = namedtuple('Decomposition', ['observed', 'trend', 'seasonal', 'resid'])
+
 def dict_normalize(d, target=1.0):
     """ Normalize a dictionary.
     """
@@ -53,82 +55,273 @@ def mk_test(x, alpha=0.05):
       >>> x = np.random.rand(100)
       >>> trend,h,p,z = mk_test(x,0.05)
     """
-    n = len(x)
-
-    # calculate S
-    s = 0
-    for k in range(n - 1):
-        for j in range(k + 1, n):
-            s += np.sign(x[j] - x[k])
-
-    # calculate the unique data
-    unique_x = np.unique(x)
-    g = len(unique_x)
-
-    # calculate the var(s)
-    if n == g:  # there is no tie
-        var_s = (n * (n - 1) * (2 * n + 5)) / 18
-    else:  # there are some ties in data
-        tp = np.zeros(unique_x.shape)
-        for i in range(len(unique_x)):
-            tp[i] = sum(x == unique_x[i])
-        var_s = (n * (n - 1) * (2 * n + 5) - np.sum(tp * (tp - 1) * (2 * tp + 5))) / 18
-
-    if s > 0:
-        z = (s - 1) / np.sqrt(var_s)
-    elif s == 0:
-        z = 0
-    elif s < 0:
-        z = (s + 1) / np.sqrt(var_s)
+    trend, h, p, z = mk_test_batch(np.asarray(x, dtype=float)[None, :], alpha)
+
+    return str(trend[0]), h[0], p[0], z[0]
+
+
+def _mk_score(x):
+    """ Mann-Kendall S and its tie-corrected variance for every row of a 2-D array.
+
+    S is obtained from the number of discordant pairs, counted the merge-sort way
+    (Knight 1966): at each level every element of the right half of a block is
+    matched against the sorted left half with a binary search. All rows and blocks
+    of a level are handled by a single np.sort/np.searchsorted call, so the
+    interpreter only loops over the log2(n) levels. NaN entries are missing values.
+    """
+    m, width = x.shape
+    rows, pos = np.nonzero(~np.isnan(x))
+    vals = x[rows, pos]
+    n = np.bincount(rows, minlength=m).astype(float)
+
+    # group equal values of the same row into runs (the ties) and rank them within the row.
+    order = np.lexsort((vals, rows))
+    srow, sval = rows[order], vals[order]
+    new_run = np.ones(order.shape[0], dtype=bool)
+    new_run[1:] = (srow[1:] != srow[:-1]) | (sval[1:] != sval[:-1])
+    run_id = np.cumsum(new_run) - 1
+    run_row = srow[new_run]
+    tp = np.bincount(run_id).astype(float)  # size of each tie group
+    row_first_run = np.searchsorted(run_row, np.arange(m))
+    rank = np.empty(order.shape[0], dtype=np.int64)
+    rank[order] = run_id - row_first_run[srow]
+
+    tie_pairs = np.bincount(run_row, weights=tp * (tp - 1) / 2, minlength=m)
+    tie_var = np.bincount(run_row, weights=tp * (tp - 1) * (2 * tp + 5), minlength=m)
+
+    # count the discordant pairs, i.e. x[k] > x[j] for k < j.
+    disc = np.zeros(m)
+    w = 1
+    while w < width:
+        blk = rows * (width // (2 * w) + 1) + pos // (2 * w)
+        left = (pos // w) % 2 == 0
+        keys = np.sort(blk[left] * width + rank[left])
+        rblk = blk[~left]
+        upper = np.searchsorted(keys, (rblk + 1) * width, side='left')
+        lower = np.searchsorted(keys, rblk * width + rank[~left], side='right')
+        disc += np.bincount(rows[~left], weights=upper - lower, minlength=m)
+        w *= 2
+
+    # concordant - discordant, where concordant = all pairs - tied pairs - discordant.
+    s = n * (n - 1) / 2 - tie_pairs - 2 * disc
+    var_s = (n * (n - 1) * (2 * n + 5) - tie_var) / 18
+
+    return s, var_s
+
+
+def mk_test_batch(x, alpha=0.05):
+    """ Mann-Kendall test for every row of a 2-D array (e.g. topics x slots).
+
+    Rows of different length can be right-padded with NaN, which is ignored.
+    Returns the arrays trend, h, p and z, one entry per row, with the same values
+    as calling mk_test on each row.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    s, var_s = _mk_score(x)
+
+    return _mk_decision(s, var_s, alpha)
+
+
+def _mk_decision(s, var_s, alpha):
+    """ trend, h, p and z of the Mann-Kendall test from the arrays of S and its variance.
+    """
+    # scipy is only needed here, so it is imported on the first test instead of at start-up.
+    from scipy.stats import norm
+
+    sd = np.sqrt(var_s)
+    z = np.zeros(s.shape)
+    np.divide(s - 1, sd, out=z, where=s > 0)
+    np.divide(s + 1, sd, out=z, where=s < 0)
 
     # calculate the p_value
     p = 2 * (1 - norm.cdf(abs(z)))  # two tail test
     h = abs(z) > norm.ppf(1 - alpha / 2)
 
-    if (z < 0) and h:
-        trend = 'downward trend'
-    elif (z > 0) and h:
-        trend = 'upward trend'
-    else:
-        trend = 'neither obvious upward nor downward trend'
+    trend = np.where((z < 0) & h, 'downward trend',
+                     np.where((z > 0) & h, 'upward trend', 'neither obvious upward nor downward trend'))
 
     return trend, h, p, z
 
-def time_series_analysis(x, interval):
+
+def time_series_analysis(x, interval, cache=None):
     """ input is an np array (series) and its unit name in string.
     """
 
-    avglvl = np.mean(x)
-    # periodicity analysis, which employ fourier transformation to detect possible
-    # frequencies/periodicity in a series.
-    # details can be checked at:
-    # http://www.l3s.de/~anand/tir14/lectures/ws14-tir-foundations-2.pdf
-    freqcandidate, Pxx_den = signal.periodogram(x)
+    return time_series_analysis_batch([x], interval, cache=cache)[0]
+
+
+def time_series_analysis_batch(xs, interval, cache=None):
+    """ time_series_analysis for many series at once, e.g. every topic of a widget.
+
+    xs is a 2-D array with one series per row, or a list of 1-D series of any length.
+    Series of the same length share one rFFT, and series that also share the detected
+    period share one decomposition and one Mann-Kendall call.
+    Returns the [trend, periodicity, apratio, frq, p] record of each series, in order.
+    With a ResultCache as cache, the records of series seen before are not recomputed.
+    """
+
+    with stage('time_series_analysis'):
+        return _time_series_analysis_batch(xs, interval, cache)
+
+
+def _time_series_analysis_batch(xs, interval, cache):
+    xs = [np.asarray(x, dtype=float) for x in xs]
+    status = [None] * len(xs)
+
+    keys = []
+    if cache is not None:
+        keys = [content_key('time_series_analysis', interval, x) for x in xs]
+        status = [cache.get(key) for key in keys]
+
+    by_length = {}
+    for i, x in enumerate(xs):
+        if status[i] is None:
+            by_length.setdefault(x.shape[0], []).append(i)
+
+    for n, ind in by_length.items():
+        x = np.array([xs[i] for i in ind])
+        avglvl = np.mean(x, axis=1)
+
+        # periodicity analysis, which employ fourier transformation to detect possible
+        # frequencies/periodicity in a series.
+        # details can be checked at:
+        # http://www.l3s.de/~anand/tir14/lectures/ws14-tir-foundations-2.pdf
+        with stage('periodogram'):
+            freqcandidate, Pxx_den = _periodogram(x)
+            frq = _dominant_period(freqcandidate, Pxx_den, n)
+
+        for f in np.unique(frq):
+            sub = np.nonzero(frq == f)[0]
+
+            # Use the found frequency to conduct seasonality decomposition
+            with stage('decomposition'):
+                decomposition = seasonal_decompose(x[sub], freq=int(f), model='additive')
+
+            # Check the amplification of fluctuation.
+            amplification = np.max(np.abs(decomposition.seasonal), axis=1)
+            apratio = amplification / avglvl[sub]
+            oritrend = decomposition.trend[:, ~np.isnan(decomposition.trend[0])]
+
+            # Use mk_test the analyze the trend that has been de-periodized.
+            with stage('mann_kendall'):
+                trend, h, p, z = mk_test_batch(oritrend, alpha=0.5)
+
+            for k, i in enumerate(sub):
+                status[ind[i]] = _trend_wording(str(trend[k]), apratio[k], int(f), p[k], interval)
+                if cache is not None:
+                    cache.put(keys[ind[i]], status[ind[i]])
+
+    return status
+
+
+def _periodogram(x):
+    """ scipy.signal.periodogram (boxcar window, constant detrend, density scaling)
+    of every row of x, from one rFFT along the last axis.
+    """
+
+    n = x.shape[-1]
+    spec = np.fft.rfft(x - np.mean(x, axis=-1, keepdims=True), axis=-1)
+    Pxx_den = (spec.real ** 2 + spec.imag ** 2) / n
+    if n % 2:
+        Pxx_den[..., 1:] *= 2
+    else:
+        Pxx_den[..., 1:-1] *= 2
+
+    return np.fft.rfftfreq(n), Pxx_den
+
+
+def _dominant_period(freqcandidate, Pxx_den, n):
+    """ The strongest period of each row that is shorter than the whole series.
+
+    A rejected peak is deleted from the spectrum but not from the frequency grid,
+    so the next peak is looked up at its position in the shortened spectrum.
+    This is how the original single-series loop worked, and it is kept so that
+    the periods (and the narratives) stay the same.
+    """
+
+    pxx = Pxx_den.copy()
+    dropped = np.zeros(pxx.shape, dtype=bool)
+    frq = np.zeros(pxx.shape[0], dtype=int)
+
+    todo = np.arange(pxx.shape[0])
+    while todo.shape[0] > 0:
+        if dropped[todo].all(axis=1).any():
+            raise ValueError('no periodicity shorter than the series (length %d) found' % n)
+
+        tgt_ind = np.argmax(pxx[todo], axis=1)
+        shifted = tgt_ind - np.cumsum(dropped[todo], axis=1)[np.arange(todo.shape[0]), tgt_ind]
+        freq = freqcandidate[shifted]
+        if np.any(freq == 0):
+            raise ValueError('no periodicity shorter than the series (length %d) found' % n)
+
+        # Ignore the periodicity longer than the whole series.
+        found = np.round(1 / freq) < n
+        frq[todo[found]] = (1 / freq[found]).astype(int)
+
+        rejected = todo[~found]
+        dropped[rejected, tgt_ind[~found]] = True
+        pxx[rejected, tgt_ind[~found]] = -np.inf
+        todo = rejected
+
+    return frq
+
+
+def seasonal_decompose(x, freq, model='additive'):
+    """ Classical seasonal decomposition (additive or multiplicative) with period freq.
 
-    tgt_ind = np.argmax(Pxx_den)
-    # Ignore the periodicity longer than the whole series.
-    while round(1 / freqcandidate[np.argmax(Pxx_den)]) >= x.shape[0]:
-        Pxx_den = np.delete(Pxx_den, tgt_ind)
-        tgt_ind = np.argmax(Pxx_den)
+    x is one series or a 2-D stack with one series per row. The trend is the centred
+    moving average (2 x freq for an even freq) taken from cumulative sums, and the
+    seasonal component the mean of each phase, found by reshaping the detrended
+    series into whole cycles. The trend is NaN where the window does not fit, as in
+    statsmodels.tsa.seasonal.seasonal_decompose(x, period=freq, model=model).
+    """
 
-    frq = int(1 / freqcandidate[np.argmax(Pxx_den)])
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    multiplicative = model.startswith('m')
+    if n < 2 * freq:
+        raise ValueError('x must have 2 complete cycles requires %d observations. x only has %d observation(s)' % (2 * freq, n))
+    if multiplicative and np.any(x <= 0):
+        raise ValueError('Multiplicative seasonality is not appropriate for zero and negative values')
+
+    # centred moving average. Sums of the counts are exact, so equal windows give equal trend values.
+    csum = np.zeros(x.shape[:-1] + (n + 1,))
+    np.cumsum(x, axis=-1, out=csum[..., 1:])
+    window = csum[..., freq:] - csum[..., :-freq]
+    half = freq // 2
+    trend = np.full(x.shape, np.nan)
+    if freq % 2:
+        trend[..., half:n - half] = window / freq
+    else:
+        trend[..., half:n - half] = (window[..., :-1] + window[..., 1:]) / (2 * freq)
 
-    # Use the found frequency to conduct seasonality decomposition
-    decomposition = seasonal_decompose(x, freq=frq, model='additive')
+    if multiplicative:
+        detrended = x / trend
+    else:
+        detrended = x - trend
+
+    # mean of each phase over the cycles; the missing ends and the last partial cycle are NaN.
+    cycles = -(-n // freq)
+    padded = np.full(x.shape[:-1] + (cycles * freq,), np.nan)
+    padded[..., :n] = detrended
+    period_averages = np.nanmean(padded.reshape(x.shape[:-1] + (cycles, freq)), axis=-2)
+    if multiplicative:
+        period_averages /= np.mean(period_averages, axis=-1, keepdims=True)
+    else:
+        period_averages -= np.mean(period_averages, axis=-1, keepdims=True)
 
-    # you can visialize the decomposition result here:
-    #decplot = decomposition.plot()
-    #decplot.show()
+    seasonal = np.tile(period_averages, cycles)[..., :n]
+    if multiplicative:
+        resid = detrended / seasonal
+    else:
+        resid = detrended - seasonal
 
-    # Check the amplification of fluctuation.
-    amplification = max(abs(decomposition.seasonal))
-    apratio = amplification / avglvl
-    oritrend = decomposition.trend[~np.isnan(decomposition.trend)]
+    return Decomposition(x, trend, seasonal, resid)
 
-    # Use mk_test the analyze the trend that has been de-periodized.
-    trend, h, p, z = mk_test(oritrend, alpha=0.5)
 
-    # Matching proper wordings to various results.
+def _trend_wording(trend, apratio, frq, p, interval):
+    """ Matching proper wordings to the results of one series.
+    """
 
     if p < 0.1:
         trend = 'an overall significant ' + trend
@@ -152,15 +345,16 @@ def time_series_analysis(x, interval):
     return [trend, periodicity, apratio, frq, p]
 
 
-def time_unit(start, end, interval):
+def time_unit(start, end, interval, tz=None):
     """ translate the time (micro-seconds to a nature language style.)
+    tz is the time zone of the dates (see _tzinfo), the local time of the host by default.
     """
 
     month_list = [0, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'July', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 
-    st = datetime.datetime.fromtimestamp(start / 1000).strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
+    st = datetime.datetime.fromtimestamp(start / 1000, _tzinfo(tz)).strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
 
-    ed = datetime.datetime.fromtimestamp(end / 1000).strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
+    ed = datetime.datetime.fromtimestamp(end / 1000, _tzinfo(tz)).strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
 
     minu = 60
     hr = 60
@@ -240,63 +434,214 @@ def Time_judge_str(st):
     return st
 
 
-def Time_Slot_Trans(num, st, ed, interval, intdate):
+def Time_Slot_Trans(num, st, ed, interval, intdate, tz=None):
     """ translate the time unit in a nature language style.
     """
 
+    return slot_labels(st, interval, intdate, num + 1, tz)[num]
 
-    Time_Slot_dt = datetime.datetime.fromtimestamp(st / 1000) + datetime.timedelta(seconds = num * interval / 1000)
-    Time_Slot = Time_Slot_dt.strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
-
-    month_list = [0, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'July', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 
-    #time_metric_list = ['second', 'minute', 'hour', 'day', 'week', 'month', 'season', 'year']
+# bulk labels of the time slots, see slot_labels.
+_label_units = ('second', 'minute', 'hour', 'day', 'week', 'month', 'season', 'year')
+_label_memo = OrderedDict()
+_label_memo_size = 64
 
-    if intdate == 'season':
-        month = int(Time_Slot[1])
-        sea, mon = divmod(month, 3)
-        if mon > 0:
-            sea += 1
-        rst_Time_Slot = 'Q'+str(sea) + ' ' + Time_Slot[0]
+# the pieces of a label as Time_Slot_Trans writes them, looked up by value.
+_months = np.array(['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'July', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], dtype=object)
+_days = np.array([''] + [Date_judge_str(' %02d' % d) for d in range(1, 32)], dtype=object)
+_hours = np.array([''] + [Time_judge_str(' %02d' % h) for h in range(1, 13)], dtype=object)
+_sixty = np.array([' %02d' % m for m in range(60)], dtype=object)
+_ampm = np.array([' AM', ' PM'], dtype=object)
+_weeks = np.array(['', '1st', '2nd', '3rd', '4th', '5th', '6th'], dtype=object)
 
-    elif intdate == 'year':
 
-        rst_Time_Slot = str(Time_Slot[0])
+def _tzinfo(tz):
+    """ tzinfo of tz, which can be None (the local time of the host), a tzinfo or an IANA name.
+    """
 
+    if isinstance(tz, str):
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(tz)
+    return tz
 
-    elif intdate == 'week':
-        week_num = week_of_month(Time_Slot_dt)
 
-        rst_Time_Slot = 'the ' + Date_judge_str(str(week_num)) + ' week of ' + month_list[int(Time_Slot[1])] + ', ' + str(Time_Slot[0])
+def slot_labels(start, interval, unit, n, tz=None):
+    """ Labels of the time slots 0 .. n-1 of a timebin, label i being Time_Slot_Trans(i, ...).
 
-    elif intdate == 'month':
+    start is the bucket start in ms, interval the slot length in ms and unit the name of a slot
+    (the third value of time_unit). The wall-clock time of start is taken in the time zone tz
+    (see _tzinfo) and the slots are added to it as in Time_Slot_Trans, so the labels count
+    wall-clock time from the start. All slots are computed at once with datetime64 arithmetic,
+    and the labels are memoized by (start, interval, unit, tz); the returned array is shared.
+    """
 
-        rst_Time_Slot = month_list[int(Time_Slot[1])] + ', ' + str(Time_Slot[0])
+    if unit not in _label_units:
+        raise ValueError('no slot labels for the unit %r' % unit)
 
+    key = (start, interval, unit, tz)
+    labels = _label_memo.get(key)
+    if labels is not None and labels.shape[0] >= n:
+        _label_memo.move_to_end(key)
+        return labels[:n]
 
-    elif intdate == 'day':
+    begin = np.datetime64(datetime.datetime.fromtimestamp(start / 1000, _tzinfo(tz)).replace(tzinfo=None), 'us')
+    num = np.arange(n, dtype=np.int64)
+    if float(interval).is_integer():
+        offset = num * (int(interval) * 1000)
+    else:
+        offset = np.round(num * interval / 1000 * 1e6).astype(np.int64)  # as timedelta(seconds=...) rounds
+    t = begin + offset.astype('timedelta64[us]')
+
+    year = (t.astype('datetime64[Y]').astype(np.int64) + 1970).astype(str).astype(object)
+    month_start = t.astype('datetime64[M]')
+    month = month_start.astype(np.int64) % 12 + 1
+    day_start = t.astype('datetime64[D]')
+    day = (day_start - month_start.astype('datetime64[D]')).astype(np.int64) + 1
+    seconds = (t - day_start).astype('timedelta64[s]').astype(np.int64)
+    hour = seconds // 3600
+
+    if unit == 'season':
+        labels = 'Q' + ((month + 2) // 3).astype(str).astype(object) + ' ' + year
+    elif unit == 'year':
+        labels = year
+    elif unit == 'week':
+        # week_of_month: the weekday (Monday 0) of the first of the month, 1970-01-01 being a Thursday.
+        first_weekday = (month_start.astype('datetime64[D]').astype(np.int64) + 3) % 7
+        labels = 'the ' + _weeks[(day + first_weekday + 6) // 7] + ' week of ' + _months[month] + ', ' + year
+    elif unit == 'month':
+        labels = _months[month] + ', ' + year
+    else:
+        labels = _months[month] + _days[day]
+        clock = ',' + _hours[(hour + 11) % 12 + 1]
+        if unit == 'hour':
+            labels = labels + clock + ' ' + _ampm[hour // 12]
+        elif unit == 'minute':
+            labels = labels + clock + ':' + _sixty[seconds // 60 % 60] + _ampm[hour // 12]
+        elif unit == 'second':
+            labels = labels + clock + ':' + _sixty[seconds // 60 % 60] + ':' + _sixty[seconds % 60] + _ampm[hour // 12]
+        labels = labels + ', ' + year
+
+    _label_memo[key] = labels
+    while len(_label_memo) > _label_memo_size:
+        _label_memo.popitem(last=False)
+    return labels
+
+
+def _stack(series):
+    """ 2-D array with one series per row, right-padded with NaN to the longest one.
+    """
 
-        rst_Time_Slot = month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ', ' + str(Time_Slot[0])
+    series = [np.asarray(x, dtype=float) for x in series]
+    x = np.full((len(series), max([y.shape[0] for y in series] + [0])), np.nan)
+    for i, y in enumerate(series):
+        x[i, :y.shape[0]] = y
+    return x
 
-    elif intdate == 'hour':
 
+def pearson_to(series, y):
+    """ Pearson correlation of every series (a list of 1-D series of any length, or the rows of
+    a NaN-padded 2-D array) with the series y, in one vectorized pass.
 
-        rst_Time_Slot = month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(
-            str(Time_Slot[3])) + ' ' + Time_Slot[4] + ', ' + str(Time_Slot[0])
+    The values are those of pd.Series(x).corr(pd.Series(y)): the two series are aligned on
+    their positions (so only the first min(len) values count), positions where either is NaN
+    are left out, and fewer than two pairs or a constant series give NaN.
+    """
 
+    x = series if isinstance(series, np.ndarray) and series.ndim == 2 else _stack(series)
+    y = np.asarray(y, dtype=float)
+    width = min(x.shape[1], y.shape[0])
+    x = x[:, :width]
+    y = np.broadcast_to(y[:width], x.shape)
+
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    n = np.sum(valid, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = np.where(valid, x - (np.sum(np.where(valid, x, 0), axis=1) / n)[:, None], 0)
+        dy = np.where(valid, y - (np.sum(np.where(valid, y, 0), axis=1) / n)[:, None], 0)
+        r = np.sum(dx * dy, axis=1) / np.sqrt(np.sum(dx * dx, axis=1) * np.sum(dy * dy, axis=1))
+    r = np.clip(r, -1, 1)
+    r[n < 2] = np.nan
+    return r
+
+
+def correlation_matrix(series, block=512):
+    """ Pearson correlation of every pair of series (aligned as in pearson_to), as a symmetric
+    matrix. The pairs are taken block x block, each block from a few matrix products of the
+    sums over the positions valid in both series, so memory stays O(block x length).
+    """
 
-    elif intdate == 'minute':
+    x = series if isinstance(series, np.ndarray) and series.ndim == 2 else _stack(series)
+    m = x.shape[0]
+    valid = ~np.isnan(x)
+    v = valid.astype(float)
+    with np.errstate(invalid='ignore'):
+        # centring each series first keeps the sums below from cancelling.
+        x0 = np.where(valid, x - np.nanmean(np.where(valid, x, np.nan), axis=1)[:, None], 0)
+    x2 = x0 * x0
+
+    r = np.empty((m, m))
+    for a in range(0, m, block):
+        rows = slice(a, a + block)
+        for b in range(a, m, block):
+            cols = slice(b, b + block)
+            n = v[rows] @ v[cols].T
+            sx = x0[rows] @ v[cols].T
+            sy = v[rows] @ x0[cols].T
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cov = x0[rows] @ x0[cols].T - sx * sy / n
+                var = (x2[rows] @ v[cols].T - sx * sx / n) * (v[rows] @ x2[cols].T - sy * sy / n)
+                rr = np.clip(cov / np.sqrt(var), -1, 1)
+            rr[n < 2] = np.nan
+            r[rows, cols] = rr
+            r[cols, rows] = rr.T
+    return r
+
+
+def related_pairs(r, k, threshold=0.7):
+    """ The k most correlated pairs (i, j, r) with i < j and r >= threshold of a correlation matrix.
+    """
 
-        rst_Time_Slot = month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(str(Time_Slot[3])) + ':' +str(Time_Slot[5]) + '' + Time_Slot[4] + ', ' + str(Time_Slot[0])
+    i, j = np.triu_indices(r.shape[0], 1)
+    values = r[i, j]
+    keep = np.flatnonzero(values >= threshold)
+    top = keep[top_k(values[keep], k)]
+    return [(int(i[t]), int(j[t]), float(values[t])) for t in top]
 
 
-    elif intdate == 'second':
+def top_k(values, k, tiebreak=None):
+    """ Indices of the k largest values, the largest first, in O(n + k log k).
 
-        rst_Time_Slot = month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(
-            str(Time_Slot[3])) + ':' + str(Time_Slot[5]) + ':' + str(Time_Slot[6]) + Time_Slot[4] + ', ' + str(Time_Slot[0])
+    Equal values come in ascending order of tiebreak (distinct keys, e.g. positions of first
+    appearance) or, without it, of their index: the order sorted(..., reverse=True) gives.
+    The k-th largest value is found with np.partition and only the values above it, plus
+    as many of the values equal to it as needed, are sorted. NaN ranks as -inf (last), so that
+    exactly min(k, n) indices always come back.
+    """
 
-    return rst_Time_Slot
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        # NaN is neither above nor equal to the k-th value and would be dropped.
+        values = np.where(np.isnan(values), -np.inf, values)
+    n = values.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if k < n:
+        kth = np.partition(values, n - k)[n - k]
+        above = np.flatnonzero(values > kth)
+        equal = np.flatnonzero(values == kth)
+        need = k - above.shape[0]
+        if tiebreak is None:
+            equal = equal[:need]
+        elif need < equal.shape[0]:
+            equal = equal[np.argpartition(np.asarray(tiebreak)[equal], need - 1)[:need]]
+        candidates = np.concatenate([above, equal])
+    else:
+        candidates = np.arange(n)
 
+    secondary = candidates if tiebreak is None else np.asarray(tiebreak)[candidates]
+    return candidates[np.lexsort((secondary, -values[candidates]))]
 
 
 def top_cat_words(l, prop, words_display_num):
@@ -307,9 +652,9 @@ def top_cat_words(l, prop, words_display_num):
     for i in range(prop.shape[0] - 1, -1, -1):
         curbw = l[int(prop[i][1])]['buzzwords']
         tt_count = l[int(prop[i][1])]['c']
-        curbw = sorted(curbw, key=itemgetter('c'), reverse=True)
+        top = top_k(np.array([bw['c'] for bw in curbw]), words_display_num)
         sub_count_topics = []
-        for j in range(words_display_num):
+        for j in top:
             ct = curbw[j]['c']
             word = curbw[j]['term'].replace('_', ' ')
             sub_count_topics.append([ct, word, tt_count])
@@ -317,17 +662,53 @@ def top_cat_words(l, prop, words_display_num):
     return count_topics
 
 
+def _median(x):
+    """ np.median along the first axis, from a selection (np.partition) of the middle element(s).
+    """
+
+    x = np.asarray(x, dtype=float)
+    n = x.shape[0]
+    if n == 0:
+        return np.median(x, axis=0)
+    # the selection runs along contiguous rows, one per series.
+    series = np.ascontiguousarray(np.moveaxis(x, 0, -1))
+    half = n // 2
+    part = np.partition(series, half, axis=-1)
+    median = part[..., half]
+    if n % 2 == 0:
+        # the other middle element is the largest of the lower part.
+        median = (np.max(part[..., :half], axis=-1) + median) / 2.0
+    # like np.median, a series with a NaN has a NaN median.
+    return np.where(np.isnan(series).any(axis=-1), np.nan, median)
+
+
 def mad_based_outlier(points, thresh=3.5):
     """ Outlier detection algorithm (MAD).
     """
 
-    if len(points.shape) == 1:
-        points = points[:,None]
-    median = np.median(points, axis=0)
-    diff = np.sum((points - median)**2, axis=-1)
-    diff = np.sqrt(diff)
-    med_abs_deviation = np.median(diff)
+    with stage('mad_based_outlier'):
+        if len(points.shape) == 1:
+            points = points[:,None]
+        median = _median(points)
+        diff = np.sum((points - median)**2, axis=-1)
+        diff = np.sqrt(diff)
+        med_abs_deviation = _median(diff)
+
+        modified_z_score = 0.6745 * diff / med_abs_deviation
+
+    return modified_z_score > thresh
+
+
+def mad_based_outlier_batch(points, thresh=3.5):
+    """ mad_based_outlier of every column of points (an n x k array) at once, each column
+    being a separate series of n values. Returns the n x k outlier mask.
+    """
+
+    with stage('mad_based_outlier'):
+        points = np.asarray(points, dtype=float)
+        diff = np.sqrt((points - _median(points))**2)
+        med_abs_deviation = _median(diff)
 
-    modified_z_score = 0.6745 * diff / med_abs_deviation
+        modified_z_score = 0.6745 * diff / med_abs_deviation
 
     return modified_z_score > thresh
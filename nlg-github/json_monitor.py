@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from json_methods import _mk_decision, _mk_score, slot_labels, time_unit
+from json_render import write
+
+
+'''
+Online monitoring of a live feed of time bins: the statistics temp_trend narrates are
+kept over the last window bins of every topic and of the total, and a sentence is
+written only when one of their classifications changes.
+The feed has one json line per time bin, with the counts of the topics in that bin:
+  {"bucket_start": 1480974900000, "interval": 3600000,
+   "bins": [{"topic_id": 0, "c": 12, "p": 9, "n": -4}, ...]}
+('interval' can also be given on the command line; a topic missing from a bin has no
+documents in it, and a new topic is taken as having had none before. A line that is not
+a bin is skipped, and reported on stderr.)
+
+The counts and sentiment of the last window bins are kept in ring buffers, one row per
+topic and one for the total, and every bin updates, for all rows at once:
+  - the Mann-Kendall S and tie-corrected variance of the counts (trend direction):
+    the pairs of the dropped bin are taken out and those of the new bin added, O(window);
+  - a sliding DFT of the counts (periodicity strength): the coefficients of the
+    replaced position are corrected, O(window), and recomputed exactly every window
+    bins so that rounding does not accumulate;
+  - the sums of the counts, of the sentiment and of the products with the total
+    (average sentiment and topic vs total correlation), O(1).
+The work per bin is thus bounded by the window, whatever the length of the feed.
+The classifications, made once a row has window bins, are those of temp_trend applied
+to the window: the trend wording of the Mann-Kendall test (on the counts as they are,
+without removing the period first), the strength of the strongest period shorter than
+the window (amplitude over mean level, as the seasonal amplitude ratio), whether the
+average sentiment is positive, and the relation of the topic's counts with the total.
+
+Watch a file that is being appended to, or stdin:
+python3 json_monitor.py feed.jsonl --follow --window 96
+'''
+
+
+corrwords = ['strongly related', 'weakly related', 'not related', 'weakly contrary', 'strongly contrary']
+
+
+def _tie_term(t):
+    """ The term of a tie group of size t in the Mann-Kendall variance.
+    """
+
+    return t * (t - 1) * (2 * t + 5)
+
+
+def _relation(r):
+    # the bands of temp_trend: >= 0.7, >= 0.3, >= -0.3, >= -0.7 and below.
+    return corrwords[4 - int(np.searchsorted([-0.7, -0.3, 0.3, 0.7], r, side='right'))]
+
+
+def _periodicity(ratio):
+    if ratio < 0.01 or np.isnan(ratio):
+        return ''
+    if ratio < 0.05:
+        return 'slight'
+    if ratio < 0.15:
+        return 'moderate'
+    return 'evident'
+
+
+class RollingTrends(object):
+    """ Rolling statistics of the counts and sentiment of topics and of their total over the
+    last window bins (ring buffers of window columns; row 0 is the total).
+    """
+
+    def __init__(self, window=96):
+        if window < 4:
+            raise ValueError('window must be at least 4 bins, not %r' % window)
+        self.window = window
+        self.rows = {}  # topic id -> row
+        self.count = np.full((1, window), np.nan)
+        self.sentiment = np.full((1, window), np.nan)
+        self.head = 0  # the position of the next bin
+        self.bins = 0
+        self.s = np.zeros(1)  # Mann-Kendall S of every row
+        self.ties = np.zeros(1)  # sum of the tie terms of every row
+        self.dft = np.zeros((1, window), dtype=complex)  # DFT of every row over the ring positions
+        self.sum_c = np.zeros(1)
+        self.sum_c2 = np.zeros(1)
+        self.sum_total = np.zeros(1)  # sum of the count times the total count
+        self.sum_sentiment = np.zeros(1)
+
+    def _add_rows(self, k):
+        """ k new topics, with no documents in the bins seen so far.
+        """
+
+        empty = np.where(np.isnan(self.count[:1]), np.nan, 0.0)
+        self.count = np.vstack([self.count] + [empty] * k)
+        self.sentiment = np.vstack([self.sentiment] + [empty] * k)
+        for name in ('s', 'ties', 'sum_c', 'sum_c2', 'sum_total', 'sum_sentiment'):
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(k)]))
+        self.dft = np.vstack([self.dft, np.zeros((k, self.window), dtype=complex)])
+        self.refresh()
+
+    def refresh(self):
+        """ Recompute every statistic from the ring buffers.
+        """
+
+        valid = ~np.isnan(self.count)
+        count = np.where(valid, self.count, 0)
+        chronological = np.roll(self.count, -self.head, axis=1)
+        s, var_s = _mk_score(chronological)
+        n = np.sum(valid, axis=1)
+        self.s = s
+        self.ties = _tie_term(n) - 18 * var_s
+        self.dft = np.fft.fft(count, axis=1)
+        self.sum_c = np.sum(count, axis=1)
+        self.sum_c2 = np.sum(count * count, axis=1)
+        self.sum_total = count @ count[0]
+        self.sum_sentiment = np.sum(np.where(valid, self.sentiment, 0), axis=1)
+
+    def update(self, counts, sentiments):
+        """ Append a bin: the count and sentiment (p + n) of the topics, as dicts by topic id.
+        """
+
+        new = [topic for topic in counts if topic not in self.rows]
+        for topic in new:
+            self.rows[topic] = len(self.rows) + 1
+        if new:
+            self._add_rows(len(new))
+
+        x = np.zeros(len(self.rows) + 1)
+        y = np.zeros(len(self.rows) + 1)
+        for topic, c in counts.items():
+            x[self.rows[topic]] = c
+            y[self.rows[topic]] = sentiments.get(topic, 0)
+        x[0] = np.sum(x[1:])
+        y[0] = np.sum(y[1:])
+
+        h = self.head
+        old = self.count[:, h].copy()
+        old_total = old[0]
+        full = ~np.isnan(old)
+        with np.errstate(invalid='ignore'):
+            # take out the pairs and the tie group of the dropped bin (all later than it).
+            if full.any():
+                self.s -= np.where(full, np.nansum(np.sign(self.count - old[:, None]), axis=1), 0)
+                t = np.sum(self.count == old[:, None], axis=1)
+                self.ties -= np.where(full, _tie_term(t) - _tie_term(t - 1), 0)
+            self.count[:, h] = np.nan
+
+            # add those of the new bin, later than all the others.
+            self.s += np.nansum(np.sign(x[:, None] - self.count), axis=1)
+            t = np.sum(self.count == x[:, None], axis=1)
+            self.ties += _tie_term(t + 1) - _tie_term(t)
+
+        old = np.where(full, old, 0)
+        self.dft += (x - old)[:, None] * np.exp(-2j * np.pi * h * np.arange(self.window) / self.window)
+        self.sum_c += x - old
+        self.sum_c2 += x * x - old * old
+        self.sum_total += x * x[0] - old * (old_total if full[0] else 0)
+        self.sum_sentiment += y - np.where(full, self.sentiment[:, h], 0)
+
+        self.count[:, h] = x
+        self.sentiment[:, h] = y
+        self.head = (h + 1) % self.window
+        self.bins += 1
+        if self.bins % self.window == 0:
+            self.refresh()
+
+    def topics(self):
+        """ The topic ids of the rows 1, 2, ...
+        """
+
+        return sorted(self.rows, key=self.rows.get)
+
+    def trend(self):
+        """ The trend wording of every row (as _trend_wording words it) and its p-value.
+        """
+
+        n = float(min(self.bins, self.window))
+        var_s = (_tie_term(n) - self.ties) / 18
+        trend, h, p, z = _mk_decision(self.s, var_s, alpha=0.5)
+        words = np.where(p < 0.1, 'an overall significant ', np.where(p < 0.5, 'an overall plausible ', ''))
+        return [prefix + str(word) for prefix, word in zip(words, trend)], p
+
+    def periodicity(self):
+        """ The strongest period shorter than the window of every row and its amplitude ratio.
+        """
+
+        m = self.window
+        k = np.arange(2, m // 2 + 1)  # period m (k = 1) is not shorter than the window
+        power = np.abs(self.dft[:, k])
+        strongest = np.argmax(power, axis=1)
+        amplitude = power[np.arange(power.shape[0]), strongest] * np.where(k[strongest] * 2 == m, 1.0, 2.0) / m
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = amplitude / (self.sum_c / m)
+        return np.round(m / k[strongest]).astype(int), ratio
+
+    def average_sentiment(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum_sentiment / self.sum_c
+
+    def correlation(self):
+        """ Pearson correlation of the counts of every row with the total counts.
+        """
+
+        n = float(min(self.bins, self.window))
+        cov = n * self.sum_total - self.sum_c * self.sum_c[0]
+        var = n * self.sum_c2 - self.sum_c * self.sum_c
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.clip(cov / np.sqrt(var * var[0]), -1, 1)
+
+
+class Monitor(object):
+    """ Reads the bins of a feed into RollingTrends and gives the facts (see json_render) of the
+    classifications that changed with each bin.
+    """
+
+    def __init__(self, window=96, interval=None, tz=None):
+        self.trends = RollingTrends(window)
+        self.interval = interval
+        self.tz = tz
+        self.classes = {}  # (statistic, topic) -> the last classification
+        self.skipped = 0  # feed lines that could not be read
+
+    def label(self, start, interval):
+        unit = time_unit(start, start + interval, interval, self.tz)[2]
+        return slot_labels(start, interval, unit, 1, self.tz)[0], unit
+
+    def feed(self, line):
+        """ Add the bin of a feed line (json text or parsed); returns the facts of the changes.
+        A line that is not a bin (truncated or garbled json, missing fields) is skipped and
+        counted in skipped, so that one bad line does not stop the monitor.
+        """
+
+        try:
+            record = json.loads(line) if isinstance(line, str) else line
+            start = record['bucket_start']
+            interval = record.get('interval', self.interval)
+            counts, sentiments = {}, {}
+            for i, elm in enumerate(record['bins']):
+                topic = elm.get('topic_id', i)
+                counts[topic] = float(elm['c'])
+                sentiments[topic] = float(elm.get('p', 0) + elm.get('n', 0))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.skipped += 1
+            return []
+        if interval is None:
+            raise ValueError('no interval in the feed or the arguments')
+        trends = self.trends
+        trends.update(counts, sentiments)
+        if trends.bins < trends.window:
+            return []
+
+        when, unit = self.label(start, interval)
+        window = {'time': when, 'window': trends.window, 'unit': unit}
+        topics = [None] + trends.topics()
+        trend, p = trends.trend()
+        period, ratio = trends.periodicity()
+        sentiment = trends.average_sentiment()
+        r = trends.correlation()
+
+        facts = []
+        for row, topic in enumerate(topics):
+            series = 'monitor_total' if topic is None else 'monitor_topic'
+            values = dict(window, topic=topic)
+            if self._changed('trend', topic, trend[row]):
+                facts.append((series + '_trend', dict(values, pattern=trend[row])))
+            strength = _periodicity(ratio[row])
+            if self._changed('periodicity', topic, strength):
+                if strength:
+                    facts.append((series + '_periodicity', dict(values, strength=strength, period=int(period[row]))))
+                else:
+                    facts.append((series + '_no_periodicity', values))
+            polarity = 'positive' if sentiment[row] > 0 else 'negative'
+            if not np.isnan(sentiment[row]) and self._changed('sentiment', topic, polarity):
+                facts.append((series + '_' + polarity, dict(values, sentiment=float(sentiment[row]))))
+            if topic is not None and not np.isnan(r[row]):
+                if self._changed('correlation', topic, _relation(r[row])):
+                    facts.append(('monitor_relation', dict(values, relation=_relation(r[row]), r=float(r[row]))))
+        return facts
+
+    def _changed(self, statistic, topic, value):
+        key = (statistic, topic)
+        changed = self.classes.get(key) != value
+        self.classes[key] = value
+        return changed
+
+
+def _lines(f, follow, poll):
+    """ The lines of f, waiting for more at its end with follow.
+    """
+
+    pending = ''  # a line still being written
+    while True:
+        line = f.readline()
+        if line.endswith('\n'):
+            yield pending + line
+            pending = ''
+        elif follow:
+            pending += line
+            time.sleep(poll)
+        else:
+            if pending + line:
+                yield pending + line
+            return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Narrate the changes in a live feed of time bins.')
+    parser.add_argument('feed', nargs='?', default='-', help='feed file, one bin per line (default: stdin)')
+    parser.add_argument('--follow', action='store_true', help='keep reading the file as it grows')
+    parser.add_argument('--window', type=int, default=96, help='bins the statistics are taken over')
+    parser.add_argument('--interval', type=float, help='bin length in ms, if the feed does not give it')
+    parser.add_argument('--tz', help="time zone of the dates, e.g. 'UTC' (the local time by default)")
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between reads at the end of a followed file')
+    args = parser.parse_args(argv)
+
+    monitor = Monitor(args.window, args.interval, args.tz)
+    f = sys.stdin if args.feed == '-' else open(args.feed, 'r')
+    try:
+        for line in _lines(f, args.follow and f is not sys.stdin, args.poll):
+            if line.strip():
+                skipped = monitor.skipped
+                facts = monitor.feed(line)
+                if monitor.skipped > skipped:
+                    sys.stderr.write('skipped a line that is not a bin (%d so far): %.80r\n' % (monitor.skipped, line))
+                if facts:
+                    write(facts)
+                    sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
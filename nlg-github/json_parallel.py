@@ -0,0 +1,127 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from json_methods import pearson_to, time_series_analysis_batch
+
+
+'''
+Parallel per-topic analysis of widgets with many topics, for callers that need the
+periodicity and trend of every topic (temp_trend itself only narrates the totals and
+the correlations of the topics, which pearson_to computes in one vectorized pass).
+The topic x slot count, positive and negative matrices are copied once into
+multiprocessing.shared_memory blocks; the workers of a process pool attach to them and
+analyze a range of topics each through NumPy views of the blocks, without copying them:
+the periodicity and trend of every topic (time_series_analysis_batch) and the Pearson
+correlation of its counts and of its sentiment with the total series.
+The results of the ranges are put back in topic order, and every topic is computed from
+the same values as in the serial analysis (the series are stacked to the same width), so
+the results are the same whatever the number of workers.
+The series statistics are not cached in this mode.
+'''
+
+
+class SharedMatrices(object):
+    """ Copies of equally shaped float matrices in shared memory, by name; use as a context
+    manager, the blocks are released on exit.
+    """
+
+    def __init__(self, **matrices):
+        self.blocks = {}
+        self.specs = {}
+        try:
+            for name, matrix in matrices.items():
+                matrix = np.asarray(matrix, dtype=float)
+                block = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+                self.blocks[name] = block
+                np.ndarray(matrix.shape, dtype=float, buffer=block.buf)[...] = matrix
+                self.specs[name] = (block.name, matrix.shape)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+
+def _attach(specs):
+    """ The shared memory blocks of specs (as in SharedMatrices.specs) and views of their matrices.
+    """
+
+    blocks, views = [], {}
+    for name, (block_name, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        views[name] = np.ndarray(shape, dtype=float, buffer=block.buf)
+    return blocks, views
+
+
+def _padded(rows, width):
+    """ The rows (1-D series) right-padded with NaN to width, as pearson_to stacks them.
+    """
+
+    x = np.full((len(rows), width), np.nan)
+    for i, y in enumerate(rows):
+        x[i, :y.shape[0]] = y
+    return x
+
+
+def topic_range(specs, start, stop, interval, sumx, sumsentx, width):
+    """ Worker: the status (time_series_analysis record) and the count and sentiment
+    correlations of the topics start to stop - 1, from the shared matrices of specs.
+    """
+
+    blocks, views = _attach(specs)
+    try:
+        return _topic_range(views, start, stop, interval, sumx, sumsentx, width)
+    finally:
+        del views
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # views are still held by the traceback of an error; the mapping goes with the worker.
+
+
+def _topic_range(views, start, stop, interval, sumx, sumsentx, width):
+    count = views['count'][start:stop]
+    nonzero = [np.nonzero(x) for x in count]
+    series = [x[nz] for x, nz in zip(count, nonzero)]
+    sent = np.divide(np.add(views['negative'][start:stop], views['positive'][start:stop]), count)
+
+    status = time_series_analysis_batch(series, interval)
+    count_r = pearson_to(_padded(series, width), sumx)
+    sent_r = pearson_to(_padded([np.divide(s[nz], x[nz]) for s, x, nz in zip(sent, count, nonzero)], width), sumsentx)
+    return status, count_r, sent_r
+
+
+def topic_analysis(count, positive, negative, interval, sumx, sumsentx, workers, ranges=None):
+    """ The status of every topic (time_series_analysis_batch of its nonzero counts) and the
+    correlations of its counts with sumx and of its sentiment with sumsentx, as temp_trend
+    computes them, in a pool of workers processes.
+    The topics are split into ranges (4 per worker by default).
+    """
+
+    topics = count.shape[0]
+    ranges = ranges or 4 * workers
+    bounds = np.linspace(0, topics, min(ranges, topics) + 1).astype(int).tolist()
+    width = max([int(np.count_nonzero(x)) for x in count] + [0])
+
+    with SharedMatrices(count=count, positive=positive, negative=negative) as shared:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(topic_range, shared.specs, start, stop, interval, sumx, sumsentx, width)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            results = [future.result() for future in futures]
+
+    status = [record for result in results for record in result[0]]
+    count_r = np.concatenate([result[1] for result in results] + [np.zeros(0)])
+    sent_r = np.concatenate([result[2] for result in results] + [np.zeros(0)])
+    return status, count_r, sent_r
@@ -1,8 +1,18 @@
+#!/usr/bin/env python3
+import argparse
+from itertools import islice
+import sys
 import numpy as np
-import json
-from operator import itemgetter
-from json_methods import time_unit, top_cat_words, mad_based_outlier
-from json_process_tempral_trend_func_version import temp_trend
+import os
+from json_cache import content_key
+from json_columnar import SemanticColumns, load_file
+from json_sketch import HeavyHitters
+from json_profile import Profiler, active, current, emit_profile, profile_requested, stage
+from json_methods import time_unit, top_k, mad_based_outlier_batch
+from json_process_tempral_trend_func_version import temp_trend_facts
+from json_render import render
+from json_stream import json_lines, loads_fields
+from json_table import RegionTable, TopicTable
 
 
 
@@ -19,375 +29,449 @@ The path of the corresponding figure is: data/Semantic.png
 json_file_name = 'data/categories.json'   # the input json file
 
 words_display_num = 5 # display word number
-topics_display_num = 5 # display topic number
 
 
-def json_read(json_file_name):
-    with open(json_file_name, 'r') as f:
-        for line in f:
-            yield json.loads(line)
-
-count = 0 #document count
-ct_p = 0 #positive count
-ct_n = 0 #negative count
-
-
-for l in json_read(json_file_name):
-    slt = len(l[0]['timebin']['bins'][0]['c'])  # temporal trend info
-    start = l[0]['timebin']['bucket_start'] # start time
-    end = l[0]['timebin']['bucket_end'] # end time
-    interval = l[0]['timebin']['interval'] # interval
-
-    stdate, eddate, intdate, st, ed = time_unit(start, end, interval) # transfer to readable time.
-    tpcnum = len(l) # topic number
-    count = np.zeros((tpcnum, 2))  # for document count info storage.
-    sent = np.zeros((tpcnum, 2)) # for document sent info storage.
-
-    region_info = {}  # for info storage of geo figure
-    bzw_dict = {} # for info storage of buzzword figure
-    tpc = []
-
-    for i, elm in enumerate(l):
-        # store the count and sentiment info for temporal trend
-        tpc.append(elm['timebin']['bins'][i])
-        count[i][0] = elm['c']
-        count[i][1] = i
-
-        sent[i][0] = (elm['n'] + elm['p'])/elm['c']
-        sent[i][1] = i
-
-        # store the count and sentiment info for geo
+class SemanticTopicReport(object):
+    """ Analysis of one semantic topic widget (a parsed categories.json line).
+
+    The results of each part of the figure are kept as plain dicts and lists in
+    summary, buzzwords, proportion, sentiment and geo, and the temporal trend as its
+    facts; facts() gives the facts of the whole report, render(locale) renders them
+    (see json_render) and text holds the rendered paragraphs. A report keeps no state outside itself, so any number of
+    them can be built in one process.
+    With a json_cache.ResultCache as cache, the sections of a widget seen before are
+    taken from the cache, before any table is built, instead of being analyzed again.
+    widget can also be a json_columnar.SemanticColumns, the widget loaded from its binary columns,
+    or the json text of the widget (a categories.json line), which is only parsed when the
+    cache does not have it: its cache key is taken from the text.
+    With region_parents, a dict from the display name of a region to the name of its area
+    (and, optionally, from an area to a larger one), the geo section also sums the regions by area.
+    With sketch_capacity, the buzzwords and the keywords of all topics are counted with a
+    json_sketch.HeavyHitters of that many counters instead of exactly, for very large vocabularies:
+    the terms are streamed from the widget into the sketches and no vocabulary of the widget is
+    built. Only the buzzwords (their counts are lower bounds, within the error given with them)
+    and the keywords of all topics are approximate; the summary, the topic proportions and
+    sentiment with their top words, the geo section and the temporal series stay exact.
+    With profile=True (or a json_profile.Profiler, or NLG_PROFILE set in the environment)
+    the time and memory of each stage are recorded, see the profile property.
+    """
 
-        for region in elm['top_regions']:
-            if region['display_name'] in region_info.keys():
-                region_info[region['display_name']][0] += region['c']
-                region_info[region['display_name']][1] += (region['n'] + region['p'])
+    sections = ('summary', 'buzzwords', 'buzzwords_by_sentiment', 'proportion', 'sentiment', 'geo', 'temporal')
+
+    def __init__(self, widget, words_display_num=words_display_num, cache=None, tz=None, profile=None,
+                 region_parents=None, sketch_capacity=None):
+        self.widget = widget
+        self.words_display_num = words_display_num
+        self.region_parents = region_parents  # display name -> area, for the geo roll-up (optional)
+        self.sketch_capacity = sketch_capacity  # counters of the approximate buzzword and keyword counts (optional)
+        self.cache = cache
+        self.tz = tz  # time zone of the dates, the local time by default
+        self._text = None
+
+        if profile is None:
+            # inside an active Profiler the stages are recorded there.
+            profile = profile_requested() and current() is None
+        self._profiler = profile if isinstance(profile, Profiler) else (Profiler() if profile else None)
+        with active(self._profiler):
+            self._analyze()
+
+    def _analyze(self):
+        l = self.widget
+        tz = self.tz
+        cache = self.cache
+        text = isinstance(l, (str, bytes))
+
+        if cache is not None:
+            # the key of the input as it is given: the json text, the columns or the parsed widget.
+            if text:
+                source = (l.encode('utf-8') if isinstance(l, str) else l).strip()
             else:
-                region_info[region['display_name']] = [region['c'], (region['n'] + region['p'])]
-
-        # store the count and sentiment info for buzzword
-
-        for bzw in elm['buzzwords']:
-
-            if bzw['term'] in bzw_dict.keys():
-                bzw_dict[bzw['term']][0] += bzw['c']*float(elm['weight'])  # account for the weight
-                bzw_dict[bzw['term']][1] += bzw['n'] + bzw['p']
-                bzw_dict[bzw['term']][2] += bzw['c']
+                source = l.key if isinstance(l, SemanticColumns) else l
+            key = content_key('semantic_topic_report', 'facts', self.words_display_num, None if tz is None else str(tz),
+                              self.region_parents, self.sketch_capacity, source)
+            cached = cache.get(key)
+            if cached is not None:
+                self.__dict__.update(cached)
+                return
+
+        if text:
+            with stage('parse'):
+                # only the fields used by the analysis are decoded, the sample documents are skipped.
+                l = self.widget = loads_fields(l)
+        columns = isinstance(l, SemanticColumns)
+        timebin = l.timebin if columns else l[0]['timebin']
+        self.slt = len(timebin['bins'][0]['c'])  # temporal trend info
+        self.start = timebin['bucket_start'] # start time
+        self.end = timebin['bucket_end'] # end time
+        self.interval = timebin['interval'] # interval
+        stdate, eddate, intdate, st, ed = time_unit(self.start, self.end, self.interval, tz) # transfer to readable time.
+
+        self.tpcnum = len(l) # topic number
+        self.count = np.zeros((self.tpcnum, 2))  # for document count info storage.
+        self.sent = np.zeros((self.tpcnum, 2)) # for document sent info storage.
+        with stage('collect'):
+            # topics and buzzwords in columns, for the buzzword figure, and the regions for the geo figure
+            self.table = l.table if columns else TopicTable(l, vocabulary=not self.sketch_capacity)
+            self.regions = l.regions if columns else RegionTable(l)
+            self._collect()
+
+        self.summary = {'documents': int(np.sum(self.count[:, 0])), 'topics': self.tpcnum,
+                        'start': stdate, 'end': eddate}
+        with stage('buzzwords'):
+            self.buzzwords, self.buzzwords_by_sentiment = self._buzzword_analysis()
+        with stage('topics'):
+            self.proportion, self.sentiment = self._topic_analysis()
+        with stage('geo'):
+            self.geo = self._geo_analysis()
+        with stage('temporal'):
+            self.temporal = self._temporal_analysis()
+
+        if cache is not None:
+            cache.put(key, dict((name, getattr(self, name)) for name in self.sections))
+
+    @classmethod
+    def from_file(cls, json_file_name, **kwargs):
+        """ One report for each widget (line) of a json file.
+        """
+
+        profile = kwargs.pop('profile', None)
+        if profile is None:
+            profile = profile_requested()
+
+        # the reports parse the json text of their widget (unless it is in their cache).
+        # A directory written by json_columnar is read from its columns.
+        widgets = load_file(json_file_name) if os.path.isdir(json_file_name) else json_lines(json_file_name)
+        while True:
+            # each report gets its own profile, which includes the parsing of its widget.
+            profiler = Profiler() if profile else None
+            with active(profiler):
+                with stage('read'):
+                    widget = next(widgets, None)
+                report = None if widget is None else cls(widget, profile=profiler or False, **kwargs)
+            if report is None:
+                return
+            yield report
+
+    def _collect(self):
+        # store the count and sentiment info of the topics
+        self.count[:, 0] = self.table.c
+        self.count[:, 1] = np.arange(self.tpcnum)
+        self.sent[:, 0] = (self.table.n + self.table.p) / self.table.c
+        self.sent[:, 1] = np.arange(self.tpcnum)
+
+        if isinstance(self.widget, SemanticColumns):
+            # the bin of every topic, kept in the columns.
+            self.tpc = self.widget.timebin['bins']
+        else:
+            # store the count and sentiment info for temporal trend
+            self.tpc = [elm['timebin']['bins'][i] for i, elm in enumerate(self.widget)]
+
+    def _buzzword_analysis(self):
+        """
+        Buzzword analysis
+        """
+
+        if self.sketch_capacity:
+            return self._buzzword_sketch()
+
+        # sum the weighted count, sentiment and documents of each buzz word over the topics (account for the weight)
+        weighted, sentiment, documents = self.table.term_totals()
+        sentiment = sentiment / documents  # average by count
+
+        # the top buzz words for their count and sentiment, equal values keep the order of first appearance.
+        def rows(key):
+            order = top_k(key, self.words_display_num)
+            return [{'term': self.table.terms[k], 'weighted_count': weighted[k].item(),
+                     'sentiment': sentiment[k].item(), 'documents': documents[k].item()} for k in order]
+
+        return rows(weighted), rows(sentiment)
+
+    def _buzzword_sketch(self):
+        """ The buzzword analysis from the heavy hitters of the weighted counts. The counts are
+        lower bounds, within error of the exact ones, and the buzzwords by sentiment are taken
+        among the heavy hitters.
+        """
+
+        table = self.table
+        if table.terms is None:
+            # the buzzwords of the widget in the order of the table rows, never interned as a whole.
+            terms = (bzw['term'] for bzws in table.buzzwords for bzw in bzws)
+        else:
+            terms = map(table.terms.__getitem__, table.term.tolist())
+        sketch = HeavyHitters(self.sketch_capacity)
+        chunk = max(self.sketch_capacity, 4096)
+        for start in range(0, table.topic.shape[0], chunk):
+            rows = slice(start, start + chunk)
+            sketch.update(list(islice(terms, chunk)), table.term_c[rows] * table.weight[table.topic[rows]],
+                          sentiment=table.term_n[rows] + table.term_p[rows], documents=table.term_c[rows])
+
+        documents = sketch.sums.get('documents', np.zeros(0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sentiment = sketch.sums.get('sentiment', np.zeros(0)) / documents
+
+        def rows(key):
+            order = top_k(key, self.words_display_num)
+            return [{'term': sketch.items[k], 'weighted_count': sketch.counts[k].item(),
+                     'sentiment': sentiment[k].item(), 'documents': int(documents[k]), 'error': sketch.error}
+                    for k in order.tolist()]
+
+        return rows(sketch.counts), rows(sentiment)
+
+    def _topic_analysis(self):
+        """
+        Semantic topic analysis
+        """
+
+        count = self.count.copy()
+        count[:, 0] = count[:,0]/np.sum(count[:, 0])
+        prop = count[count[:, 0].argsort()]
+        sent = self.sent[self.sent[:, 0].argsort()]
+
+        # retrieve the topics with key words + count/sent
+        count_topics = self.table.top_words(prop[:, 1], self.words_display_num)
+        sent_topics = self.table.top_words(sent[:, 1], self.words_display_num)
+
+        def topics(tgt, key_words):
+            # the outliers from the largest to the smallest value.
+            return [{'topic': int(row[1]), 'value': row[0],
+                     'keywords': [elm[1] for elm in key_words[str(int(row[1]))]]} for row in tgt[::-1]]
+
+        # the outliers of the proportions and of the sentiment, in one call.
+        prop_outliers, sent_outliers = mad_based_outlier_batch(np.column_stack([prop[:, 0], sent[:, 0]])).T
+
+        # Analyze if there is outlier in count among the topics.
+        # For count, we are only interested in massive ones.
+        tgtprop = prop[prop_outliers, :]
+        ind = np.where(tgtprop[:, 0] > np.mean(prop[:, 0]))
+        tgtprop = tgtprop[ind[0], :]
+
+        proportion = {'min': prop[0][0], 'max': prop[-1][0], 'mean': np.mean(prop[:, 0]), 'sd': np.std(prop[:, 0]),
+                      'outliers': topics(tgtprop, count_topics)}
+
+        # Analyze if there is outlier in sentiment among the topics.
+        # For sentiment, we are interested in both the extremely negative and positive ones.
+        tgtsent = sent[sent_outliers, :]
+        ind_pos = np.where(tgtsent[:, 0] > np.mean(sent[:, 0])) # extremely positive
+        tgtsent_pos = tgtsent[ind_pos[0], :]
+        ind_neg = np.where(tgtsent[:, 0] < np.mean(sent[:, 0])) # extremely negative
+        tgtsent_neg = tgtsent[ind_neg[0], :]
+
+        sentiment = {'min': sent[0][0], 'max': sent[-1][0], 'mean': np.mean(sent[:, 0]), 'sd': np.std(sent[:, 0]),
+                     'positive': topics(tgtsent_pos, sent_topics), 'negative': topics(tgtsent_neg, sent_topics)}
+
+        return proportion, sentiment
+
+    def _geo_analysis(self):
+        """
+        Geo analysis
+        """
+
+        # retreive the geo info, label the unknown locations.
+        names = self.regions.names
+        count, sent = self.regions.totals()
+        sent = sent / count
+        known = self.regions.known()
+        unknown = not known.all()
+
+        # Sort the geo info by count/sentiment (stable, equal values keep the order of first appearance)
+        order_count = np.argsort(-count, kind='stable')
+        order_sent = np.argsort(-sent, kind='stable')
+
+        # Normalize the count and get the proportion.
+        info_count = np.column_stack([count[order_count], sent[order_count], np.arange(len(names))]).astype(float)
+        total_count = np.sum(info_count[:, 0])
+        info_count[:,0] = info_count[:,0] / np.sum(info_count[:,0])
+        info_sent = np.column_stack([count[order_sent], sent[order_sent], np.arange(len(names))]).astype(float)
+
+        # Identify outliers in count and in sentiment for geo figure, ignoring the Unknown countries/area.
+        geo_count_outliers, geo_sent_outliers = mad_based_outlier_batch(np.column_stack([info_count[:, 0],
+                                                                                         info_sent[:, 1]])).T
+        tgt_info_count = info_count[geo_count_outliers & (info_count[:, 0] > np.mean(info_count[:, 0]))
+                                    & known[order_count], :]
+
+        tgt_info_sent = info_sent[geo_sent_outliers & known[order_sent], :]
+
+        ind = np.where(tgt_info_sent[:, 1] > np.mean(info_sent[:, 1]))
+        tgt_info_pos_sent = tgt_info_sent[ind[0], :]
+        ind = np.where(tgt_info_sent[:, 1] < np.mean(info_sent[:, 1]))
+        tgt_info_neg_sent = tgt_info_sent[ind[0], :]
+
+        def regions(tgt):
+            return [{'region': names[order_sent[int(row[2])]], 'sentiment': info_sent[int(row[2])][1],
+                     'documents': int(row[0]), 'share': int(row[0]) / total_count} for row in tgt]
+
+        geo = {'regions': len(names),
+               'unknown': unknown,
+               'names': [names[i] for i in order_count.tolist()],
+               # with one known region (or none) there is nothing to compare.
+               'comparable': len(names) > 2 or (len(names) == 2 and not unknown),
+               'mean': np.mean(info_count[:, 0]), 'sd': np.std(info_count[:, 0]),
+               'sentiment_mean': np.mean(info_sent[:, 1]), 'sentiment_sd': np.std(info_sent[:, 1]),
+               'count_outliers': [{'region': names[order_count[int(row[2])]], 'share': info_count[int(row[2])][0]}
+                                  for row in tgt_info_count],
+               'positive': regions(tgt_info_pos_sent),
+               'negative': regions(tgt_info_neg_sent)}
+
+        if self.region_parents:
+            geo['areas'] = self._area_rollup(total_count)
+        return geo
+
+    def _area_rollup(self, total_count):
+        """ The areas of region_parents with their documents, share and sentiment, the largest first.
+        """
+
+        names, parent, count, sent = self.regions.rollup(self.region_parents)
+        areas = np.unique(parent[parent >= 0])
+        areas = areas[np.argsort(-count[areas], kind='stable')]
+        return [{'area': names[i], 'documents': int(count[i]), 'share': int(count[i]) / total_count,
+                 'sentiment': sent[i] / count[i], 'regions': int(np.sum(parent == i))} for i in areas.tolist()]
+
+    def _temporal_analysis(self):
+        """
+        Time trend analysis
+        """
+
+        # prepare for the temporal trend analysis in the end.
+        dict_tpc = self.widget.timebin if isinstance(self.widget, SemanticColumns) else {'bins': self.tpc}
+
+        return temp_trend_facts(self.tpcnum, self.slt, self.start, self.end, self.interval, dict_tpc, cache=self.cache,
+                                tz=self.tz, sketch_capacity=self.sketch_capacity)
+
+    @property
+    def text(self):
+        """ The rendered report.
+        """
+
+        if self._text is None:
+            with active(self._profiler):
+                with stage('render'):
+                    self._text = self.render()
+        return self._text
+
+    @property
+    def profile(self):
+        """ The json-ready profile of the stages (see json_profile), or None when not profiled.
+        """
+
+        if self._profiler is None:
+            return None
+        return self._profiler.report()
+
+    def facts(self):
+        """ The (name, values) facts of the report, rendered by json_render.
+        """
+
+        facts = []
+        out = facts.append
+        blank = ('blank', {})
+
+        # print out xxx document collected from xxx date to xxx date are categorized into xxx topics
+        summary = self.summary
+        out(('summary', summary))
+
+        out(blank)
+        out(('buzzwords', {}))
+        for bzw in self.buzzwords:
+            out(('buzzword', dict(bzw, total=summary['documents'], share=bzw['documents'] / summary['documents'])))
+        out(blank)
+
+        prop = self.proportion
+        if len(prop['outliers']) == 0:
+            out(('proportion_even', prop))
+        else:
+            out(('proportion_range', prop))
+            if len(prop['outliers']) == 1: # if there is only 1 outlier.
+                out(('proportion_outlier', {}))
+            else: # If there are more than 1 outlier.
+                out(('proportion_outliers', {}))
+            for tpc in prop['outliers']:
+                out(('proportion_topic', tpc))
+        out(blank)
+
+        sent = self.sentiment
+        if len(sent['positive']) == 0 and len(sent['negative']) == 0:
+            out(('sentiment_even', sent))
+        for polarity in ['positive', 'negative']:
+            if len(sent[polarity]) == 1:
+                out((polarity + '_outlier', {}))
+            elif len(sent[polarity]) > 1:
+                out((polarity + '_outliers', {}))
+            for tpc in sent[polarity]:
+                out(('sentiment_topic', tpc))
+
+        # Conclude that these documents come from xxx countries.
+        geo = self.geo
+        if geo['unknown']: # If there is unknown country, pick it out and describe it with 'other countries/areas.'
+            if geo['regions'] - 1 > 2:
+                region_count = ('regions_many', {'regions': geo['regions'] - 1})
             else:
-                bzw_dict[bzw['term']] = [bzw['c']*float(elm['weight']), (bzw['n'] + bzw['p']), bzw['c']]
-
-
-    # prepare for the temporal trend analysis in the end.
-    dict_tpc = {'bins': tpc}
-
-
-    # print out xxx document collected from xxx date to xxx date are categorized into xxx topics
-    tpcount = 'The ' + str(int(np.sum(count[:, 0]))) + ' documents collected from ' + str(stdate) + ' to ' + \
-              str(eddate) + ' are categorized into ' + str(tpcnum) + ' topics.'
-    print(tpcount)
+                region_count = ('regions_other', {'names': [name for name in geo['names'] if not name == 'Unknown']})
+        else:
+            if geo['regions'] > 3:
+                region_count = ('regions_many', {'regions': geo['regions']})
+            else:
+                region_count = ('regions', {'names': geo['names']})
 
-    """
-    Buzzword analysis
-    """
+        out(blank)
+        out(region_count)
 
-    # sort the buzz word for their count and sentiment (average by count)
+        if geo['comparable']:
+            if len(geo['count_outliers']) == 0:
+                out(('regions_even', geo))
+            elif len(geo['count_outliers']) == 1:
+                out(('region_outlier', geo['count_outliers'][0]))
+            else:
+                out(('region_outliers', {}))
+                for region in geo['count_outliers']:
+                    out(('region_share', region))
 
-    bzw_list = [[k, v[0], v[1] / v[2], v[2]] for k, v in bzw_dict.items()]
-    buzzword_count = sorted(bzw_list, key=itemgetter(1), reverse=True)
-    buzzword_sent = sorted(bzw_list, key=itemgetter(2), reverse=True)
+        if geo.get('areas'):
+            out(('areas', {'areas': [('area', area) for area in geo['areas']]}))
 
-    print('')
+        out(blank)
 
-    buzzword_output = 'Top buzzwords and the sentiment (on a -5 ~ 5 scale) associated with them mentioned in these ' \
-                      'documents include: '
-    print(buzzword_output)
+        if geo['comparable']:
+            if len(geo['positive']) == 0 and len(geo['negative']) == 0:
+                out(('regions_sentiment_even', {'mean': geo['sentiment_mean'], 'sd': geo['sentiment_sd']}))
+            elif len(geo['positive']) == 1:
+                out(('positive_region', geo['positive'][0]))
+            elif len(geo['positive']) > 1:
+                out(('positive_regions', {}))
+                for region in geo['positive']:
+                    out(('positive_region_detail', region))
 
-    for i in range(words_display_num):
-        buzzword_op = str(buzzword_count[i][0]) + ': appeared in ' + str(buzzword_count[i][3]) + ' out of ' + str(int(np.sum(count[:, 0]))) + ' documents' \
-                      + ' (' + '{:.2%}'.format(buzzword_count[i][3] / np.sum(count[:, 0])) + '), with overall ' + '{:.2f}'.format(buzzword_count[i][2]) + ' sentiment.'
-        print(buzzword_op)
+            if len(geo['negative']) == 1:
+                out(('negative_region', geo['negative'][0]))
+            elif len(geo['negative']) > 1:
+                out(('negative_regions', {}))
+                for region in geo['negative']:
+                    out(('negative_region_detail', region))
 
-    print('')
+        out(blank)
 
+        return facts + self.temporal
 
-    """
-    Semantic topic analysis
-    """
+    def render(self, locale='en'):
+        """ The report in locale, from its facts (see json_render).
+        """
 
-    count[:, 0] = count[:,0]/np.sum(count[:, 0])
-    prop = count[count[:, 0].argsort()]
-    sent = sent[sent[:, 0].argsort()]
-
-    # retrieve the topics with key words + count/sent
-    count_topics = top_cat_words(l, prop, words_display_num)
-    sent_topics = top_cat_words(l, sent, words_display_num)
-
-
-    propout = 'The proportion of each topic in the total documents ranges from ' + '{:.1%}'.format(prop[0][0]) + ' to ' + '{:.1%}'.format(prop[-1][0]) + '. '
-
-    # Analyze if there is outlier in count among the topics.
-    # For count, we are only interested in massive ones.
-    prop_outliers = mad_based_outlier(prop[:, 0])
-    tgtprop = prop[prop_outliers, :]
-    ind = np.where(tgtprop[:, 0] > np.mean(prop[:, 0]))
-    tgtprop = tgtprop[ind[0], :]
-
-
-    if tgtprop.shape[0] == 0:
-        top_count = 'The proportions are evenly distributed, with mean of ' + '{:.1%}'.format(np.mean(prop[:, 0])) + ' and SD of ' + '{:.2%}'.format(np.std(prop[:, 0])) + '.'
-        print(propout + top_count)
-    elif tgtprop.shape[0] == 1: # if there is only 1 outlier.
-        top_count = 'There is one topic that captures comparably more documents: '
-        print(propout)
-        print(top_count)
-        for i in range(tgtprop.shape[0]):
-            tpc = 'Topic ' + str(int(tgtprop[i][1])) + ' (' + '{:.1%}'.format(
-                tgtprop[tgtprop.shape[0] - 1 - i][0]) + '), ' + 'top keywords: '
-            for j in range(words_display_num):
-                if j < words_display_num - 1:
-                    tpc = tpc + count_topics[str(int(tgtprop[i][1]))][j][1] + ', '
-                else:
-                    tpc = tpc + 'and ' + count_topics[str(int(tgtprop[i][1]))][j][1] + '.'
-
-            print(tpc)
-    elif tgtprop.shape[0] > 1: # If there are more than 1 outlier.
-        top_count = 'The topics that capture comparably more documents include: '
-        print(propout)
-        print(top_count)
-        for i in range(tgtprop.shape[0]):
-            tpc = 'Topic ' + str(int(tgtprop[i][1])) + ' (' + '{:.1%}'.format(
-                tgtprop[tgtprop.shape[0] - 1 - i][0]) + '), ' + 'top keywords: '
-            for j in range(words_display_num):
-                if j < words_display_num - 1:
-                    tpc = tpc + count_topics[str(int(tgtprop[i][1]))][j][1] + ', '
-                else:
-                    tpc = tpc + 'and ' + count_topics[str(int(tgtprop[i][1]))][j][1] + '.'
-
-
-            print(tpc)
-
-    print('')
-
-    sentout = 'The sentiment score of each topics ranges from ' + '{:.2f}'.format(sent[0][0]) + ' to ' + '{:.2f}'.format(sent[-1][0]) + ', out of a (-5, +5) scale. '
-
-    # Analyze if there is outlier in sentiment among the topics.
-    # For sentiment, we are interested in both the extremely negative and positive ones.
-    sent_outliers = mad_based_outlier(sent[:, 0])
-    tgtsent = sent[sent_outliers, :]
-    ind_pos = np.where(tgtsent[:, 0] > np.mean(sent[:, 0])) # extremely positive
-    tgtsent_pos = tgtsent[ind_pos[0], :]
-    ind_neg = np.where(tgtsent[:, 0] < np.mean(sent[:, 0])) # extremely negative
-    tgtsent_neg = tgtsent[ind_neg[0], :]
-
-
-
-    if tgtsent_pos.shape[0] == 0 and tgtsent_neg.shape[0] == 0:
-        top_sent = 'The sentiment scores are evenly distributed among all of the topics, with mean of ' + '{:.2f}'.format(np.mean(sent[:, 0])) + ' and SD of ' + '{:.2f}'.format(np.std(sent[:, 0])) + '.'
-        print(sentout + top_sent)
-    else:
-        if tgtsent_pos.shape[0] > 0:
-            if tgtsent_pos.shape[0] == 1:
-                top_sent = 'There is one topic that captures comparably more negative sentiment: '
-                print(top_sent)
-                for i in range(tgtsent_pos.shape[0]):
-                    tpc = 'Topic ' + str(sent_topics[str(int(tgtsent_pos[i][1]))][0][3]) + ' (' + '{:.2f}'.format(
-                        tgtsent_pos[tgtsent_pos.shape[0] - 1 - i][0]) + '),' + 'top key words: '
-                    for j in range(words_display_num):
-                        if j < words_display_num - 1:
-                            tpc = tpc + sent_topics[i][j][1] + ', '
-                        else:
-                            tpc = tpc + 'and ' + sent_topics[str(int(tgtsent_pos[i][1]))][j][
-                                1] + '.'
-                    print(tpc)
-
-            elif tgtsent_pos.shape[0] > 1:
-                top_sent = 'The topics that capture comparably more positive sentiment include: '
-                print(top_sent)
-                for i in range(tgtsent_pos.shape[0]):
-                    tpc = 'Topic ' + str(sent_topics[str(int(tgtsent_pos[i][1]))][0][3]) + ' (' + '{:.2f}'.format(
-                        tgtsent_pos[tgtsent_pos.shape[0] - 1 - i][0]) + '),' + 'top key words: '
-                    for j in range(words_display_num):
-                        if j < words_display_num - 1:
-                            tpc = tpc + sent_topics[i][j][1] + ', '
-                        else:
-                            tpc = tpc + 'and ' + sent_topics[str(int(tgtsent_pos[i][1]))][j][
-                                1] + '.'
-                    print(tpc)
-
-        if tgtsent_neg.shape[0] > 0:
-            if tgtsent_neg.shape[0] == 1:
-                top_sent = 'There is one topic that captures comparably more negative sentiment: '
-                print(top_sent)
-                for i in range(tgtsent_neg.shape[0]):
-                    tpc = 'Topic ' + str(
-                        sent_topics[str(int(tgtsent_neg[i][1]))][0][3]) + ' (' + '{:.2f}'.format(
-                        tgtsent_neg[tgtsent_neg.shape[0] - 1 - i][0]) + '),' + 'top key words: '
-                    for j in range(words_display_num):
-                        if j < words_display_num - 1:
-                            tpc = tpc + sent_topics[i][j][1] + ', '
-                        else:
-                            tpc = tpc + 'and ' + sent_topics[str(int(tgtsent_neg[i][1]))][j][
-                                1] + '.'
-                    print(tpc)
-
-            elif tgtsent_neg.shape[0] > 1:
-                top_sent = 'The topics that capture comparably more negative sentiment include: '
-                print(top_sent)
-                for i in range(tgtsent_neg.shape[0]):
-                    tpc = 'Topic ' + str(
-                        sent_topics[str(int(tgtsent_neg[i][1]))][0][3]) + ' (' + '{:.2f}'.format(
-                        tgtsent_neg[tgtsent_neg.shape[0] - 1 - i][0]) + '),' + 'top key words: '
-                    for j in range(words_display_num):
-                        if j < words_display_num - 1:
-                            tpc = tpc + sent_topics[i][j][1] + ', '
-
-                        else:
-                            tpc = tpc + 'and ' + sent_topics[str(int(tgtsent_neg[i][1]))][j][
-                                1] + '.'
-
-                    print(tpc)
+        return render(self.facts(), locale)
 
 
-    """
-    Geo analysis
+def main(argv=None):
+    """ Command line entry point: narrate every widget in a json file.
     """
 
-    region_info_list = []
-    unknown = False
-
-    # retreive the geo info, label the unknown locations.
-
-    for key, value in region_info.items():
-        value[1] = value[1] / value[0]
-        region_info_list.append([key, value[0], value[1]])
-        if key == 'Unknown':
-            unknown = True
-
-    # Sort the geo info by count/sentiment
-    region_info_count = sorted(region_info_list, key=itemgetter(1), reverse=True)
-    region_info_sent = sorted(region_info_list, key=itemgetter(2), reverse=True)
-
-    # Normalize the count and get the proportion.
-    info_count = np.array([[elm[1], elm[2], i] for i, elm in enumerate(region_info_count)])
-    total_count = np.sum(info_count[:, 0])
-    info_count[:,0] = info_count[:,0] / np.sum(info_count[:,0])
-    info_sent = np.array([[elm[1], elm[2], i] for i, elm in enumerate(region_info_sent)])
-
-    # Conclude that these documents come from xxx countries.
-    if unknown: # If there is unknown country, pick it out and describe it with 'other countries/areas.'
-        if len(region_info_count) - 1 > 2:
-            region_count_out = 'These documents come from more than ' + str(len(region_info_count) - 1) + ' countries/areas.'
-        elif len(region_info_count) - 1 <= 2:
-            out = ''
-            for elm in region_info_count:
-                if not elm[0] == 'Unknown':
-                    out = out + elm[0] + ', '
-            out = out + 'and other counties/areas.'
-            region_count_out = 'These documents come from ' + out
-    else:
-        if len(region_info_count) > 3:
-            region_count_out = 'These documents come from more than ' + str(len(region_info_count)) + ' countries/areas.'
-        elif len(region_info_count) <= 3:
-            out = ''
-            for i, elm in enumerate(region_info_count):
-                if not i == len(region_info_count) - 1:
-                    out = out + elm[0] + ', '
-                else: out = out + 'and ' + elm[0] + '.'
-            region_count_out = 'These documents come from ' + out
-
-    print('')
-    print(region_count_out)
-
-
-    # Identify outliers in count for geo figure.
-    geo_count_outliers = mad_based_outlier(info_count[:, 0])
-    tgt_info_count = info_count[geo_count_outliers, :]
-    ind = np.where(tgt_info_count[:, 0] > np.mean(info_count[:, 0]))
-    tgt_info_count = tgt_info_count[ind[0], :]
-
-    for i, ab in np.ndenumerate(tgt_info_count[:,2]):
-        if region_info_count[int(ab)][0] == 'Unknown':   # ignore the Unknown countries/area.
-            tgt_info_count = np.delete(tgt_info_count, (i), axis=0)
-            break
-
-    if len(region_info_count) > 2 or (len(region_info_count) == 2 and not unknown):
-        if tgt_info_count.shape[0] == 0:
-            top_count = 'The documents come evenly from these countries/areas, with mean of ' + '{:.1%}'.format(np.mean(info_count[:, 0])) + ' and SD of ' + '{:.2%}'.format(np.std(info_count[:, 0])) + '.'
-            print(propout + top_count)
-        elif tgt_info_count.shape[0] == 1:
-            if not region_info_count[int(tgt_info_count[0][2])][0] == 'Unknown':
-                top_count = region_info_count[int(tgt_info_count[0][2])][0] + ' captures comparably more documents ' + ' (' + '{:.1%}'.format(info_count[int(tgt_info_count[0][2])][0]) + ') ' + ' than the others. '
-            #else:
-                #top_count = 'The source countries/areas of the documents cannot be identified.'
-            print(top_count)
-        elif tgt_info_count.shape[0] > 1:
-            top_count = 'The following countries capture comparably more documents than the others: '
-            print(top_count)
-            for i, ab in np.ndenumerate(tgt_info_count):
-                propout = region_info_count[int(tgt_info_count[i][2])][0] + ': ' + ' (' + '{:.1%}'.format(info_count[int(tgt_info_count[i][2])][0]) + ').'
-                print(propout)
-
-    print('')
-
-    # Identify outliers in sentiment for geo figure.
-    geo_sent_outliers = mad_based_outlier(info_sent[:, 1])
-    tgt_info_sent = info_sent[geo_sent_outliers, :]
-
-    for i, ab in np.ndenumerate(tgt_info_sent[:, 2]):
-        if region_info_sent[int(ab)][0] == 'Unknown':
-            tgt_info_sent = np.delete(tgt_info_sent, (i), axis=0)
-            break
-
-    ind = np.where(tgt_info_sent[:, 1] > np.mean(info_sent[:, 1]))
-    tgt_info_pos_sent = tgt_info_sent[ind[0], :]
-    ind = np.where(tgt_info_sent[:, 1] < np.mean(info_sent[:, 1]))
-    tgt_info_neg_sent = tgt_info_sent[ind[0], :]
-
-
-
-    if len(region_info_count) > 2 or (len(region_info_count) == 2 and not unknown):
-        if tgt_info_pos_sent.shape[0] == 0 and tgt_info_neg_sent.shape[0] == 0:
-            top_count = 'The sentiment scores of these documents are similar across different countries/areas, with mean of ' + '{:.2f}'.format(np.mean(info_sent[:, 1])) + ' and SD of ' + '{:.2f}'.format(np.std(info_sent[:, 1]))+ '.'
-            print(propout + top_count)
-        elif tgt_info_pos_sent.shape[0] == 1:
-            if not region_info_count[int(tgt_info_pos_sent[0][2])][0] == 'Unknown':
-                top_count = region_info_sent[int(tgt_info_pos_sent[0][2])][
-                                0] + ' captures comparably more positive documents than the others:' + ' On average ' + '{:.2f}'.format(
-                    info_sent[int(tgt_info_pos_sent[0][2])][1]) + ' out of a (-5, +5) scale over ' + str(int(tgt_info_pos_sent[0][0])) + ' Documents ('+\
-                            '{:.2%}'.format(int(tgt_info_pos_sent[0][0]) / total_count) + ' in total.)'
-            print(top_count)
-        elif tgt_info_pos_sent.shape[0] > 1:
-            top_count = 'The following countries capture comparably more positive documents than the others: '
-            print(top_count)
-            for i, ab in np.ndenumerate(tgt_info_pos_sent[:,0]):
-                propout = region_info_sent[int(tgt_info_pos_sent[i][2])][0] + ': ' + ' On average ' + '{:.2f}'.format(
-                    info_sent[int(tgt_info_pos_sent[i][2])][1]) + ' out of a (-5, +5) scale over ' + str(int(tgt_info_pos_sent[i][0])) + ' Documents ('+\
-                            '{:.2%}'.format(int(tgt_info_pos_sent[i][0]) / total_count) + ' in total.)'
-                print(propout)
-
-    if len(region_info_count) > 2 or (len(region_info_count) == 2 and not unknown):
-        if tgt_info_neg_sent.shape[0] == 1:
-            if not region_info_count[int(tgt_info_neg_sent[0][2])][0] == 'Unknown':
-                top_count = region_info_sent[int(tgt_info_neg_sent[0][2])][
-                                0] + ' captures comparably more negative documents than others:' + ' On average ' + '{:.2f}'.format(
-                    info_sent[int(tgt_info_neg_sent[0][2])][1]) + ' out of a (-5, +5) scale over ' + str(int(tgt_info_neg_sent[0][0])) + ' Documents ('+\
-                            '{:.2%}'.format(int(tgt_info_neg_sent[0][0]) / total_count) + ' in total.)'
-
-            print(top_count)
-        elif tgt_info_neg_sent.shape[0] > 1:
-            top_count = 'The following countries capture comparably more negative documents than the others: '
-            print(top_count)
-            for i, ab in np.ndenumerate(tgt_info_neg_sent[:, 0]):
-                propout = region_info_sent[int(tgt_info_neg_sent[i][2])][0] + ': On average ' + '{:.2f}'.format(
-                    info_sent[int(tgt_info_neg_sent[i][2])][1]) + ' out of a (-5, +5) scale over ' + str(int(tgt_info_neg_sent[i][0])) + ' Documents ('+\
-                            '{:.2%}'.format(int(tgt_info_neg_sent[i][0]) / total_count) + ' in total.)'
-                print(propout)
-
-    print('')
+    parser = argparse.ArgumentParser(description='Narrate the data of a semantic topic figure.')
+    parser.add_argument('json_file_name', nargs='?', default=json_file_name,
+                        help='the input json file (default: %(default)s)')
+    args = parser.parse_args(argv)
 
-    """
-    Time trend analysis
-    """
+    for report in SemanticTopicReport.from_file(args.json_file_name):
+        sys.stdout.write(report.text)
+        if report.profile is not None:
+            emit_profile(report.profile, args.json_file_name)
 
 
-    temp_trend(tpcnum, slt, start, end, interval, dict_tpc)
+if __name__ == '__main__':
+    main()
@@ -1,126 +1,168 @@
 import numpy as np
-import json
-import pandas as pd
-import operator
-from json_methods import Time_Slot_Trans, dict_normalize, time_series_analysis, time_unit
+from json_cache import content_key
+from json_columnar import TimebinColumns
+from json_methods import Time_Slot_Trans, correlation_matrix, pearson_to, related_pairs, slot_labels, \
+    time_series_analysis, time_unit
+from json_profile import stage
+from json_render import write
+from json_sketch import HeavyHitters
+from json_table import TermMatrix, top_terms
 
 """ The temporal trend is pretty complicated. So I use a single script to implement it.
 """
 
-def temp_trend(tpc, slt, start, end, interval, l):
+def temp_trend(tpc, slt, start, end, interval, l, out=None, cache=None, state=None, topic_pairs=0, tz=None,
+               sketch_capacity=None):
     """ The inputs are:
         tpc: topic number
         slt: slot length
         start: start time
         end: end time
         interval: time unit
-        l: the temporal trend data
+        l: the temporal trend data (a parsed widget, a level of a json_rollup.Pyramid, or a
+            json_columnar.TimebinColumns)
+        out: file the narrative is written to (sys.stdout by default)
+        cache: a json_cache.ResultCache for the narrative and the series statistics (optional)
+        state: a json_incremental.TemporalState kept between calls on a growing widget (optional)
+        topic_pairs: number of the most correlated pairs of topics to narrate (none by default)
+        tz: time zone of the dates, a tzinfo or a name such as 'UTC' (the local time by default)
+        sketch_capacity: count the keywords of all topics with a json_sketch.HeavyHitters of
+            this many counters instead of exactly (for very large vocabularies). Only the
+            keywords of all topics (their counts are lower bounds) are approximate; the keywords
+            of each topic, the series and the rest of the narrative stay exact.
     """
 
+    facts = temp_trend_facts(tpc, slt, start, end, interval, l, cache, state, topic_pairs, tz, sketch_capacity)
+    with stage('render'):
+        write(facts, out)
 
-    words_display_num = 5
-    stdate, eddate, intdate, st, ed = time_unit(start, end, interval) # Translate the time in nature language style.
 
+def temp_trend_facts(tpc, slt, start, end, interval, l, cache=None, state=None, topic_pairs=0, tz=None,
+                     sketch_capacity=None):
+    """ The facts of the temporal trend narrative (see json_render), with the inputs of temp_trend.
+    With a cache the facts are kept there, to be rendered again without the analysis.
+    """
 
-    mymatrix = np.zeros((tpc, slt)) # Storing count info
-    mysentPmatrix = np.zeros((tpc, slt))  # Storing positive info
-    mysentNmatrix = np.zeros((tpc, slt)) # Storing negative info
-    mykwdmatrix = []
-    keywordmatrix = []
-    status = {}
-    total_key_word_dict = {}
-    for i, elm in enumerate(l['bins']):
-        mymatrix[i][:] = np.array(elm['c'])
+    if cache is None:
+        with stage('temp_trend'):
+            return _temp_trend(tpc, slt, start, end, interval, l, None, state, topic_pairs, tz, sketch_capacity)
 
-        mysentPmatrix[i][:] = np.array(elm['p'])
-        mysentNmatrix[i][:] = np.array(elm['n'])
+    widget = l.key if isinstance(l, TimebinColumns) else l
+    key = content_key('temp_trend', 'facts', tpc, slt, start, end, interval, widget, topic_pairs,
+                      None if tz is None else str(tz), sketch_capacity)
+    facts = cache.get(key)
+    if facts is None:
+        with stage('temp_trend'):
+            facts = _temp_trend(tpc, slt, start, end, interval, l, cache, state, topic_pairs, tz, sketch_capacity)
+        cache.put(key, facts)
+    return facts
 
-        x = np.array(elm['c'])
-        x = x[np.nonzero(x)]
-        status[i] = time_series_analysis(x, intdate)
 
+def _temp_trend(tpc, slt, start, end, interval, l, cache, state, topic_pairs, tz, sketch_capacity):
 
-        '''
-        find key words with respect to counts
-        '''
 
-        curslot = list(filter(None, elm['terms']))
-        key_word_dict = {}
-        for key_words in curslot:
-            for key_word in key_words:
-                if key_word['text'] in key_word_dict.keys():
-                    key_word_dict[key_word['text']] += key_word['c']
-                else:
-                    key_word_dict[key_word['text']] = key_word['c']
+    words_display_num = 5
+    stdate, eddate, intdate, st, ed = time_unit(start, end, interval, tz) # Translate the time in nature language style.
 
-                if key_word['text'] in total_key_word_dict.keys():
-                    total_key_word_dict[key_word['text']] += key_word['c']
-                else:
-                    total_key_word_dict[key_word['text']] = key_word['c']
-        mykwdmatrix.append(dict_normalize(key_word_dict))
 
-        # Sort the words by total count
-        sorted_key_word = sorted(key_word_dict.items(), key=operator.itemgetter(1), reverse=True)
-        test = [elm[0] for elm in sorted_key_word[0:words_display_num]]
-        keywordmatrix.append(test)
+    if state is not None:
+        # the state keeps the matrices and the keywords, and reads only the new slots of l.
+        state.update(l, intdate, start, keywords=not sketch_capacity)
+        mymatrix, mysentmatrix = state.count, state.sent
+    else:
+        mymatrix = np.zeros((tpc, slt)) # Storing count info
+        mysentPmatrix = np.zeros((tpc, slt))  # Storing positive info
+        mysentNmatrix = np.zeros((tpc, slt)) # Storing negative info
+        for i, elm in enumerate(l['bins']):
+            mymatrix[i][:] = np.array(elm['c'])
+
+            mysentPmatrix[i][:] = np.array(elm['p'])
+            mysentNmatrix[i][:] = np.array(elm['n'])
+        mysentmatrix = np.add(mysentNmatrix, mysentPmatrix)
 
-    # Sort words for each topic and store the top words_display_num words
-    finalmykwdmatrix = []
-    for ind, sbtpc in enumerate(range(tpc)):
-        curkey_word_dict = mykwdmatrix[ind]
-        sorted_key_word = sorted(curkey_word_dict.items(), key=operator.itemgetter(1), reverse=True)
-        test = [elm for elm in sorted_key_word[0:words_display_num]]
-        finalmykwdmatrix.append(test)
+    # the total count series, and the sentiment normalized with respect to count and its total series.
+    sumx = np.sum(mymatrix, axis=0)
+    sumx = sumx[np.nonzero(sumx)]
+    mysentmatrix = np.divide(mysentmatrix, mymatrix)
+    sumsentx = np.sum(mysentmatrix, axis=0)
+    sumsentx[np.argwhere(np.isnan(sumsentx))] = 0
+    sumsentx_ori = sumsentx[np.nonzero(sumsentx)]
+    sumsentx = np.divide(sumsentx_ori, sumx)
 
+    '''
+    find key words with respect to counts: the counts of every topic summed over its slots,
+    in one sparse topic x term matrix over the vocabulary of the widget.
+    With sketch_capacity no vocabulary of the widget is built: the keywords of every topic are
+    counted one topic at a time and those of all topics streamed into the sketch.
+    '''
+    with stage('keywords'):
+        if isinstance(l, TimebinColumns):
+            keywords = l.keywords
+        elif sketch_capacity:
+            keywords = None
+        elif state is not None:
+            keywords = state.keywords()
+        else:
+            keywords = TermMatrix(l['bins'])
 
-    total_sorted_key_word = sorted(total_key_word_dict.items(), key=operator.itemgetter(1), reverse=True)
-    total_test = [elm for elm in total_sorted_key_word[0:words_display_num]]
-    total_amount = sum([elm[1] for elm in total_sorted_key_word[0:words_display_num]])
+        # Sort words for each topic (normalized to sum to 1) and store the top words_display_num words
+        if keywords is None:
+            finalmykwdmatrix = top_terms(l['bins'], words_display_num)
+            total_test = _sketch_total(l['bins'], words_display_num, sketch_capacity)
+        else:
+            normalized = keywords.normalized()
+            finalmykwdmatrix = [keywords.top(ind, words_display_num, normalized) for ind in range(tpc)]
+            total_test = keywords.top_total(words_display_num)
+    total_amount = sum([elm[1] for elm in total_test])
 
     '''
     time trend analysis for the total counts
     '''
 
-    sumx = np.sum(mymatrix, axis=0)
-    sumx = sumx[np.nonzero(sumx)]
-    sum_status = time_series_analysis(sumx, intdate)
+    # the narrative only uses the trend of the totals, the topics are compared through their correlations.
+    if state is not None:
+        sum_status = state.total.status()
+    else:
+        sum_status = time_series_analysis(sumx, intdate, cache=cache)
 
     # find the peak and valley time and translate them into nature language style.
-    peak_time = Time_Slot_Trans(np.argmax(sumx) + 1, start, end, interval, intdate)
-    valley_time = Time_Slot_Trans(np.argmin(sumx) + 1, start, end, interval, intdate)
+    peak_time = _slot_label(np.argmax(sumx) + 1, l, start, end, interval, intdate, tz)
+    valley_time = _slot_label(np.argmin(sumx) + 1, l, start, end, interval, intdate, tz)
+
 
+    facts = []
+    out = facts.append
+    period = {'start': stdate, 'end': eddate}
+    peak_valley = ('peak_valley', {'peak': peak_time, 'valley': valley_time})
 
     if not sum_status[1]: # if all of the topics do not have periodicity.
-        print('For all of the documents, the temporal pattern exhibits ' + sum_status[0] + ' over the period from ' + stdate + ' to '+ eddate + '.')
-        print('It reaches peak at ' + peak_time + ' and touches valley at ' + valley_time + '.')
+        out(('total_trend', dict(period, pattern=sum_status[0])))
+        out(peak_valley)
     else: # else output propoer wordings for various situations.
         if sum_status[0].find('significant'):
             if sum_status[1]:
-                print('For all of the documents, the temporal pattern exhibits ' + sum_status[0] + ' with ' + sum_status[1] + ' over the period from ' + stdate + ' to '+ eddate + '.')
+                out(('total_trend_with', dict(period, pattern=sum_status[0], detail=sum_status[1])))
 
-                print('It reaches peak at ' + peak_time + ' and touches valley at ' + valley_time + '.')
+                out(peak_valley)
 
         elif sum_status[0].find('plausible'):
             if sum_status[1].find('slight'):
-                print('For all of the documents, the temporal pattern exhibits ' + sum_status[0] + ' with ' + sum_status[1] + ' over the period from ' + stdate + ' to '+ eddate + '.')
-                print('It reaches peak at ' + peak_time + ' and touches valley at ' + valley_time + '.')
+                out(('total_trend_with', dict(period, pattern=sum_status[0], detail=sum_status[1])))
+                out(peak_valley)
             elif sum_status[1]:
-                print('For all of th documents, the temporal pattern exhibits ' + sum_status[1] + ' with ' + sum_status[0] + ' over the period from ' + stdate + ' to '+ eddate + '.')
-                print('It reaches peak at ' + peak_time + ' and touches valley at ' + valley_time + '.')
+                out(('total_period_with', dict(period, pattern=sum_status[1], detail=sum_status[0])))
+                out(peak_valley)
 
     '''
     The count correlation over time for each topic, comparing to the total trend
     '''
-    print(' ')
+    out(('space', {}))
 
     tplist = [i for i in range(mymatrix.shape[0])]
-    ts0 = pd.Series(sumx)
-    pearsonr = []
 
-    # calculate pearson correlation for each topic to the total trend.
-    for elm in tplist:
-        ts1 = pd.Series(mymatrix[elm][np.nonzero(mymatrix[elm][:])])
-        pearsonr.append(ts0.corr(ts1))
+    # calculate pearson correlation for each topic to the total trend, all topics in one pass.
+    with stage('correlation'):
+        pearsonr = pearson_to([mymatrix[elm][np.nonzero(mymatrix[elm][:])] for elm in tplist], sumx)
 
     # proper wordings for various correlation results.
     corrwords = ['strongly related',
@@ -141,14 +183,20 @@ def temp_trend(tpc, slt, start, end, interval, l):
     for i, rst in enumerate(rsts):
         if rst.shape[0] > 0:
             if rst.shape[0] == pearsonr.shape[0]:
-                print('All of the categories in the documents are ' + str(corrwords[i]) + ' with the change of the total trend.')
+                out(('all_related', {'relation': corrwords[i]}))
             else:
                 if rst.shape[0] == 1:
-                    category = ' categories is '
+                    category = 'one_related'
                 else:
-                    category = ' categories are '
-                print(str(rst.shape[0]) + ' of the total ' + str(pearsonr.shape[0]) + category + str(
-                    corrwords[i]) + ' with the total document amount trend.')
+                    category = 'some_related'
+                out((category, {'count': rst.shape[0], 'total': pearsonr.shape[0], 'relation': corrwords[i]}))
+
+    # the pairs of topics whose counts move together over the slots.
+    if topic_pairs:
+        with stage('topic_pairs'):
+            pairs = related_pairs(correlation_matrix(mymatrix), topic_pairs)
+        if pairs:
+            out(('topic_pairs', {'pairs': [('topic_pair', {'first': i, 'second': j, 'r': r}) for i, j, r in pairs]}))
 
 
     '''
@@ -156,174 +204,125 @@ def temp_trend(tpc, slt, start, end, interval, l):
     '''
 
     if len(total_test) > 1:
-        totalwordList = ", ".join(str(e) for e in total_test[:-1])
-        totalwordList = totalwordList + ' and ' + str(total_test[-1]) + ', etc.'
-        print('Among these categories, the key words that generate most of the discussions are:')
+        out(('keywords', {}))
         for e in total_test:
-            print(str(e[0]) + ' (' + '{:.1%}'.format(e[1]/total_amount) + ' of the documents)')
+            out(('keyword', {'keyword': str(e[0]), 'share': e[1]/total_amount}))
     else:
-        totalwordList = total_test[0]
-        print('Among these categories, ' + str(totalwordList) + ' generates most of the discussions.' + ' ( ' + '{:.1%}'.format(total_test[1]/total_amount) + ' of the documents )')
+        out(('top_keyword', {'keyword': str(total_test[0]), 'share': total_test[1]/total_amount}))
 
 
 
     '''
     Sentiment Summary. The logic is similar as count, but the interested variables are changed to sentiment related.
     '''
-    print(' ')
-    mysentmatrix = np.add(mysentNmatrix, mysentPmatrix)
-    mysentmatrix = np.divide(mysentmatrix, mymatrix) # normalize sentiment score with respect to count.
-    sumsentx = np.sum(mysentmatrix, axis=0)
-    sumsentx[np.argwhere(np.isnan(sumsentx))] = 0
-    sumsentx_ori = sumsentx[np.nonzero(sumsentx)]
-    sumsentx = np.divide(sumsentx_ori, sumx)
+    out(('space', {}))
 
     # Find peak and valley sentiment time and translate it into nature languange style.
-    sent_peak_time = Time_Slot_Trans(np.argmax(sumsentx) + 1, start, end, interval, intdate)
-    sent_valley_time = Time_Slot_Trans(np.argmin(sumsentx) + 1, start, end, interval, intdate)
+    sent_peak_time = _slot_label(np.argmax(sumsentx) + 1, l, start, end, interval, intdate, tz)
+    sent_valley_time = _slot_label(np.argmin(sumsentx) + 1, l, start, end, interval, intdate, tz)
 
-    sumsent_status = time_series_analysis(sumsentx, intdate)
+    if state is not None:
+        sumsent_status = state.sentiment.status()
+    else:
+        sumsent_status = time_series_analysis(sumsentx, intdate, cache=cache)
     avgsent = np.mean(sumsentx)
 
-    if avgsent > 0: #if the overall sentiment is positive.
+    sent_peak_valley = ('peak_valley', {'peak': sent_peak_time, 'valley': sent_valley_time})
+    sent_valley_peak = ('valley_peak', {'peak': sent_peak_time, 'valley': sent_valley_time})
+    pattern, detail = sumsent_status[0], sumsent_status[1]
 
-        opt = 'The overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is positive. '
+    if avgsent > 0: #if the overall sentiment is positive.
 
         if not sumsent_status[1]:   #if there is periodicty
 
             if sumsent_status[0].find('significant upward'):
-                print(
-                    opt + 'For the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' with ' + sumsent_status[1] + ' during the period.')
+                out(('positive_with', dict(period, pattern=pattern, detail=detail)))
 
-                print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                out(sent_peak_valley)
 
             elif sumsent_status[0].find('significant downward'):
 
-                opt = 'Although the overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is positive, '
-
-                print(opt + 'for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ', with ' + sumsent_status[1] + ' during this period.')
+                out(('although_positive_this', dict(period, pattern=pattern, detail=detail)))
 
-                print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                out(sent_valley_peak)
 
             elif sumsent_status[0].find('plausible upward'):
 
                 if sumsent_status[1].find('slight'):
-                    print(opt + 'For the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ', with ' + sumsent_status[1] + ' during the period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                    out(('positive_comma', dict(period, pattern=pattern, detail=detail)))
+                    out(sent_peak_valley)
                 else:
-                    print(opt + 'For the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[1] + ', with ' + sumsent_status[0] + ' during the period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                    out(('positive_comma', dict(period, pattern=detail, detail=pattern)))
+                    out(sent_peak_valley)
 
 
             elif sumsent_status[0].find('plausible downward'):
 
-                opt = 'Although the overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is positive, '
-
                 if sumsent_status[1].find('slight'):
-                    print(
-                        opt + 'for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ', with ' + sumsent_status[1] + ' during the period.')
+                    out(('although_positive_comma', dict(period, pattern=pattern, detail=detail)))
 
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                    out(sent_valley_peak)
                 else:
-                    print(
-                        opt + 'for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[1] + ', with ' + sumsent_status[0] + ' during the period.')
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                    out(('although_positive_comma', dict(period, pattern=detail, detail=pattern)))
+                    out(sent_valley_peak)
 
         else: #if there is no periodicty
             if sumsent_status[0].find('significant upward'):
-                print(opt + 'For the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
+                out(('positive', dict(period, pattern=pattern)))
 
-                print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                out(sent_peak_valley)
 
             elif sumsent_status[0].find('significant downward'):
 
-                opt = 'Although the overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is positive, '
-
+                out(('although_positive', dict(period, pattern=pattern)))
 
-                print(opt + 'for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
-
-                print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                out(sent_valley_peak)
 
             elif sumsent_status[0].find('plausible upward'):
 
-                if sumsent_status[1].find('slight'):
-                    print(opt + 'And for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
-                else:
-                    print(opt + 'And for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                out(('positive_and', dict(period, pattern=pattern)))
+                out(sent_peak_valley)
 
 
             elif sumsent_status[0].find('plausible downward'):
 
-                opt = 'Although the overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is positive, '
+                out(('although_positive_and', dict(period, pattern=pattern)))
 
-                if sumsent_status[1].find('slight'):
-                    print(opt + 'and for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
-
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
-                else:
-                    print(
-                        opt + 'and for the total number of positive sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                out(sent_valley_peak)
 
     else:
-        opt = 'The overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is negative. '
-
         if not sumsent_status[1]:
-            print(opt + 'For the total negative sentiment documents, the temporal pattern exhibits ' + sumsent_status[0] + ' during the period.')
+            out(('negative', dict(period, pattern=pattern)))
         else:
 
             if sumsent_status[0].find('significant upward'):
 
-                opt = 'Although the overall average sentiment for all of the documents over the period from ' + stdate + ' to '+ eddate + ' is negative, '
+                out(('although_negative_improvement', dict(period, detail=detail)))
 
-                print(
-                    opt + 'there is a significant improvement for the total sentiment scores, associated with ' +
-                    sumsent_status[
-                        1] + ' during the period.')
-
-                print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                out(sent_peak_valley)
 
             elif sumsent_status[0].find('significantly decreasing'):
 
-                #opt = 'Although the overall average sentiment over the period from xxx to xxx is positive, '
-
-                print(opt + 'What is worse, there is a sever deterioration for the total sentiment scores, associated with ' +
-                      sumsent_status[
-                          1] + ' during this period.')
+                out(('negative_deterioration', dict(period, detail=detail)))
 
-                print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                out(sent_valley_peak)
 
             elif sumsent_status[0].find('plausibly increasing'):
 
-                opt = 'Although the overall average sentiment over the period from ' + stdate + ' to '+ eddate + ' is negative, '
-
-
                 if sumsent_status[1].find('slight'):
-
-                    print(opt + 'there is ' + sumsent_status[
-                        0] + ' for the total trend, associated with slightly improvement during this period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                    out(('although_negative_increasing', dict(period, pattern=pattern)))
                 else:
-                    print(opt + 'there is ' + sumsent_status[
-                        1] + ' for the total trend, associated with slightly improvement during this period.')
-                    print('It reaches peak at ' + sent_peak_time + ' and touches valley at ' + sent_valley_time + '.')
+                    out(('although_negative_increasing', dict(period, pattern=detail)))
+                out(sent_peak_valley)
 
 
             elif sumsent_status[0].find('plausibly decreasing'):
 
                 if sumsent_status[1].find('slight'):
-                    print(
-                        opt + 'What is worse, there is a plausible deterioration for the total sentiment scores, associated with ' +
-                        sumsent_status[
-                            1] + ' during this period.')
-
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                    out(('negative_plausible_deterioration', dict(period, detail=detail)))
                 else:
-                    print(
-                        opt + 'What is worse, there is ' + sumsent_status[1] + ' for the total sentiment scores, associated with a plausible deterioration during this period.')
-                    print('It touches valley at ' + sent_valley_time + ' and reaches peak at ' + sent_peak_time + '.')
+                    out(('negative_worse', dict(period, detail=detail)))
+                out(sent_valley_peak)
 
 
     '''
@@ -331,12 +330,10 @@ def temp_trend(tpc, slt, start, end, interval, l):
     '''
 
     tplist = [i for i in range(mysentmatrix.shape[0])]
-    ts0 = pd.Series(sumsentx)
 
-    pearsonr = []
-    for i, elm in enumerate(tplist):
-        ts1 = pd.Series(np.divide(mysentmatrix[elm][np.nonzero(mymatrix[elm][:])], mymatrix[elm][np.nonzero(mymatrix[elm][:])]))
-        pearsonr.append([ts0.corr(ts1)])
+    with stage('sentiment_correlation'):
+        pearsonr = pearson_to([np.divide(mysentmatrix[elm][np.nonzero(mymatrix[elm][:])], mymatrix[elm][np.nonzero(mymatrix[elm][:])])
+                               for elm in tplist], sumsentx)
 
 
 
@@ -375,30 +372,51 @@ def temp_trend(tpc, slt, start, end, interval, l):
     for i, rst in reversed(list(enumerate(rsts))):
         if rst.shape[0] > 0:
             if rst.shape[0] == pearsonr.shape[0]:
-                if i < 3:
-                    print('All of topics are ' + str(corrwords[i]) + ' in sentiment to the overall trend.')
-                else:
-                    print('All of topics are ' + str(
-                        corrwords[i]) + ' in sentiment to the overall trend.')
+                out(('all_sentiment_related', {'relation': corrwords[i]}))
             else:
                 if rst.shape[0] == 1:
-                    tpcs = ' topics is '
-                    be = 'The topic id and frequently mentioned words in this topic include: '
+                    tpcs = 'one_sentiment_related'
+                    be = 'topic_keywords_one'
                 elif rst.shape[0] > 1:
-                    tpcs = ' topics are '
-                    be = 'The topic ids and frequently mentioned words in these topics include: '
-                print(str(rst.shape[0]) + ' of the ' + str(pearsonr.shape[0]) + tpcs + str(corrwords[i]) + ' in sentiment to the overall trend.')
+                    tpcs = 'some_sentiment_related'
+                    be = 'topic_keywords_many'
+                out((tpcs, {'count': rst.shape[0], 'total': pearsonr.shape[0], 'relation': corrwords[i]}))
                 if i > 3:
-                    print(be)
+                    out((be, {}))
                     for tpcid, elm in enumerate(tpcrsts[i]):
+                        keywords = [('keyword_share', {'keyword': str(e[0]), 'share': float(e[1])})
+                                    for e in tpcrsts[i][tpcid]]
+                        out(('topic_keywords', {'topic': int(tpcID[i][tpcid]), 'keywords': keywords}))
 
-                        keywordList = ", ".join(e[0] + ' (' + '{:.1%}'.format(float(e[1])) + ')' for e in tpcrsts[i][tpcid])
-                        keywordList = keywordList + ', etc.'
-                        print('No.' + str(tpcID[i][tpcid]) + ' topic: ' + keywordList)
+    return facts
+
+
+def _slot_label(num, l, start, end, interval, intdate, tz):
+    """ Time_Slot_Trans, or on a level of a json_rollup.Pyramid (with 'bucket_starts') the label
+    of the start of bucket num (of the end of the last bucket for num = the number of buckets).
+    """
 
+    if 'bucket_starts' in l:
+        edges = list(l['bucket_starts']) + [l['bucket_end']]
+        return slot_labels(edges[num], interval, intdate, 1, tz)[0]
+    return Time_Slot_Trans(num, start, end, interval, intdate, tz)
 
 
-def json_read(json_file_name):
-    with open(json_file_name, 'r') as f:
-        for line in f:
-            yield json.loads(line)
+def _sketch_total(bins, k, capacity):
+    """ The k (term, count) pairs of the keywords of all bins with the largest approximate
+    counts (lower bounds, see json_sketch.HeavyHitters), counted one bin at a time.
+    """
+
+    sketch = HeavyHitters(capacity)
+    for elm in bins:
+        entries = [key_word for key_words in elm['terms'] if key_words for key_word in key_words]
+        sketch.update([key_word['text'] for key_word in entries], [key_word['c'] for key_word in entries])
+    return [(row['item'], int(row['count'])) for row in sketch.top(k)]
+
+
+def temp_trend_widget(l, out=None, cache=None, state=None, topic_pairs=0, tz=None, sketch_capacity=None):
+    """ temp_trend on a temporal trend widget (a parsed temporal.json line).
+    """
+
+    temp_trend(len(l['bins']), len(l['bins'][0]['c']), l['bucket_start'], l['bucket_end'], l['interval'], l,
+               out=out, cache=cache, state=state, topic_pairs=topic_pairs, tz=tz, sketch_capacity=sketch_capacity)
@@ -0,0 +1,145 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+'''
+Opt-in profiling of the narration stages.
+The analysis code marks its stages with "with stage('name'):". Outside a Profiler that
+is a no-op; inside one, the wall time, the number of calls and the peak of the memory
+traced by tracemalloc above the level at the start of the stage are recorded per stage.
+Stages nest, and are reported by their path, e.g. 'temporal/time_series_analysis/decomposition'.
+
+Profiling is switched on by the API (SemanticTopicReport(widget, profile=True), or
+"with Profiler() as profiler:" around any call) or by the NLG_PROFILE environment
+variable: with NLG_PROFILE=1 the scripts write the profile of each narration to stderr
+as one JSON document, with NLG_PROFILE=<file> they append it to that file (JSON lines).
+Memory tracing slows the run down noticeably; Profiler(memory=False) only takes the times.
+'''
+
+
+_current = contextvars.ContextVar('nlg_profiler', default=None)
+_null = contextlib.nullcontext()
+
+
+def profile_requested():
+    """ Whether the NLG_PROFILE environment variable asks for profiles.
+    """
+
+    return os.environ.get('NLG_PROFILE', '').lower() not in ('', '0', 'false', 'no')
+
+
+def current():
+    """ The active Profiler, or None.
+    """
+
+    return _current.get()
+
+
+def stage(name):
+    """ Context manager recording the stage name in the active Profiler, if any.
+    """
+
+    profiler = _current.get()
+    if profiler is None:
+        return _null
+    return profiler.stage(name)
+
+
+def active(profiler):
+    """ Context manager making profiler the active one; None gives a no-op.
+    """
+
+    if profiler is None:
+        return _null
+    return profiler
+
+
+class Profiler(object):
+    """ Per-stage wall time, call count and peak traced memory of everything run while it is active.
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stages = {}
+        self._stack = []  # [path, traced memory at entry, highest peak seen] of the open stages
+        self._depth = 0
+        self._token = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        self._depth += 1
+        if self._depth == 1:
+            self._token = _current.set(self)
+            if self.memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            _current.reset(self._token)
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        path = self._stack[-1][0] + '/' + name if self._stack else name
+        tracing = self.memory and tracemalloc.is_tracing()
+        current = 0
+        if tracing:
+            # tracemalloc has a single peak: hand the peak so far to the enclosing stage and restart it.
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][2] = max(self._stack[-1][2], peak)
+            tracemalloc.reset_peak()
+        frame = [path, current, current]
+        self._stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self._stack.pop()
+            peak = 0
+            if tracing and tracemalloc.is_tracing():
+                top = max(frame[2], tracemalloc.get_traced_memory()[1])
+                peak = top - frame[1]
+                if self._stack:
+                    self._stack[-1][2] = max(self._stack[-1][2], top)
+                tracemalloc.reset_peak()
+
+            record = self.stages.get(path)
+            if record is None:
+                record = self.stages[path] = {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0}
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+
+    def report(self):
+        """ The profile as a json-ready dict.
+        """
+
+        return {'memory': self.memory,
+                'seconds': sum(record['seconds'] for path, record in self.stages.items() if '/' not in path),
+                'stages': dict((path, dict(record)) for path, record in self.stages.items())}
+
+
+def emit_profile(profile, source=None):
+    """ Write a profile where NLG_PROFILE says: stderr for 1/true/yes, else the file it names.
+    """
+
+    document = json.dumps(dict(source=source, **profile))
+    destination = os.environ.get('NLG_PROFILE', '1')
+    if destination.lower() in ('1', 'true', 'yes', 'stderr'):
+        sys.stderr.write(document + '\n')
+    else:
+        with open(destination, 'a') as f:
+            f.write(document + '\n')
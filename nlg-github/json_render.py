@@ -0,0 +1,249 @@
+import sys
+from string import Formatter
+
+
+'''
+Rendering of the narratives from facts.
+The analyses do not build sentences: they produce facts, (name, values) pairs where name
+selects a sentence template and values is a dict of the fields the template formats.
+The facts of a widget can be cached and rendered again, in another locale too, without
+analyzing the widget again.
+
+templates[locale] maps the fact names to templates in str.format syntax, e.g.
+'{documents} documents ({share:.2%})'. A field can also be a list, enumerated with one of
+the list conversions of the locale (lists[locale]):
+  !l  'a, b, and c.'  (the key words of a topic)
+  !j  'a, b, c'
+  !e  'a, b, c, '     (followed by more text)
+The items of a list are strings or facts, which are rendered first.
+Each template is parsed once into its literals and fields (compiled(locale)), which are
+filled in without evaluating any code, so templates can come from outside: a field is a name,
+optionally with a format spec and a list conversion, and compiled raises ValueError on any
+other field (attributes, indexes, positional fields, !r, !s, !a). render(facts) joins
+the sentences, one per line, into one string and write(facts, out) writes it at once.
+Another locale is added with add_locale(locale, templates, lists), its templates
+having the same names as the English ones.
+'''
+
+
+def keyword_list(words):
+    """ 'a, b, c, and d.' style enumeration of the key words of a topic.
+    """
+
+    return ''.join(word + ', ' for word in words[:-1]) + 'and ' + words[-1] + '.'
+
+
+# the last sentence of every region's sentiment.
+_region_detail = 'On average {sentiment:.2f} out of a (-5, +5) scale over {documents} Documents ({share:.2%} in total.)'
+
+# the overall sentiment of the temporal trend, the opening of the sentiment sentences.
+_positive = 'The overall average sentiment for all of the documents over the period from {start} to {end} is positive. '
+_although_positive = 'Although the overall average sentiment for all of the documents over the period from {start} ' \
+                     'to {end} is positive, '
+_negative = 'The overall average sentiment for all of the documents over the period from {start} to {end} is negative. '
+_although_negative = 'Although the overall average sentiment for all of the documents over the period from {start} ' \
+                     'to {end} is negative, '
+_positive_documents = 'for the total number of positive sentiment documents, the temporal pattern exhibits '
+
+templates = {'en': {
+    'blank': '',
+    'space': ' ',
+
+    # semantic topic report
+    'summary': 'The {documents} documents collected from {start} to {end} are categorized into {topics} topics.',
+    'buzzwords': 'Top buzzwords and the sentiment (on a -5 ~ 5 scale) associated with them mentioned in these '
+                 'documents include: ',
+    'buzzword': '{term}: appeared in {documents} out of {total} documents ({share:.2%}), with overall '
+                '{sentiment:.2f} sentiment.',
+    'proportion_range': 'The proportion of each topic in the total documents ranges from {min:.1%} to {max:.1%}. ',
+    'proportion_even': 'The proportion of each topic in the total documents ranges from {min:.1%} to {max:.1%}. '
+                       'The proportions are evenly distributed, with mean of {mean:.1%} and SD of {sd:.2%}.',
+    'proportion_outlier': 'There is one topic that captures comparably more documents: ',
+    'proportion_outliers': 'The topics that capture comparably more documents include: ',
+    'proportion_topic': 'Topic {topic} ({value:.1%}), top keywords: {keywords!l}',
+    'sentiment_even': 'The sentiment score of each topics ranges from {min:.2f} to {max:.2f}, out of a (-5, +5) '
+                      'scale. The sentiment scores are evenly distributed among all of the topics, with mean of '
+                      '{mean:.2f} and SD of {sd:.2f}.',
+    'positive_outlier': 'There is one topic that captures comparably more positive sentiment: ',
+    'positive_outliers': 'The topics that capture comparably more positive sentiment include: ',
+    'negative_outlier': 'There is one topic that captures comparably more negative sentiment: ',
+    'negative_outliers': 'The topics that capture comparably more negative sentiment include: ',
+    'sentiment_topic': 'Topic {topic} ({value:.2f}),top key words: {keywords!l}',
+    'regions_many': 'These documents come from more than {regions} countries/areas.',
+    'regions_other': 'These documents come from {names!e}and other counties/areas.',
+    'regions': 'These documents come from {names!l}',
+    'regions_even': 'The documents come evenly from these countries/areas, with mean of {mean:.1%} and SD of {sd:.2%}.',
+    'region_outlier': '{region} captures comparably more documents  ({share:.1%})  than the others. ',
+    'region_outliers': 'The following countries capture comparably more documents than the others: ',
+    'region_share': '{region}:  ({share:.1%}).',
+    'areas': 'By area, the documents come from {areas!l}',
+    'area': '{area} ({share:.1%}, {sentiment:.2f} sentiment)',
+    'regions_sentiment_even': 'The sentiment scores of these documents are similar across different '
+                              'countries/areas, with mean of {mean:.2f} and SD of {sd:.2f}.',
+    'positive_region': '{region} captures comparably more positive documents than the others: ' + _region_detail,
+    'positive_regions': 'The following countries capture comparably more positive documents than the others: ',
+    'positive_region_detail': '{region}:  ' + _region_detail,
+    'negative_region': '{region} captures comparably more negative documents than others: ' + _region_detail,
+    'negative_regions': 'The following countries capture comparably more negative documents than the others: ',
+    'negative_region_detail': '{region}: ' + _region_detail,
+
+    # temporal trend
+    'total_trend': 'For all of the documents, the temporal pattern exhibits {pattern} over the period from {start} '
+                   'to {end}.',
+    'total_trend_with': 'For all of the documents, the temporal pattern exhibits {pattern} with {detail} over the '
+                        'period from {start} to {end}.',
+    'total_period_with': 'For all of th documents, the temporal pattern exhibits {pattern} with {detail} over the '
+                         'period from {start} to {end}.',
+    'peak_valley': 'It reaches peak at {peak} and touches valley at {valley}.',
+    'valley_peak': 'It touches valley at {valley} and reaches peak at {peak}.',
+    'all_related': 'All of the categories in the documents are {relation} with the change of the total trend.',
+    'one_related': '{count} of the total {total} categories is {relation} with the total document amount trend.',
+    'some_related': '{count} of the total {total} categories are {relation} with the total document amount trend.',
+    'topic_pairs': 'The topics that move together over time are: {pairs!j}.',
+    'topic_pair': 'No.{first} and No.{second} ({r:.2f})',
+    'keywords': 'Among these categories, the key words that generate most of the discussions are:',
+    'keyword': '{keyword} ({share:.1%} of the documents)',
+    'top_keyword': 'Among these categories, {keyword} generates most of the discussions. ( {share:.1%} of the '
+                   'documents )',
+    'positive_with': _positive + _positive_documents.capitalize() + '{pattern} with {detail} during the period.',
+    'positive_comma': _positive + _positive_documents.capitalize() + '{pattern}, with {detail} during the period.',
+    'positive': _positive + _positive_documents.capitalize() + '{pattern} during the period.',
+    'positive_and': _positive + 'And ' + _positive_documents + '{pattern} during the period.',
+    'although_positive_comma': _although_positive + _positive_documents + '{pattern}, with {detail} during the '
+                                                                          'period.',
+    'although_positive_this': _although_positive + _positive_documents + '{pattern}, with {detail} during this '
+                                                                         'period.',
+    'although_positive': _although_positive + _positive_documents + '{pattern} during the period.',
+    'although_positive_and': _although_positive + 'and ' + _positive_documents + '{pattern} during the period.',
+    'negative': _negative + 'For the total negative sentiment documents, the temporal pattern exhibits {pattern} '
+                            'during the period.',
+    'although_negative_improvement': _although_negative + 'there is a significant improvement for the total '
+                                                          'sentiment scores, associated with {detail} during the '
+                                                          'period.',
+    'negative_deterioration': _negative + 'What is worse, there is a sever deterioration for the total sentiment '
+                                          'scores, associated with {detail} during this period.',
+    'although_negative_increasing': 'Although the overall average sentiment over the period from {start} to {end} '
+                                    'is negative, there is {pattern} for the total trend, associated with slightly '
+                                    'improvement during this period.',
+    'negative_plausible_deterioration': _negative + 'What is worse, there is a plausible deterioration for the total '
+                                                    'sentiment scores, associated with {detail} during this period.',
+    'negative_worse': _negative + 'What is worse, there is {detail} for the total sentiment scores, associated with '
+                                  'a plausible deterioration during this period.',
+    'all_sentiment_related': 'All of topics are {relation} in sentiment to the overall trend.',
+    'one_sentiment_related': '{count} of the {total} topics is {relation} in sentiment to the overall trend.',
+    'some_sentiment_related': '{count} of the {total} topics are {relation} in sentiment to the overall trend.',
+    'topic_keywords_one': 'The topic id and frequently mentioned words in this topic include: ',
+    'topic_keywords_many': 'The topic ids and frequently mentioned words in these topics include: ',
+    'topic_keywords': 'No.{topic} topic: {keywords!j}, etc.',
+    'keyword_share': '{keyword} ({share:.1%})',
+
+    # changes seen by json_monitor
+    'monitor_total_trend': 'At {time}, all of the documents exhibit {pattern} over the last {window} {unit}s.',
+    'monitor_topic_trend': 'At {time}, No.{topic} topic exhibits {pattern} over the last {window} {unit}s.',
+    'monitor_total_periodicity': 'At {time}, all of the documents show {strength} periodicity of {period} {unit}s.',
+    'monitor_topic_periodicity': 'At {time}, No.{topic} topic shows {strength} periodicity of {period} {unit}s.',
+    'monitor_total_no_periodicity': 'At {time}, all of the documents show no periodicity.',
+    'monitor_topic_no_periodicity': 'At {time}, No.{topic} topic shows no periodicity.',
+    'monitor_total_positive': 'At {time}, the average sentiment of all of the documents is positive ({sentiment:.2f}).',
+    'monitor_total_negative': 'At {time}, the average sentiment of all of the documents is negative ({sentiment:.2f}).',
+    'monitor_topic_positive': 'At {time}, the average sentiment of No.{topic} topic is positive ({sentiment:.2f}).',
+    'monitor_topic_negative': 'At {time}, the average sentiment of No.{topic} topic is negative ({sentiment:.2f}).',
+    'monitor_relation': 'At {time}, No.{topic} topic is {relation} with the total document amount trend ({r:.2f}).',
+}}
+
+lists = {'en': {'l': keyword_list,
+                'j': ', '.join,
+                'e': lambda items: ''.join(item + ', ' for item in items)}}
+
+_compiled = {}
+
+
+def _compile(name, template, conversions):
+    """ The parts of template, parsed once: (literal, field, spec, conversion) tuples as
+    Formatter().parse gives them, field being None after the last literal.
+    Only the fields sentence fills in are accepted: a name with an optional format spec and
+    one of the list conversions, not an attribute, an index, a positional field or a nested spec.
+    """
+
+    try:
+        parts = list(Formatter().parse(template))
+    except ValueError as e:
+        raise ValueError('template %r: %s' % (name, e))
+    for literal, field, spec, conversion in parts:
+        if field is None:
+            continue
+        if not field.isidentifier():
+            raise ValueError('template %r: field {%s} is not a name (no attributes, indexes or positional fields)'
+                             % (name, field))
+        if conversion and conversion not in conversions:
+            raise ValueError('template %r: field {%s!%s} has none of the list conversions %s'
+                             % (name, field, conversion, ', '.join('!' + c for c in sorted(conversions))))
+        if '{' in spec:
+            raise ValueError('template %r: field {%s:%s} has a nested field in its format spec' % (name, field, spec))
+    return parts
+
+
+class Templates(object):
+    """ The compiled templates and list conversions of a locale.
+    """
+
+    def __init__(self, templates, lists):
+        self.sentences = dict((name, _compile(name, template, lists)) for name, template in templates.items())
+        self.lists = dict((conversion, self._items(enumerate_items)) for conversion, enumerate_items in lists.items())
+
+    def _items(self, enumerate_items):
+        # the facts of a list are rendered before it is enumerated.
+        return lambda items: enumerate_items([item if isinstance(item, str) else self.sentence(item) for item in items])
+
+    def sentence(self, fact):
+        name, values = fact
+        text = []
+        for literal, field, spec, conversion in self.sentences[name]:
+            text.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion:
+                    value = self.lists[conversion](value)
+                text.append(format(value, spec))
+        return ''.join(text)
+
+    def render(self, facts):
+        """ The sentences of facts, one per line.
+        """
+
+        sentence = self.sentence
+        return ''.join([sentence(fact) + '\n' for fact in facts])
+
+
+def add_locale(locale, locale_templates, locale_lists=None):
+    """ Add (or replace) the templates of a locale; the list conversions default to the English ones.
+    """
+
+    templates[locale] = locale_templates
+    lists[locale] = locale_lists or lists['en']
+    _compiled.pop(locale, None)
+
+
+def compiled(locale='en'):
+    """ The Templates of locale, compiled on first use.
+    """
+
+    if locale not in _compiled:
+        if locale not in templates:
+            raise ValueError('no templates for locale %r' % locale)
+        _compiled[locale] = Templates(templates[locale], lists[locale])
+    return _compiled[locale]
+
+
+def render(facts, locale='en'):
+    """ The text of facts in locale.
+    """
+
+    return compiled(locale).render(facts)
+
+
+def write(facts, out=None, locale='en'):
+    """ Write the text of facts in locale to out (sys.stdout by default), in one write.
+    """
+
+    (sys.stdout if out is None else out).write(compiled(locale).render(facts))
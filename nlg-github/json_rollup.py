@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import sys
+import numpy as np
+from json_methods import _tzinfo, time_unit
+from json_process_tempral_trend_func_version import temp_trend_widget
+from json_stream import TIMEBIN_FIELDS, json_stream_read
+
+
+'''
+Roll-up pyramid of a temporal widget: its bins summed over calendar-aligned buckets of
+every coarser unit (hour, day, week, month, season, year), to narrate the same widget
+at several zoom levels without going back to the finest bins.
+Pyramid(timebin, tz) builds all the levels at once, each from the level below it:
+  hour    from the bins              (floor to the hour)
+  day     from hour, or the bins     (local midnight)
+  week    from day                   (Monday)
+  month   from day                   (the 1st)
+  season  from month                 (January, April, July, October)
+  year    from season
+Only the units coarser than the interval of the widget are built. For every topic a
+bucket sums the 'c', 'p' and 'n' of its slots and merges the counts of their 'terms'.
+pyramid[unit] is a timebin in the widget format, which temp_trend_widget narrates. Its
+'interval' is the nominal length of the unit time_unit reads (a month is 4 weeks, a
+season 12), and 'bucket_starts' holds the real start of every bucket, in ms, from which
+temp_trend labels the slots. The buckets are taken on the wall-clock time of tz (the
+local time by default), counted from bucket_start as the slot labels are.
+
+Narrate the widgets of a file by day:
+python3 json_rollup.py data/temporal.json --unit day
+'''
+
+
+units = ('hour', 'day', 'week', 'month', 'season', 'year')
+
+# nominal lengths of the units in ms, as time_unit names an interval.
+unit_intervals = {'hour': 3600000, 'day': 86400000, 'week': 604800000, 'month': 4 * 604800000,
+                  'season': 12 * 604800000, 'year': 48 * 604800000}
+
+# the level each unit is summed from (None: the bins of the widget).
+_sources = {'hour': None, 'day': 'hour', 'week': 'day', 'month': 'day', 'season': 'month', 'year': 'season'}
+
+# the names time_unit gives to the intervals, from the shortest.
+_time_units = ('second', 'minute') + units + ('decade',)
+
+
+def _floor(t, unit):
+    """ The start of the bucket of unit of every wall-clock time of t (datetime64[us]).
+    """
+
+    if unit == 'hour':
+        return t.astype('datetime64[h]').astype(t.dtype)
+    if unit == 'day':
+        return t.astype('datetime64[D]').astype(t.dtype)
+    if unit == 'week':
+        day = t.astype('datetime64[D]')
+        weekday = (day.astype(np.int64) + 3) % 7  # Monday 0, 1970-01-01 being a Thursday
+        return (day - weekday.astype('timedelta64[D]')).astype(t.dtype)
+    month = t.astype('datetime64[M]')
+    if unit == 'season':
+        month = month - (month.astype(np.int64) % 3).astype('timedelta64[M]')
+    elif unit == 'year':
+        month = t.astype('datetime64[Y]').astype('datetime64[M]')
+    return month.astype(t.dtype)
+
+
+def _merge_terms(slots):
+    """ The terms of a bucket: the counts of the terms of its slots summed, the largest first
+    (equal counts in the order the terms first appear).
+    """
+
+    counts = {}
+    for terms in slots:
+        for term in terms or ():
+            counts[term['text']] = counts.get(term['text'], 0) + term['c']
+    return [{'text': text, 'c': c} for text, c in sorted(counts.items(), key=lambda item: -item[1])]
+
+
+class Pyramid(object):
+    """ The roll-ups of a temporal widget (a parsed temporal.json line) at every coarser unit.
+    """
+
+    def __init__(self, timebin, tz=None):
+        self.timebin = timebin
+        self.tz = tz
+        self.unit = time_unit(timebin['bucket_start'], timebin['bucket_end'], timebin['interval'], tz)[2]
+        self.start = timebin['bucket_start']
+        self.levels = {}
+
+        bins = timebin['bins']
+        count = np.array([elm['c'] for elm in bins], dtype=np.int64)
+        positive = np.array([elm['p'] for elm in bins], dtype=np.int64)
+        negative = np.array([elm['n'] for elm in bins], dtype=np.int64)
+        terms = [elm['terms'] for elm in bins]
+
+        # the wall-clock time of every slot, counted from the start as slot_labels does.
+        self._begin = np.datetime64(datetime.datetime.fromtimestamp(self.start / 1000, _tzinfo(tz))
+                                    .replace(tzinfo=None), 'us')
+        slots = self._begin + (np.arange(count.shape[1], dtype=np.int64) *
+                               int(round(timebin['interval'] * 1000))).astype('timedelta64[us]')
+        finest = (slots, count, positive, negative, terms)
+
+        for unit in units:
+            if _time_units.index(unit) > _time_units.index(self.unit):
+                self.levels[unit] = self._roll_up(unit, *self.levels.get(_sources[unit], finest))
+
+    def _roll_up(self, unit, starts, count, positive, negative, terms):
+        """ The buckets of unit over the slots (or buckets) starting at starts, with their sums.
+        """
+
+        keys = _floor(starts, unit)
+        first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if keys.shape[0] else np.zeros(0, dtype=int)
+        bounds = first.tolist() + [keys.shape[0]]
+
+        def total(matrix):
+            if not first.shape[0]:
+                return matrix[:, :0]
+            return np.add.reduceat(matrix, first, axis=1)
+
+        merged = [[_merge_terms(topic[a:b]) for a, b in zip(bounds[:-1], bounds[1:])] for topic in terms]
+        return keys[first], total(count), total(positive), total(negative), merged
+
+    def __contains__(self, unit):
+        return unit in self.levels
+
+    @property
+    def units(self):
+        """ The units of the levels, from the finest.
+        """
+
+        return [unit for unit in units if unit in self.levels]
+
+    def _ms(self, t):
+        """ The time in ms of the wall-clock times t, counted from the start.
+        """
+
+        return self.start + (t - self._begin).astype('timedelta64[us]').astype(np.int64) / 1000
+
+    def __getitem__(self, unit):
+        """ The level of unit as a timebin, which temp_trend_widget narrates.
+        """
+
+        if unit not in self.levels:
+            raise KeyError('no %r level above the %s bins of the widget' % (unit, self.unit))
+        starts, count, positive, negative, terms = self.levels[unit]
+        edges = [_integral(ms) for ms in self._ms(np.append(starts, _next(starts[-1:], unit))).tolist()]
+
+        bins = []
+        for i, elm in enumerate(self.timebin['bins']):
+            bins.append({'topic_id': elm.get('topic_id', i), 'c': count[i].tolist(), 'p': positive[i].tolist(),
+                         'n': negative[i].tolist(), 'terms': terms[i], 'sum_c': int(count[i].sum()),
+                         'sum_p': int(positive[i].sum()), 'sum_n': int(negative[i].sum())})
+        return {'bucket_start': edges[0], 'bucket_end': edges[-1], 'interval': unit_intervals[unit],
+                'bucket_starts': edges[:-1],
+                'sum_c': int(count.sum()), 'sum_p': int(positive.sum()), 'sum_n': int(negative.sum()), 'bins': bins}
+
+
+def _integral(ms):
+    return int(ms) if float(ms).is_integer() else ms
+
+
+def _next(t, unit):
+    """ The start of the bucket of unit after the one starting at t.
+    """
+
+    if unit == 'hour':
+        return t + np.timedelta64(1, 'h')
+    if unit == 'day':
+        return t + np.timedelta64(1, 'D')
+    if unit == 'week':
+        return t + np.timedelta64(7, 'D')
+    months = {'month': 1, 'season': 3, 'year': 12}[unit]
+    return (t.astype('datetime64[M]') + np.timedelta64(months, 'M')).astype(t.dtype)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Narrate temporal widgets at a coarser calendar unit.')
+    parser.add_argument('json_file_name', help='temporal widget file, one widget per line')
+    parser.add_argument('--unit', choices=units, default='day', help='unit of the level to narrate')
+    parser.add_argument('--tz', help="time zone of the dates, e.g. 'UTC' (the local time by default)")
+    args = parser.parse_args(argv)
+
+    for i, timebin in enumerate(json_stream_read(args.json_file_name, TIMEBIN_FIELDS)):
+        try:
+            temp_trend_widget(Pyramid(timebin, args.tz)[args.unit], tz=args.tz)
+        except (KeyError, ValueError) as e:
+            # e.g. too few buckets at this unit to find a period.
+            sys.stderr.write('%s: widget %d: %s: %s\n' % (args.json_file_name, i, type(e).__name__, e))
+
+
+if __name__ == '__main__':
+    main()
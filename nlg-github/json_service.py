@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json_cache import ResultCache, content_key
+from json_batch import narrate, warm_imports, widget_fields
+from json_stream import loads_fields, CATEGORIES_FIELDS, TIMEBIN_FIELDS
+
+
+'''
+Local HTTP narration service.
+POST a widget json body to /narrate/semantic (a categories.json line),
+/narrate/temporal (a temporal.json line) or /narrate (either, told apart by its first
+character) and the narrative comes back as text/plain.
+The analysis runs in a pool of worker processes that are started, and have imported
+the scientific stack, before the server accepts requests. At most max_pending
+requests are queued or running, a request that timed out (504) holding its place until
+its job is done; further ones get 503 with a Retry-After header.
+A body that was narrated before is answered from a ResultCache without reaching the pool.
+GET /stats returns the request counters, the p50/p99 latency and the cache statistics,
+GET /health 'ok'.
+'''
+
+
+kind_fields = {'semantic': CATEGORIES_FIELDS, 'temporal': TIMEBIN_FIELDS}
+
+
+def narrate_text(text, kind):
+    """ Worker side: narrative of a widget json text. kind is 'semantic', 'temporal' or None (detect).
+    """
+
+    if kind is None:
+        return narrate(loads_fields(text, widget_fields(text)))
+    widget = loads_fields(text, kind_fields[kind])
+    if isinstance(widget, list) != (kind == 'semantic'):
+        raise ValueError('the body is not a %s widget' % kind)
+    return narrate(widget)
+
+
+def _warm_worker():
+    return True
+
+
+class LatencyStats(object):
+    """ Request counters and the latencies (in ms) of the last window requests.
+    """
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def record(self, latency, ok=True):
+        with self.lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self.latencies.append(latency * 1000)
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {'requests': self.requests, 'errors': self.errors, 'rejected': self.rejected}
+
+        def percentile(q):
+            # nearest rank
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        stats['p50_ms'] = percentile(0.50)
+        stats['p99_ms'] = percentile(0.99)
+        return stats
+
+
+class NarrationService(object):
+    """ The pre-warmed worker pool, the admission limit and the latency statistics.
+    """
+
+    def __init__(self, workers=2, max_pending=None, timeout=60.0, cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.max_pending = max_pending or 4 * workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.stats = LatencyStats()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_imports)
+        # start every worker now, so no request pays for process start-up and imports.
+        for future in [self.executor.submit(_warm_worker) for _ in range(workers)]:
+            future.result()
+
+    def narrate(self, text, kind):
+        """ Narrative of a widget json text, or None if the service is saturated.
+        Raises concurrent.futures.TimeoutError when the narration takes longer than timeout.
+        """
+
+        if self.cache is not None:
+            t0 = time.time()
+            key = content_key('narrate', kind or '', text)
+            result = self.cache.get(key)
+            if result is not None:
+                self.stats.record(time.time() - t0)
+                return result
+
+        if not self.slots.acquire(blocking=False):
+            self.stats.reject()
+            return None
+        t0 = time.time()
+        ok = False
+        try:
+            try:
+                future = self.executor.submit(narrate_text, text, kind)
+            except BaseException:
+                self.slots.release()
+                raise
+            # the slot is given back when the job is done, not when the request gives up on it:
+            # jobs that timed out still count against max_pending while they run.
+            future.add_done_callback(lambda future: self.slots.release())
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()  # only if it has not started yet
+                raise
+            ok = True
+            if self.cache is not None:
+                self.cache.put(key, result)
+            return result
+        finally:
+            self.stats.record(time.time() - t0, ok)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def make_handler(service, max_body=64 * 1024 * 1024):
+    """ Request handler class bound to a NarrationService.
+    """
+
+    class NarrationHandler(BaseHTTPRequestHandler):
+
+        def _send(self, code, body, content_type='text/plain; charset=utf-8', headers=()):
+            data = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, 'ok\n')
+            elif self.path == '/stats':
+                stats = service.stats.snapshot()
+                if service.cache is not None:
+                    stats['cache'] = service.cache.stats()
+                self._send(200, json.dumps(stats) + '\n', 'application/json')
+            else:
+                self._send(404, 'not found\n')
+
+        def do_POST(self):
+            if self.path == '/narrate':
+                kind = None
+            elif self.path.startswith('/narrate/') and self.path[len('/narrate/'):] in kind_fields:
+                kind = self.path[len('/narrate/'):]
+            else:
+                self._send(404, 'use /narrate, /narrate/semantic or /narrate/temporal\n')
+                return
+            length = self.headers.get('Content-Length')
+            if length is None:
+                self._send(411, 'Content-Length required\n')
+                return
+            try:
+                length = int(length)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._send(400, 'bad Content-Length\n')
+                return
+            if length > max_body:
+                self._send(413, 'widget too large\n')
+                return
+            body = self.rfile.read(length)
+            try:
+                text = body.decode('utf-8')
+            except UnicodeDecodeError as e:
+                self._send(400, 'the body is not UTF-8: %s\n' % e)
+                return
+            try:
+                narrative = service.narrate(text, kind)
+            except FutureTimeout:
+                self._send(504, 'narration timed out\n')
+                return
+            except Exception as e:
+                self._send(422, '%s: %s\n' % (type(e).__name__, e))
+                return
+            if narrative is None:
+                self._send(503, 'busy, retry later\n', headers=[('Retry-After', '1')])
+            else:
+                self._send(200, narrative)
+
+        def log_message(self, format, *args):
+            pass
+
+    return NarrationHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve widget narratives over HTTP on localhost.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to bind (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='requests queued or running before 503 (default: 4 per worker)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds allowed per narration')
+    parser.add_argument('--cache-items', type=int, default=256, help='narratives kept in memory (0: no cache)')
+    parser.add_argument('--cache-dir', help='also keep the narratives on disk in this directory')
+    parser.add_argument('--cache-mb', type=float, default=256, help='size limit of the disk cache in MB')
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.cache_items > 0:
+        cache = ResultCache(args.cache_items, args.cache_dir, int(args.cache_mb * 1024 * 1024))
+    service = NarrationService(args.workers, args.max_pending, args.timeout, cache)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    sys.stderr.write('serving on http://%s:%d with %d workers\n' % (args.host, args.port, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import numpy as np
+from itertools import compress, repeat
+from json_methods import top_k
+from json_table import intern
+
+
+'''
+Sketches: summaries of streams of values that are too many to keep, in bounded memory.
+
+StreamingMAD estimates the median and the median absolute deviation (MAD) of a stream,
+for the MAD outlier test of json_methods.mad_based_outlier on data that does not fit in
+memory: a first pass feeds the values to update() chunk by chunk, a second pass tests
+the chunks with outliers().
+
+It is a deterministic compactor sketch: the values are kept in levels of at most k
+values, a value at level h standing for 2**h values of the stream. When a level is full
+it is sorted and every other value (alternately the odd and the even ones) moves up a
+level. With n values seen and H levels compacted (H is about log2(n / k)), the memory
+is O(k * H) values and the error of any rank is bounded by
+
+    e = rank_error() = n * H / k + 2**H   (0 while no level has been compacted),
+
+so that:
+  - median() lies between the exact (n / 2 - e)-th and (n / 2 + e)-th values, i.e. its
+    quantile is within e / n of 1/2;
+  - mad() is, in the same way, within 2 * e / n in quantile of the median of the
+    deviations |x - median()|, and that median is within |median() - exact median| of
+    the exact MAD (moving the centre by d moves the MAD by at most d).
+With the default k = 4096, e / n is below 0.5% up to a billion values. Until k values
+have been seen nothing is compacted and both estimates are exact (np.median).
+
+HeavyHitters keeps the heaviest items of a weighted stream (buzzwords by weighted count,
+keywords by count) in at most capacity counters, for vocabularies too large to count
+exactly. It is the mergeable Misra-Gries form of Space-Saving: a chunk of the stream is
+counted, added to the counters, and if more than capacity counters remain the
+(capacity + 1)-th largest count is subtracted from all of them and the ones left at zero
+or below are dropped. The sum of the subtracted amounts is error, and for every item
+
+    count <= true weight <= count + error,   error <= (total - sum of counts) / (capacity + 1),
+
+an item without a counter having a true weight of at most error. Other sums (sentiment,
+documents) can be kept along with the counts; they cover the part of the stream seen while
+the item had a counter, so they are exact for the items that were never dropped.
+'''
+
+
+class StreamingMAD(object):
+    """ Approximate median and MAD of a stream of values, fed with update(values).
+    """
+
+    def __init__(self, k=4096):
+        if k < 2 or k % 2:
+            raise ValueError('k must be an even number of at least 2, not %r' % k)
+        self.k = k
+        self.n = 0
+        self.levels = [np.zeros(0)]  # the values kept at each level, of weight 2 ** level
+        self._offsets = [0]  # which half a level keeps at its next compaction
+
+    def update(self, values):
+        """ Add a chunk of values to the stream. Returns self.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        if np.isnan(values).any():
+            raise ValueError('NaN in the stream')
+        self.n += values.shape[0]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if level.shape[0] >= self.k:
+                level = np.sort(level)
+                m = level.shape[0] - level.shape[0] % 2  # an odd value out waits for the next compaction
+                kept = level[self._offsets[h]:m:2]
+                self._offsets[h] ^= 1
+                self.levels[h] = level[m:]
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                    self._offsets.append(0)
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], kept])
+            h += 1
+        return self
+
+    def __len__(self):
+        return self.n
+
+    def rank_error(self):
+        """ Bound on the error of the ranks behind median() and mad(), in number of values.
+        """
+
+        compacted = len(self.levels) - 1
+        if not compacted:
+            return 0
+        return self.n * compacted / self.k + 2 ** compacted
+
+    def _sample(self):
+        if not self.n:
+            raise ValueError('no values in the stream')
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.shape[0], 2.0 ** h) for h, level in enumerate(self.levels)])
+        return values, weights
+
+    def median(self):
+        """ The approximate median of the values seen so far.
+        """
+
+        values, weights = self._sample()
+        return _weighted_median(values, weights)
+
+    def mad(self):
+        """ The approximate median absolute deviation of the values seen so far.
+        """
+
+        values, weights = self._sample()
+        return _weighted_median(np.abs(values - _weighted_median(values, weights)), weights)
+
+    def outliers(self, values, thresh=3.5):
+        """ The outlier mask of a chunk of values, as mad_based_outlier gives with the estimated median and MAD.
+        """
+
+        values = np.asarray(values, dtype=float)
+        modified_z_score = 0.6745 * np.abs(values - self.median()) / self.mad()
+        return modified_z_score > thresh
+
+
+def _weighted_median(values, weights):
+    """ The value at half the total weight; np.median when all the weights are 1.
+    """
+
+    if np.all(weights == 1):
+        return np.median(values)
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cumulative, cumulative[-1] / 2.0)]
+
+
+class HeavyHitters(object):
+    """ Approximate heaviest items of a weighted stream, fed with update(items, weights, **sums).
+    """
+
+    def __init__(self, capacity=10000):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1, not %r' % capacity)
+        self.capacity = capacity
+        self.items = []  # the item of every counter
+        self.index = {}  # item -> counter
+        self.counts = np.zeros(0)
+        self.sums = {}  # name -> the sum of every counter
+        self.error = 0.0
+        self.total = 0.0
+
+    def update(self, items, weights, **sums):
+        """ Add a chunk: a list of items (repeats allowed), their weights and, by name, other
+        values to sum per item (e.g. sentiment=..., documents=...). Returns self.
+        """
+
+        ids, vocabulary = intern(items)
+        size = len(vocabulary)
+        weights = np.bincount(ids, weights=np.asarray(weights, dtype=float), minlength=size)
+        self.total += np.sum(weights)
+
+        # the counters of the items of the chunk, new ones added at the end.
+        old = len(self.items)
+        counters = np.fromiter(map(self.index.get, vocabulary, repeat(-1)), dtype=np.int64, count=size)
+        new = counters < 0
+        grow = int(np.count_nonzero(new))
+        counters[new] = np.arange(old, old + grow)
+        self.items.extend(compress(vocabulary, new.tolist()))
+        self.index.update(zip(self.items[old:], range(old, old + grow)))
+        self.counts = np.concatenate([self.counts, np.zeros(grow)])
+        self.counts[counters] += weights
+        for name in set(self.sums) | set(sums):
+            total = np.concatenate([self.sums.get(name, np.zeros(old)), np.zeros(grow)])
+            if name in sums:
+                total[counters] += np.bincount(ids, weights=np.asarray(sums[name], dtype=float), minlength=size)
+            self.sums[name] = total
+
+        if len(self.items) > self.capacity:
+            cut = np.partition(self.counts, len(self.items) - self.capacity - 1)[len(self.items) - self.capacity - 1]
+            self.error += cut
+            self.counts -= cut
+            keep = self.counts > 0
+            self.items = list(compress(self.items, keep.tolist()))
+            self.index = dict(zip(self.items, range(len(self.items))))
+            self.counts = self.counts[keep]
+            for name in self.sums:
+                self.sums[name] = self.sums[name][keep]
+        return self
+
+    def __len__(self):
+        return len(self.items)
+
+    def top(self, k):
+        """ The k items with the largest counts, as dicts of item, count (a lower bound of the
+        true weight), upper (count + error), the kept sums and guaranteed: whether the item
+        is certainly among the k heaviest, its count being at least the upper bound of the next.
+        """
+
+        order = top_k(self.counts, k + 1)
+        following = self.counts[order[k]] + self.error if order.shape[0] > k else self.error
+        rows = []
+        for i in order[:k].tolist():
+            row = {'item': self.items[i], 'count': self.counts[i].item(), 'upper': self.counts[i].item() + self.error,
+                   'guaranteed': bool(self.counts[i] >= following)}
+            for name, total in self.sums.items():
+                row[name] = total[i].item()
+            rows.append(row)
+        return rows
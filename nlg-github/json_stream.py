@@ -0,0 +1,191 @@
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import make_scanner
+
+
+'''
+Field-selective reader for widget json files.
+json.loads builds every object of a widget, including the sample documents and the
+per-sentence sentiment of each buzzword that the narrators never read. The reader
+here walks the text once and only builds the fields named in a field spec; the
+other values are jumped over with a regular expression, without creating objects.
+
+A field spec is True (keep the whole value), a dict (an object, of which only the
+listed keys are kept, each with its own spec) or a one-element list (an array whose
+items all follow the spec inside).
+'''
+
+
+# fields of a timebin used by temp_trend.
+TIMEBIN_FIELDS = {
+    'bucket_start': True,
+    'bucket_end': True,
+    'interval': True,
+    # small leaf objects are faster to decode whole than field by field.
+    'bins': [{'c': True, 'p': True, 'n': True, 'terms': True}],
+}
+
+# fields of a semantic topic widget (categories.json) used by the semantic topic narrator.
+CATEGORIES_FIELDS = [{
+    'c': True,
+    'n': True,
+    'p': True,
+    'weight': True,
+    'buzzwords': [{'term': True, 'c': True, 'n': True, 'p': True}],
+    'top_regions': True,
+    'timebin': TIMEBIN_FIELDS,
+}]
+
+
+_scan_once = make_scanner(json.JSONDecoder())
+_WS = re.compile(r'[ \t\n\r]*')
+_WS_CHARS = ' \t\n\r'
+# everything up to the next bracket that is not inside a string.
+_NO_BRACKET = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+def _subtree_pattern(depth):
+    """ Regular expression of an object or array nested at most depth levels deep.
+    Possessive quantifiers keep it linear: nothing is ever backtracked into.
+    """
+
+    text = r'[^"\[\]{}]++|"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+    inner = '(?:%s)*+' % text
+    for _ in range(depth):
+        inner = r'(?:%s|[\[{]%s[\]}])*+' % (text, inner)
+    return r'[\[{]' + inner + r'[\]}]'
+
+
+try:
+    _SUBTREE = re.compile(_subtree_pattern(32))
+except re.error:  # possessive quantifiers need python 3.11
+    _SUBTREE = None
+
+
+def _scan(s, idx):
+    try:
+        return _scan_once(s, idx)
+    except StopIteration:
+        raise ValueError('Expecting value at char %d' % idx)
+
+
+def _skip(s, idx):
+    """ Index right after the value starting at s[idx], without decoding it.
+    """
+
+    if s[idx] not in '[{':
+        return _scan(s, idx)[1]  # a scalar
+
+    if _SUBTREE is not None:
+        match = _SUBTREE.match(s, idx)
+        if match:
+            return match.end()
+
+    # deeper than _SUBTREE: walk from bracket to bracket.
+    depth = 0
+    while True:
+        if s[idx] in '[{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return idx + 1
+        idx = _NO_BRACKET.match(s, idx + 1).end()
+        if idx >= len(s):
+            raise ValueError('Unterminated value')
+
+
+def _read(s, idx, fields):
+    """ Decode the value at s[idx] according to fields. Returns the value and the end index.
+    """
+
+    if fields is True:
+        return _scan(s, idx)
+
+    if isinstance(fields, dict) and s[idx] == '{':
+        value = {}
+        idx += 1
+        if s[idx] in _WS_CHARS:
+            idx = _WS.match(s, idx).end()
+        if s[idx] == '}':
+            return value, idx + 1
+        while True:
+            if s[idx] != '"':
+                raise ValueError('Expecting property name at char %d' % idx)
+            key, idx = scanstring(s, idx + 1)
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+            if s[idx] != ':':
+                raise ValueError("Expecting ':' delimiter at char %d" % idx)
+            idx += 1
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+            if key in fields:
+                value[key], idx = _read(s, idx, fields[key])
+            else:
+                idx = _skip(s, idx)
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+            if s[idx] == '}':
+                return value, idx + 1
+            if s[idx] != ',':
+                raise ValueError("Expecting ',' delimiter at char %d" % idx)
+            idx += 1
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+
+    if isinstance(fields, list) and s[idx] == '[':
+        value = []
+        idx += 1
+        if s[idx] in _WS_CHARS:
+            idx = _WS.match(s, idx).end()
+        if s[idx] == ']':
+            return value, idx + 1
+        while True:
+            item, idx = _read(s, idx, fields[0])
+            value.append(item)
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+            if s[idx] == ']':
+                return value, idx + 1
+            if s[idx] != ',':
+                raise ValueError("Expecting ',' delimiter at char %d" % idx)
+            idx += 1
+            if s[idx] in _WS_CHARS:
+                idx = _WS.match(s, idx).end()
+
+    # null or an unexpected type: keep it as it is.
+    return _scan(s, idx)
+
+
+def loads_fields(s, fields=CATEGORIES_FIELDS):
+    """ json.loads that only builds the fields selected by fields.
+    """
+
+    try:
+        value, idx = _read(s, _WS.match(s, 0).end(), fields)
+    except IndexError:
+        # the reader looks at s[idx] without bound checks: the text ends inside a value.
+        raise ValueError('Unexpected end of data at char %d' % len(s))
+    if _WS.match(s, idx).end() != len(s):
+        raise ValueError('Extra data at char %d' % idx)
+    return value
+
+
+def json_lines(json_file_name):
+    """ The json text of every widget (non-blank line) of a file, not parsed.
+    """
+
+    with open(json_file_name, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def json_stream_read(json_file_name, fields=CATEGORIES_FIELDS):
+    """ The widgets of a file (one per line), with only the selected fields built.
+    """
+
+    for line in json_lines(json_file_name):
+        yield loads_fields(line, fields)
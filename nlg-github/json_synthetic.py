@@ -0,0 +1,126 @@
+import json
+import numpy as np
+
+
+'''
+Deterministic synthetic widgets for benchmarks.
+semantic_widget builds a categories.json style widget (a list of topics with buzzwords,
+top regions and the shared timebin) and temporal_widget a temporal.json style one, with
+the fields the narrators read. The sizes are parameters: topics, slots (timebin bins),
+buzzwords per topic, regions per topic (drawn from region_pool names, 'Unknown' among
+them) and the vocabulary the buzzwords and keywords are drawn from, with Zipf-like
+frequencies. The counts follow a rising or falling trend with a daily cycle and Poisson
+noise, so that every series has a period the temporal analysis can find.
+The same arguments (and seed) always give the same widget.
+'''
+
+
+start = 1480974900000  # bucket_start of data/categories.json
+hour = 3600000
+
+
+def _vocabulary(size):
+    return ['term_%d' % i for i in range(size)]
+
+
+def _zipf_draws(rng, size, shape, a=1.1):
+    """ Ranks out of size (with repetitions), the lower ranks drawn more often.
+    """
+
+    cdf = np.cumsum(1.0 / np.arange(1, size + 1) ** a)
+    return np.minimum(np.searchsorted(cdf, rng.uniform(0, cdf[-1], size=shape)), size - 1)
+
+
+def _zipf_choice(rng, size, k, a=1.1):
+    """ k distinct ranks out of size, the lower ranks drawn more often.
+    """
+
+    # the k largest of log-weight + Gumbel noise are a weighted sample without replacement.
+    k = min(k, size)
+    keys = -a * np.log(np.arange(1, size + 1)) + rng.gumbel(size=size)
+    return np.argpartition(-keys, k - 1)[:k] if k else np.zeros(0, dtype=int)
+
+
+def _series(rng, topics, slots, level):
+    """ Counts of every topic over the slots: level x trend x daily cycle, Poisson noise, at least 1.
+    """
+
+    t = np.arange(slots)
+    slope = rng.uniform(-0.5, 0.5, size=(topics, 1))
+    trend = 1 + slope * t / max(slots, 1)
+    cycle = 1 + 0.5 * np.sin(2 * np.pi * (t / 24.0 + rng.uniform(size=(topics, 1))))
+    mean = level[:, None] * trend * cycle
+    return np.maximum(rng.poisson(mean), 1)
+
+
+def timebin(topics=12, slots=24, vocabulary=2000, terms_per_slot=5, interval=hour, seed=0):
+    """ The timebin of a widget: one bin per topic with the counts, sentiment and keywords of every slot.
+    """
+
+    rng = np.random.default_rng(seed)
+    words = _vocabulary(vocabulary)
+    level = rng.gamma(2.0, 50.0, size=topics) + 5
+    c = _series(rng, topics, slots, level)
+    positive = rng.uniform(0.3, 0.6, size=(topics, 1))  # the sentiment differs between topics
+    p = rng.binomial(c * 2, positive)
+    n = -rng.binomial(c * 2, 0.9 - positive)
+
+    # the keywords of a slot are the distinct ones of terms_per_slot draws.
+    draws = _zipf_draws(rng, vocabulary, (topics, slots, terms_per_slot))
+    counts = -np.sort(-rng.integers(1, c[:, :, None] + 1), axis=-1)
+    bins = []
+    for i in range(topics):
+        terms = []
+        for j in range(slots):
+            ranks = dict.fromkeys(draws[i, j].tolist())
+            terms.append([{'text': words[r], 'c': k} for r, k in zip(ranks, counts[i, j].tolist())])
+        bins.append({'topic_id': i, 'c': c[i].tolist(), 'p': p[i].tolist(), 'n': n[i].tolist(), 'terms': terms,
+                     'sum_c': int(c[i].sum()), 'sum_p': int(p[i].sum()), 'sum_n': int(n[i].sum())})
+
+    return {'bucket_start': start, 'bucket_end': start + slots * interval, 'interval': interval,
+            'sum_c': int(c.sum()), 'sum_p': int(p.sum()), 'sum_n': int(n.sum()), 'bins': bins}
+
+
+def semantic_widget(topics=12, slots=24, buzzwords=100, regions=5, vocabulary=2000, region_pool=50, seed=0):
+    """ A categories.json style widget: a list of topics, each with buzzwords, top_regions and the timebin.
+    """
+
+    tb = timebin(topics, slots, vocabulary, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    words = _vocabulary(vocabulary)
+    names = ['Unknown'] + ['Region %d' % i for i in range(1, region_pool)]
+    weight = rng.dirichlet(np.ones(topics))
+
+    widget = []
+    for i, elm in enumerate(tb['bins']):
+        c = elm['sum_c']
+        bzw = []
+        positive = rng.uniform(0.3, 0.6)
+        for r in _zipf_choice(rng, vocabulary, buzzwords):
+            k = int(rng.integers(1, c + 1))
+            bzw.append({'term': words[r], 'c': k, 'p': int(rng.binomial(2 * k, positive)),
+                        'n': -int(rng.binomial(2 * k, 0.9 - positive))})
+        top_regions = []
+        shares = rng.dirichlet(np.ones(min(regions, region_pool)))
+        for r, share in zip(_zipf_choice(rng, region_pool, regions), shares):
+            k = max(int(share * c), 1)
+            positive = rng.uniform(0.3, 0.6)
+            top_regions.append({'display_name': names[r], 'c': k, 'p': int(rng.binomial(2 * k, positive)),
+                                'n': -int(rng.binomial(2 * k, 0.9 - positive))})
+        widget.append({'topic_id': i, 'c': c, 'p': elm['sum_p'], 'n': elm['sum_n'], 'weight': '%.4f' % weight[i],
+                       'buzzwords': bzw, 'top_regions': top_regions, 'timebin': tb})
+    return widget
+
+
+def temporal_widget(topics=16, slots=24, vocabulary=2000, terms_per_slot=5, interval=hour, seed=0):
+    """ A temporal.json style widget (a timebin).
+    """
+
+    return timebin(topics, slots, vocabulary, terms_per_slot, interval, seed)
+
+
+def widget_line(widget):
+    """ The widget as one line of a widget file.
+    """
+
+    return json.dumps(widget, separators=(',', ':'))
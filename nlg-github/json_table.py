@@ -0,0 +1,400 @@
+import numpy as np
+from operator import itemgetter
+from json_methods import top_k
+
+
+'''
+Columnar tables of widget data.
+Instead of dicts of lists that are updated one item at a time, the values of a widget
+are kept in parallel NumPy arrays, with the strings (terms) replaced by integer ids.
+Per-term totals are then group-bys over the ids (np.bincount), done in one call each.
+'''
+
+
+def intern(strings, vocabulary=None):
+    """ Integer ids of strings, given in order of first appearance.
+    Returns the id array and the vocabulary (a dict string -> id, extended in place).
+    """
+
+    if vocabulary is None:
+        vocabulary = {}
+    for s in dict.fromkeys(strings):  # the distinct strings in order, found at C speed
+        if s not in vocabulary:
+            vocabulary[s] = len(vocabulary)
+    ids = np.fromiter(map(vocabulary.__getitem__, strings), dtype=np.int64, count=len(strings))
+    return ids, vocabulary
+
+
+class TopicTable(object):
+    """ The topics of a semantic topic widget (a parsed categories.json line) and their buzzwords.
+
+    Topic columns: c, n, p, weight (one entry per topic).
+    Buzzword columns: topic, term, term_c, term_n, term_p (one entry per topic/buzzword pair),
+    where term indexes terms, the buzzwords in order of first appearance.
+    With vocabulary=False the buzzwords are not interned: term and terms are None (no
+    vocabulary of the widget is built, for term_totals to use) and top_words takes the
+    buzzwords from the widget.
+    """
+
+    columns = ('c', 'n', 'p', 'weight', 'topic', 'term', 'term_c', 'term_n', 'term_p')
+
+    def __init__(self, widget, vocabulary=True):
+        self.c = np.array([elm['c'] for elm in widget])
+        self.n = np.array([elm['n'] for elm in widget])
+        self.p = np.array([elm['p'] for elm in widget])
+        self.weight = np.array([float(elm['weight']) for elm in widget])
+
+        buzzwords = [elm['buzzwords'] for elm in widget]
+        self.topic = np.repeat(np.arange(len(widget)), [len(bzws) for bzws in buzzwords])
+        pairs = [bzw for bzws in buzzwords for bzw in bzws]
+        if vocabulary:
+            self.term, vocabulary = intern([bzw['term'] for bzw in pairs])
+            self.terms = list(vocabulary)
+            self.buzzwords = None
+        else:
+            self.term = self.terms = None
+            self.buzzwords = buzzwords
+        self.term_c = np.array([bzw['c'] for bzw in pairs])
+        self.term_n = np.array([bzw['n'] for bzw in pairs])
+        self.term_p = np.array([bzw['p'] for bzw in pairs])
+
+    @classmethod
+    def from_columns(cls, columns, terms):
+        """ A table over given columns (a dict of the array attributes, e.g. memory-mapped
+        ones, which are used as they are) and the list of terms.
+        """
+
+        table = cls.__new__(cls)
+        for name in cls.columns:
+            setattr(table, name, columns[name])
+        table.terms = terms
+        table.buzzwords = None
+        return table
+
+    def __len__(self):
+        return self.c.shape[0]
+
+    def _group(self, values):
+        return _group_sum(self.term, values, len(self.terms))
+
+    def term_totals(self):
+        """ Per term: the weighted count (c times the weight of the topic, summed over the
+        topics in order), the summed sentiment (n + p) and the document count (c).
+        """
+
+        weighted = np.bincount(self.term, weights=self.term_c * self.weight[self.topic], minlength=len(self.terms))
+        return weighted, self._group(self.term_n + self.term_p), self._group(self.term_c)
+
+    def top_words(self, order, k):
+        """ top_cat_words from the columns: the k buzzwords with the largest counts of the
+        topics in order (the rows of prop, given from the last), as [count, words, topic count] lists.
+        """
+
+        bounds = np.searchsorted(self.topic, np.arange(len(self) + 1))
+        words = {}
+        for i in order[::-1]:
+            i = int(i)
+            rows = slice(bounds[i], bounds[i + 1])
+            top = top_k(self.term_c[rows], k)
+            total = self.c[i].item()
+            if self.terms is None:
+                terms = [self.buzzwords[i][j]['term'] for j in top.tolist()]
+            else:
+                terms = [self.terms[t] for t in self.term[rows][top].tolist()]
+            words[str(i)] = [[ct, term.replace('_', ' '), total]
+                             for ct, term in zip(self.term_c[rows][top].tolist(), terms)]
+        return words
+
+
+class RegionTable(object):
+    """ The top regions of the topics of a semantic topic widget.
+
+    Columns: topic, region, c, n, p (one entry per topic/region pair), where region
+    indexes names, the display names in order of first appearance (index is the
+    reverse mapping, display name -> id).
+    """
+
+    columns = ('topic', 'region', 'c', 'n', 'p')
+    unknown = 'Unknown'
+
+    def __init__(self, widget):
+        top_regions = [elm['top_regions'] for elm in widget]
+        self.topic = np.repeat(np.arange(len(widget)), [len(regions) for regions in top_regions])
+        regions = [region for regions in top_regions for region in regions]
+        self.region, self.index = intern([region['display_name'] for region in regions])
+        self.names = list(self.index)
+        for field in 'cnp':
+            setattr(self, field, np.array([region[field] for region in regions], dtype=np.int64))
+
+    @classmethod
+    def from_columns(cls, columns, names):
+        """ A table over given columns (a dict of the array attributes) and the list of names.
+        """
+
+        table = cls.__new__(cls)
+        for name in cls.columns:
+            setattr(table, name, columns[name])
+        table.names = names
+        table.index = dict((name, i) for i, name in enumerate(names))
+        return table
+
+    def __len__(self):
+        return len(self.names)
+
+    def totals(self):
+        """ Per region: the document count and the summed sentiment (n + p) over the topics.
+        """
+
+        return _group_sum(self.region, self.c, len(self)), _group_sum(self.region, self.n + self.p, len(self))
+
+    def known(self):
+        """ Mask of the regions that are not 'Unknown'.
+        """
+
+        mask = np.ones(len(self), dtype=bool)
+        if self.unknown in self.index:
+            mask[self.index[self.unknown]] = False
+        return mask
+
+    def rollup(self, parents):
+        """ Totals of the regions and of the areas above them.
+
+        parents maps a display name to the name of its area (a country to its region of the
+        world, say), and may map areas further up. Returns the names of all the nodes (the
+        regions, then the areas in order of first appearance), the id of the parent of each
+        (-1 for the top) and their document counts and summed sentiment, every area holding
+        the sums of its regions. The sums are taken bottom-up, one vectorized step per level.
+        """
+
+        names = list(self.names)
+        index = dict(self.index)
+        parent = []
+        for name in names:  # names grows while the areas are found
+            area = parents.get(name)
+            if area is None:
+                parent.append(-1)
+            else:
+                if area not in index:
+                    index[area] = len(names)
+                    names.append(area)
+                parent.append(index[area])
+        parent = np.array(parent, dtype=np.int64)
+        depth = _depths(parent)
+
+        count, sentiment = self.totals()
+        count = np.concatenate([count, np.zeros(len(names) - len(self), dtype=count.dtype)])
+        sentiment = np.concatenate([sentiment, np.zeros(len(names) - len(self), dtype=sentiment.dtype)])
+        for d in range(int(depth.max(initial=0)), 0, -1):
+            nodes = np.flatnonzero(depth == d)
+            np.add.at(count, parent[nodes], count[nodes])
+            np.add.at(sentiment, parent[nodes], sentiment[nodes])
+        return names, parent, count, sentiment
+
+
+class TermMatrix(object):
+    """ Sparse topic x term matrix (CSR) of the keyword counts of a timebin.
+
+    bins is the 'bins' list of a temporal trend widget; the keywords of every slot of a topic
+    (bin) are summed. terms is the shared vocabulary of the widget, in order of first
+    appearance; row i of the matrix is indptr[i]:indptr[i + 1] of indices (term ids), data
+    (counts) and first (where the term first appears in the topic, to break ties).
+    """
+
+    arrays = ('totals', 'first', 'data', 'indices', 'indptr')
+
+    def __init__(self, bins):
+        entries = []
+        sizes = []
+        for elm in bins:
+            topic = [key_word for key_words in elm['terms'] if key_words for key_word in key_words]
+            entries.extend(topic)
+            sizes.append(len(topic))
+        row = np.repeat(np.arange(len(bins)), sizes)
+        term, vocabulary = intern(list(map(itemgetter('text'), entries)))
+        c = np.array(list(map(itemgetter('c'), entries)))
+        if not entries:
+            c = c.astype(np.int64)
+        self.terms = list(vocabulary)
+        self.shape = (len(bins), len(self.terms))
+
+        # the totals of all topics, added in the order of the entries.
+        self.totals = _group_sum(term, c, self.shape[1])
+
+        # one cell per (topic, term): the cells come out sorted by topic, then term id.
+        cell, self.first, inverse = np.unique(row * self.shape[1] + term, return_index=True, return_inverse=True)
+        self.data = _group_sum(inverse.ravel(), c, cell.shape[0])
+        self.indices = cell % max(self.shape[1], 1)
+        self.indptr = np.searchsorted(cell // max(self.shape[1], 1), np.arange(self.shape[0] + 1))
+
+    @classmethod
+    def from_arrays(cls, arrays, terms):
+        """ A matrix over given arrays (a dict of totals, first, data, indices and indptr,
+        e.g. memory-mapped ones, which are used as they are) and the list of terms.
+        """
+
+        matrix = cls.__new__(cls)
+        for name in cls.arrays:
+            setattr(matrix, name, arrays[name])
+        matrix.terms = terms
+        matrix.shape = (matrix.indptr.shape[0] - 1, len(terms))
+        return matrix
+
+    def row_sums(self):
+        return _group_sum(np.repeat(np.arange(self.shape[0]), np.diff(self.indptr)), self.data, self.shape[0])
+
+    def normalized(self):
+        """ data scaled so that every row sums to 1 (as dict_normalize does per topic).
+        """
+
+        with np.errstate(divide='ignore'):
+            factor = 1.0 / self.row_sums()
+        return self.data * np.repeat(factor, np.diff(self.indptr))
+
+    def top(self, i, k, values=None):
+        """ The k largest (term, value) pairs of row i, values being data or e.g. normalized().
+        Equal values keep the order in which the terms first appear in the topic.
+        """
+
+        if values is None:
+            values = self.data
+        row = slice(self.indptr[i], self.indptr[i + 1])
+        order = top_k(values[row], k, self.first[row])
+        return [(self.terms[t], v) for t, v in zip(self.indices[row][order].tolist(), values[row][order].tolist())]
+
+    def top_total(self, k):
+        """ The k (term, total count) pairs with the largest totals over all topics.
+        """
+
+        order = top_k(self.totals, k)
+        return [(self.terms[t], v) for t, v in zip(order.tolist(), self.totals[order].tolist())]
+
+    def tocsr(self):
+        """ The counts as a scipy.sparse.csr_matrix.
+        """
+
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+
+def top_terms(bins, k):
+    """ [TermMatrix(bins).top(i, k, normalized) for every topic i], the k keywords of each topic with
+    their share of its count, taken one topic at a time: only the vocabulary of one topic is held,
+    never that of the whole widget.
+    """
+
+    top = []
+    for elm in bins:
+        entries = [key_word for key_words in elm['terms'] if key_words for key_word in key_words]
+        term, vocabulary = intern(list(map(itemgetter('text'), entries)))
+        c = np.array(list(map(itemgetter('c'), entries)))
+        if not entries:
+            c = c.astype(np.int64)
+        # the terms of the topic are numbered in order of first appearance, so that equal values
+        # keep that order as in TermMatrix.top.
+        data = _group_sum(term, c, len(vocabulary))
+        with np.errstate(divide='ignore'):
+            normalized = data * (1.0 / _group_sum(np.zeros(data.shape[0], dtype=np.int64), data, 1))
+        terms = list(vocabulary)
+        order = top_k(normalized, k)
+        top.append([(terms[t], v) for t, v in zip(order.tolist(), normalized[order].tolist())])
+    return top
+
+
+class TermCounts(object):
+    """ The keyword counts of a timebin that grows slot by slot, for TermMatrix.
+
+    add(bins, start) takes in the keywords of the slots from start on of every topic, so each
+    entry is read once over all the updates; matrix() gives the TermMatrix of all the slots
+    added so far, the same as TermMatrix(bins) over them (term ids, first and the order of
+    the cells included).
+    """
+
+    def __init__(self, topics):
+        self.vocabulary = {}
+        self.cells = {}  # (topic, term id) -> cell
+        self.topic = []
+        self.term = []
+        self.data = []
+        self.first = []  # entry of the topic where the term first appears
+        self.sizes = [0] * topics  # entries of every topic
+
+    def add(self, bins, start):
+        for i, elm in enumerate(bins):
+            entries = [key_word for key_words in elm['terms'][start:] if key_words for key_word in key_words]
+            term, _ = intern(list(map(itemgetter('text'), entries)), self.vocabulary)
+            for position, t, c in zip(range(self.sizes[i], self.sizes[i] + len(entries)), term.tolist(),
+                                      map(itemgetter('c'), entries)):
+                cell = self.cells.get((i, t))
+                if cell is None:
+                    self.cells[(i, t)] = len(self.data)
+                    self.topic.append(i)
+                    self.term.append(t)
+                    self.data.append(c)
+                    self.first.append(position)
+                else:
+                    self.data[cell] += c
+            self.sizes[i] += len(entries)
+
+    def matrix(self):
+        topic = np.array(self.topic, dtype=np.int64)
+        term = np.array(self.term, dtype=np.int64)
+        data = np.array(self.data)
+        if not self.data:
+            data = data.astype(np.int64)
+        # first as an index into the entries of all topics, one topic after the other.
+        first = np.array(self.first, dtype=np.int64) + np.cumsum([0] + self.sizes[:-1], dtype=np.int64)[topic]
+
+        # TermMatrix numbers the terms in the order they first appear in those entries.
+        size = len(self.vocabulary)
+        term_first = np.full(size, np.iinfo(np.int64).max)
+        np.minimum.at(term_first, term, first)
+        order = np.argsort(term_first)
+        rank = np.empty(size, dtype=np.int64)
+        rank[order] = np.arange(size)
+        term = rank[term]
+        strings = list(self.vocabulary)
+
+        cells = np.lexsort((term, topic))
+        arrays = {'totals': _group_sum(term, data, size), 'first': first[cells], 'data': data[cells],
+                  'indices': term[cells], 'indptr': np.searchsorted(topic[cells], np.arange(len(self.sizes) + 1))}
+        return TermMatrix.from_arrays(arrays, [strings[t] for t in order.tolist()])
+
+    def to_dict(self):
+        return {'terms': list(self.vocabulary), 'topic': self.topic, 'term': self.term, 'data': self.data,
+                'first': self.first, 'sizes': self.sizes}
+
+    @classmethod
+    def from_dict(cls, d):
+        counts = cls(len(d['sizes']))
+        counts.vocabulary = dict((s, i) for i, s in enumerate(d['terms']))
+        counts.topic, counts.term, counts.data, counts.first = d['topic'], d['term'], d['data'], d['first']
+        counts.sizes = d['sizes']
+        counts.cells = dict(((i, t), cell) for cell, (i, t) in enumerate(zip(counts.topic, counts.term)))
+        return counts
+
+
+def _depths(parent):
+    """ Number of ancestors of every node of a forest given by the parent ids (-1 for a top node).
+    """
+
+    depth = np.zeros(parent.shape[0], dtype=np.int64)
+    node = parent.copy()
+    up = node >= 0
+    while up.any():
+        depth[up] += 1
+        if depth.max() > parent.shape[0]:
+            raise ValueError('the region parents form a cycle')
+        node[up] = parent[node[up]]
+        up = node >= 0
+    return depth
+
+
+def _group_sum(ids, values, size):
+    """ Sums of values per id, accumulated in input order; integer values stay integers
+    (counts are exact in float64 far beyond any widget).
+    """
+
+    total = np.bincount(ids, weights=values, minlength=size)
+    if values.dtype.kind in 'iu':
+        return total.astype(values.dtype)
+    return total
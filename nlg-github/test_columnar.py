@@ -0,0 +1,50 @@
+import json
+import os
+import numpy as np
+import pytest
+import json_columnar
+from json_process_sementic_topics_alpha import SemanticTopicReport
+from json_process_tempral_trend_func_version import temp_trend_facts
+from json_synthetic import semantic_widget, temporal_widget
+
+data = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def _facts(l, topic_pairs=0):
+    return temp_trend_facts(len(l['bins']), len(l['bins'][0]['c']), l['bucket_start'], l['bucket_end'],
+                            l['interval'], l, topic_pairs=topic_pairs, tz='UTC')
+
+
+@pytest.mark.parametrize('topic_pairs', [0, 3])
+def test_temporal_columns_give_the_facts_of_the_json(tmp_path, topic_pairs):
+    widget = temporal_widget(topics=8, slots=120, seed=3)
+    json_columnar.write(widget, str(tmp_path))
+    loaded = json_columnar.load(str(tmp_path))
+
+    assert isinstance(loaded, json_columnar.TimebinColumns)
+    assert isinstance(loaded['bins'][0]['c'], np.memmap)
+    assert _facts(loaded, topic_pairs) == _facts(widget, topic_pairs)
+
+
+def test_file_columns_give_the_facts_of_the_json(tmp_path):
+    path = os.path.join(data, 'temporal.json')
+    assert json_columnar.write_file(path, str(tmp_path)) > 0
+    with open(path, 'r') as f:
+        widgets = [json.loads(line) for line in f if line.strip()]
+    loaded = list(json_columnar.load_file(str(tmp_path)))
+
+    assert len(loaded) == len(widgets)
+    for widget, columns in zip(widgets, loaded):
+        assert _facts(columns) == _facts(widget)
+
+
+def test_semantic_columns_give_the_report_of_the_json(tmp_path):
+    widget = semantic_widget(topics=6, slots=48, buzzwords=40, seed=2)
+    json_columnar.write(widget, str(tmp_path))
+    loaded = json_columnar.load(str(tmp_path))
+
+    assert isinstance(loaded, json_columnar.SemanticColumns)
+    expected = SemanticTopicReport(widget, tz='UTC')
+    report = SemanticTopicReport(loaded, tz='UTC')
+    assert report.temporal == expected.temporal
+    assert report.text == expected.text
@@ -0,0 +1,90 @@
+import io
+import json
+import numpy as np
+from json_incremental import TemporalState, TrendState
+from json_methods import time_series_analysis
+from json_process_tempral_trend_func_version import temp_trend_widget
+from json_synthetic import temporal_widget
+from json_table import TermCounts, TermMatrix
+
+
+def _prefix(widget, n):
+    grown = dict(widget, bucket_end=widget['bucket_start'] + n * widget['interval'])
+    grown['bins'] = [dict(elm, c=elm['c'][:n], p=elm['p'][:n], n=elm['n'][:n], terms=elm['terms'][:n])
+                     for elm in widget['bins']]
+    return grown
+
+
+def _narrative(widget, state=None):
+    out = io.StringIO()
+    temp_trend_widget(widget, out=out, state=state, tz='UTC')
+    return out.getvalue()
+
+
+def test_trend_state_matches_time_series_analysis():
+    rng = np.random.default_rng(4)
+    # a periodic series with few distinct values, so that the trend has ties.
+    x = np.tile([3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0], 30) + rng.integers(0, 3, 210)
+    state = TrendState('hour', x[:60])
+    for n in list(range(61, 90)) + list(range(95, 211, 23)):
+        state.extend(x[state.values.shape[0]:n])
+        assert state.status() == time_series_analysis(x[:n], 'hour')
+
+
+def test_temporal_state_narratives_match_full_widget():
+    widget = temporal_widget(topics=6, slots=160, seed=2)
+    state = TemporalState()
+    for n in [100, 101, 101, 120, 160]:
+        grown = _prefix(widget, n)
+        assert _narrative(grown, state) == _narrative(grown)
+        # the state is saved and restored between runs.
+        state = TemporalState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+
+def test_temporal_state_starts_over_on_another_widget():
+    widget = temporal_widget(topics=6, slots=120, seed=2)
+    state = TemporalState()
+    _narrative(_prefix(widget, 100), state)
+
+    other = temporal_widget(topics=6, slots=120, seed=3)
+    assert _narrative(other, state) == _narrative(other)
+    assert state.slots == 120
+
+
+def test_temporal_state_starts_over_on_a_revised_slot():
+    widget = temporal_widget(topics=6, slots=120, seed=2)
+    state = TemporalState()
+    _narrative(_prefix(widget, 100), state)
+    state = TemporalState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+    # the first 50 slots are revised (counts rescaled, one keyword count changed) while 20 are added.
+    revised = _prefix(widget, 120)
+    for elm in revised['bins']:
+        elm['c'] = [3 * c for c in elm['c'][:50]] + elm['c'][50:]
+    for elm in revised['bins']:
+        if elm['terms'][10]:
+            elm['terms'] = list(elm['terms'])
+            elm['terms'][10] = [dict(elm['terms'][10][0], c=elm['terms'][10][0]['c'] + 1000)] + elm['terms'][10][1:]
+            break
+    assert _narrative(revised, state) == _narrative(revised)
+
+    # a revised keyword alone also makes the state start over.
+    keyword = _prefix(widget, 120)
+    state = TemporalState()
+    _narrative(_prefix(widget, 100), state)
+    elm = next(elm for elm in keyword['bins'] if elm['terms'][0])
+    elm['terms'] = [[dict(elm['terms'][0][0], c=elm['terms'][0][0]['c'] + 1000)] + elm['terms'][0][1:]] + elm['terms'][1:]
+    assert _narrative(keyword, state) == _narrative(keyword)
+
+
+def test_term_counts_match_term_matrix():
+    bins = temporal_widget(topics=5, slots=90, seed=1)['bins']
+    counts = TermCounts(len(bins))
+    for start, stop in [(0, 30), (30, 31), (31, 31), (31, 90)]:
+        counts.add([dict(elm, terms=elm['terms'][:stop]) for elm in bins], start)
+        matrix = counts.matrix()
+        expected = TermMatrix([dict(elm, terms=elm['terms'][:stop]) for elm in bins])
+        assert matrix.terms == expected.terms
+        for name in TermMatrix.arrays:
+            assert np.array_equal(getattr(matrix, name), getattr(expected, name))
+        counts = TermCounts.from_dict(json.loads(json.dumps(counts.to_dict())))
@@ -0,0 +1,283 @@
+import datetime
+import numpy as np
+import pytest
+from math import ceil
+from zoneinfo import ZoneInfo
+from scipy.stats import norm
+from json_methods import Date_judge_str, Time_judge_str, _median, mad_based_outlier, mad_based_outlier_batch, mk_test, \
+    mk_test_batch, seasonal_decompose, slot_labels, top_k
+from json_sketch import StreamingMAD
+
+
+def _mk_test_loop(x, alpha=0.05):
+    """ The original O(n^2) mk_test, the reference of the vectorized one.
+    """
+
+    n = len(x)
+    s = 0
+    for k in range(n - 1):
+        for j in range(k + 1, n):
+            s += np.sign(x[j] - x[k])
+
+    unique_x = np.unique(x)
+    if n == len(unique_x):
+        var_s = (n * (n - 1) * (2 * n + 5)) / 18
+    else:
+        tp = np.array([np.sum(x == u) for u in unique_x])
+        var_s = (n * (n - 1) * (2 * n + 5) - np.sum(tp * (tp - 1) * (2 * tp + 5))) / 18
+
+    if s > 0:
+        z = (s - 1) / np.sqrt(var_s)
+    elif s < 0:
+        z = (s + 1) / np.sqrt(var_s)
+    else:
+        z = 0
+    p = 2 * (1 - norm.cdf(abs(z)))
+    h = abs(z) > norm.ppf(1 - alpha / 2)
+    if z < 0 and h:
+        trend = 'downward trend'
+    elif z > 0 and h:
+        trend = 'upward trend'
+    else:
+        trend = 'neither obvious upward nor downward trend'
+    return trend, h, p, z
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mk_test_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 80))
+    # few distinct values, so that most series have ties.
+    x = rng.integers(0, int(rng.integers(2, 30)), n).astype(float)
+    for alpha in (0.05, 0.5):
+        trend, h, p, z = mk_test(x, alpha)
+        expected = _mk_test_loop(x, alpha)
+        assert (trend, h) == expected[:2]
+        assert p == pytest.approx(expected[2], abs=1e-12)
+        assert z == pytest.approx(expected[3], abs=1e-12)
+
+
+def test_mk_test_batch_matches_rows():
+    rng = np.random.default_rng(1)
+    rows = [rng.normal(size=n).round(1) for n in (1, 2, 7, 33, 64, 65)]
+    x = np.full((len(rows), 65), np.nan)
+    for i, row in enumerate(rows):
+        x[i, :row.shape[0]] = row
+
+    trend, h, p, z = mk_test_batch(x, alpha=0.5)
+    for i, row in enumerate(rows):
+        expected = _mk_test_loop(row, 0.5)
+        assert (trend[i], h[i]) == expected[:2]
+        assert p[i] == pytest.approx(expected[2], abs=1e-12)
+        assert z[i] == pytest.approx(expected[3], abs=1e-12)
+
+
+def _statsmodels_rows(x, freq, model):
+    """ statsmodels' decomposition of every row of x (it takes the series as columns).
+    """
+
+    seasonal = pytest.importorskip('statsmodels.tsa.seasonal')
+    results = [seasonal.seasonal_decompose(row, model=model, period=freq) for row in np.atleast_2d(x)]
+    return [np.array([getattr(result, name) for result in results]) for name in ('trend', 'seasonal', 'resid')]
+
+
+@pytest.mark.parametrize('model', ['additive', 'multiplicative'])
+@pytest.mark.parametrize('freq', [2, 3, 4, 7, 12])
+@pytest.mark.parametrize('shape', [(50,), (4, 37), (3, 24)])
+def test_seasonal_decompose_matches_statsmodels(model, freq, shape):
+    rng = np.random.default_rng(freq * 100 + len(shape))
+    x = rng.uniform(1, 10, shape)
+
+    decomposition = seasonal_decompose(x, freq, model)
+    trend, seasonal, resid = _statsmodels_rows(x, freq, model)
+    for ours, theirs in [(decomposition.trend, trend), (decomposition.seasonal, seasonal),
+                         (decomposition.resid, resid)]:
+        ours = np.atleast_2d(ours)
+        assert ours.shape == theirs.shape
+        # the trend ends, where the moving average does not fit, are NaN in both.
+        assert np.array_equal(np.isnan(ours), np.isnan(theirs))
+        np.testing.assert_allclose(ours, theirs, rtol=1e-10, atol=1e-10)
+
+    half = freq // 2
+    assert np.isnan(np.atleast_2d(decomposition.trend)[:, :half]).all()
+    assert np.isnan(np.atleast_2d(decomposition.trend)[:, shape[-1] - half:]).all()
+    assert not np.isnan(np.atleast_2d(decomposition.trend)[:, half:shape[-1] - half]).any()
+
+
+def test_seasonal_decompose_trend_ties_exactly():
+    # a purely periodic series has a constant trend. It is taken from sums of the counts,
+    # so its values are exactly equal and the Mann-Kendall test sees one tie group (S = 0,
+    # p = 1); statsmodels' convolution leaves differences in the last bits, which broke the
+    # ties (p about 0.6 on this series). This change of the p-values is intended.
+    x = np.tile([3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0], 6)
+    trend = seasonal_decompose(x, 7).trend
+    trend = trend[~np.isnan(trend)]
+    assert np.unique(trend).shape[0] == 1
+
+    result, h, p, z = mk_test(trend, alpha=0.5)
+    assert (result, h, p, z) == ('neither obvious upward nor downward trend', False, 1.0, 0.0)
+
+    expected_trend = _statsmodels_rows(x, 7, 'additive')[0][0]
+    np.testing.assert_allclose(trend, expected_trend[~np.isnan(expected_trend)], rtol=1e-12)
+
+
+def test_seasonal_decompose_rejects_short_and_nonpositive_series():
+    with pytest.raises(ValueError):
+        seasonal_decompose(np.ones(7), 4)
+    with pytest.raises(ValueError):
+        seasonal_decompose(np.array([1.0, 0.0, 2.0, 3.0]), 2, 'multiplicative')
+
+
+def _top_k_sorted(values, k, tiebreak=None):
+    """ The reference of top_k: a full sort, largest first, NaN last, ties by tiebreak or index.
+    """
+
+    keys = range(len(values)) if tiebreak is None else tiebreak
+    nan_last = [-np.inf if np.isnan(v) else v for v in values]
+    return sorted(range(len(values)), key=lambda i: (-nan_last[i], keys[i]))[:k]
+
+
+def test_top_k_with_nan_returns_k_indices():
+    assert top_k(np.array([np.nan, 1.0, 2.0]), 2).tolist() == [2, 1]
+    assert top_k(np.array([np.nan, 1.0, np.nan]), 3).tolist() == [1, 0, 2]
+    assert top_k(np.array([np.nan, np.nan]), 1).tolist() == [0]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_top_k_matches_sorted(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 60))
+    # few distinct values, so that the k-th value is often tied.
+    values = rng.integers(0, int(rng.integers(1, 8)), n).astype(float)
+    values[rng.random(n) < 0.1] = np.nan
+    tiebreak = rng.permutation(n * 3)[:n]
+    for k in (0, 1, 3, n // 2, n, n + 2):
+        assert top_k(values, k).tolist() == _top_k_sorted(values, k)
+        assert top_k(values, k, tiebreak).tolist() == _top_k_sorted(values, k, tiebreak.tolist())
+        if not np.isnan(values).any():
+            assert top_k(values.astype(np.int64), k).tolist() == _top_k_sorted(values, k)
+
+
+def _time_slot_trans_loop(num, st, interval, intdate, tz=None):
+    """ The original one-slot Time_Slot_Trans, the reference of slot_labels (given a time zone,
+    the wall-clock time of st is taken there). Its week unit raised an IndexError.
+    """
+
+    if tz is None:
+        Time_Slot_dt = datetime.datetime.fromtimestamp(st / 1000)
+    else:
+        Time_Slot_dt = datetime.datetime.fromtimestamp(st / 1000, ZoneInfo(tz)).replace(tzinfo=None)
+    Time_Slot_dt = Time_Slot_dt + datetime.timedelta(seconds=num * interval / 1000)
+    Time_Slot = Time_Slot_dt.strftime('%Y, %m, %d, %I, %p, %M, %S, %f').split(',')
+    month_list = [0, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'July', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+    if intdate == 'season':
+        sea, mon = divmod(int(Time_Slot[1]), 3)
+        if mon > 0:
+            sea += 1
+        return 'Q' + str(sea) + ' ' + Time_Slot[0]
+    elif intdate == 'year':
+        return str(Time_Slot[0])
+    elif intdate == 'month':
+        return month_list[int(Time_Slot[1])] + ', ' + str(Time_Slot[0])
+    elif intdate == 'day':
+        return month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ', ' + str(Time_Slot[0])
+    elif intdate == 'hour':
+        return (month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(str(Time_Slot[3]))
+                + ' ' + Time_Slot[4] + ', ' + str(Time_Slot[0]))
+    elif intdate == 'minute':
+        return (month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(str(Time_Slot[3]))
+                + ':' + str(Time_Slot[5]) + '' + Time_Slot[4] + ', ' + str(Time_Slot[0]))
+    elif intdate == 'second':
+        return (month_list[int(Time_Slot[1])] + str(Date_judge_str(Time_Slot[2])) + ',' + Time_judge_str(str(Time_Slot[3]))
+                + ':' + str(Time_Slot[5]) + ':' + str(Time_Slot[6]) + Time_Slot[4] + ', ' + str(Time_Slot[0]))
+
+
+_slot_ms = {'second': 1000, 'minute': 60 * 1000, 'hour': 3600 * 1000, 'day': 86400 * 1000,
+            'month': 30 * 86400 * 1000, 'season': 91 * 86400 * 1000, 'year': 365 * 86400 * 1000}
+
+
+@pytest.mark.parametrize('tz', [None, 'UTC', 'America/New_York', 'Asia/Kolkata'])
+@pytest.mark.parametrize('unit', sorted(_slot_ms))
+def test_slot_labels_match_time_slot_trans(unit, tz):
+    rng = np.random.default_rng(len(unit))
+    for _ in range(5):
+        start = int(rng.integers(631152000, 1893456000)) * 1000 + int(rng.integers(0, 1000))
+        # whole and fractional slot lengths (in ms), with up to 1% jitter.
+        interval = _slot_ms[unit] * float(rng.choice([1.0, 1.0 + rng.random() / 100]))
+        n = int(rng.integers(1, 80))
+        labels = slot_labels(start, interval, unit, n, tz)
+        assert labels.tolist() == [_time_slot_trans_loop(i, start, interval, unit, tz) for i in range(n)]
+        # a shorter run is served from the memoized labels.
+        assert slot_labels(start, interval, unit, n // 2, tz).tolist() == labels[:n // 2].tolist()
+
+
+def test_slot_labels_week():
+    # weeks start on Monday: 2016-12-01 was a Thursday and 2017-01-01 a Sunday, so the 5th of
+    # January is in the 2nd week of the month.
+    start = int(datetime.datetime(2016, 12, 1, tzinfo=ZoneInfo('UTC')).timestamp() * 1000)
+    labels = slot_labels(start, 7 * 86400 * 1000, 'week', 6, 'UTC').tolist()
+    assert labels == ['the 1st week of Dec, 2016', 'the 2nd week of Dec, 2016', 'the 3rd week of Dec, 2016',
+                      'the 4th week of Dec, 2016', 'the 5th week of Dec, 2016', 'the 2nd week of Jan, 2017']
+
+    # week_of_month of the original code, for the weeks it could not word.
+    rng = np.random.default_rng(0)
+    for day in rng.integers(0, 20000, 50).tolist():
+        dt = datetime.datetime(1990, 1, 1) + datetime.timedelta(days=day)
+        week = int(ceil((dt.day + dt.replace(day=1).weekday()) / 7.0))
+        start = int(dt.replace(tzinfo=ZoneInfo('UTC')).timestamp() * 1000)
+        label = slot_labels(start, 86400 * 1000, 'week', 1, 'UTC')[0]
+        assert label.startswith('the %d' % week)
+
+
+@pytest.mark.parametrize('n', [1, 2, 7, 50, 51])
+def test_median_and_mad_batch_match_the_single_series(n):
+    rng = np.random.default_rng(n)
+    # ties, a spike (an outlier) and a column with a NaN.
+    points = rng.integers(0, 5, (n, 6)).astype(float)
+    points[0, 1] = 1000.0
+    points[n // 2, 5] = np.nan
+    np.testing.assert_array_equal(_median(points), np.median(points, axis=0))
+
+    # a zero MAD (mostly equal values) divides by zero in both.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mask = mad_based_outlier_batch(points)
+        for j in range(points.shape[1]):
+            assert np.array_equal(mask[:, j], mad_based_outlier(points[:, j]))
+
+
+def _ranks(values, estimate):
+    """ The range of ranks estimate takes among values: the number below it, and at or below it.
+    """
+
+    values = np.sort(values)
+    return np.searchsorted(values, estimate, side='left'), np.searchsorted(values, estimate, side='right')
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_streaming_mad_within_its_rank_error(seed):
+    rng = np.random.default_rng(seed)
+    stream = np.concatenate([rng.normal(10, 2, 150000), rng.exponential(5, 50000), rng.integers(0, 3, 30000)])
+    rng.shuffle(stream)
+    sketch = StreamingMAD(k=512)
+    for chunk in np.array_split(stream, 97):
+        sketch.update(chunk)
+    n = stream.shape[0]
+    e = sketch.rank_error()
+    assert len(sketch) == n and 0 < e < n / 20
+    assert sum(level.shape[0] for level in sketch.levels) < 512 * len(sketch.levels)
+
+    below, at_most = _ranks(stream, sketch.median())
+    assert below <= n / 2 + e and at_most >= n / 2 - e
+    below, at_most = _ranks(np.abs(stream - sketch.median()), sketch.mad())
+    assert below <= n / 2 + 2 * e and at_most >= n / 2 - 2 * e
+
+
+def test_streaming_mad_is_exact_before_compacting():
+    values = np.random.default_rng(0).normal(size=300)
+    values[7] = 40.0
+    sketch = StreamingMAD(k=512).update(values[:100]).update(values[100:])
+    assert sketch.rank_error() == 0
+    assert sketch.median() == np.median(values)
+    assert sketch.mad() == np.median(np.abs(values - np.median(values)))
+    assert np.array_equal(sketch.outliers(values), mad_based_outlier(values))
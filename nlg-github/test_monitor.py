@@ -0,0 +1,66 @@
+import json
+import numpy as np
+import pytest
+from json_methods import _periodogram, mk_test
+from json_monitor import Monitor, RollingTrends
+
+
+def _feed(bins, topics, seed):
+    """ Counts (topics x bins, few distinct values so that there are ties) and sentiments; the
+    last topic only appears after a third of the bins.
+    """
+
+    rng = np.random.default_rng(seed)
+    count = rng.integers(0, 6, (topics, bins)).astype(float) + np.sin(np.arange(bins) * 2 * np.pi / 6).round()
+    count = np.abs(count)
+    count[-1, :bins // 3] = 0
+    sentiment = rng.integers(-3, 4, (topics, bins)).astype(float)
+    sentiment[-1, :bins // 3] = 0
+    return count, sentiment
+
+
+@pytest.mark.parametrize('window', [8, 13])
+def test_rolling_trends_match_the_window(window):
+    count, sentiment = _feed(5 * window + 3, 3, window)
+    trends = RollingTrends(window)
+    for b in range(count.shape[1]):
+        present = [i for i in range(count.shape[0]) if i < count.shape[0] - 1 or b >= count.shape[1] // 3]
+        trends.update(dict((i, count[i, b]) for i in present), dict((i, sentiment[i, b]) for i in present))
+        if trends.bins < window:
+            continue
+
+        # row 0 is the total, then the topics seen so far (with no documents before they appear).
+        x = count[:, b + 1 - window:b + 1]
+        x = np.vstack([np.sum(x, axis=0), x[present]])
+        y = sentiment[:, b + 1 - window:b + 1]
+        y = np.vstack([np.sum(y, axis=0), y[present]])
+
+        # the incremental Mann-Kendall S and ties against the test on the window.
+        words, p = trends.trend()
+        for row in range(x.shape[0]):
+            result, h, expected_p, z = mk_test(x[row], alpha=0.5)
+            assert words[row].endswith(result)
+            assert p[row] == pytest.approx(expected_p, abs=1e-9)
+
+        # the sliding DFT against the periodogram of the window (2 |X_k|^2 / m below the Nyquist bin).
+        freq, power = _periodogram(x)
+        k = np.arange(2, (window + 1) // 2)
+        np.testing.assert_allclose(2 * np.abs(trends.dft[:, k]) ** 2 / window, power[:, k], rtol=1e-8, atol=1e-8)
+
+        np.testing.assert_allclose(trends.average_sentiment(), np.sum(y, axis=1) / np.sum(x, axis=1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            expected_r = [np.corrcoef(row, x[0])[0, 1] for row in x]
+        np.testing.assert_allclose(trends.correlation(), expected_r, rtol=1e-9, atol=1e-9)
+
+
+def test_monitor_skips_bad_lines():
+    monitor = Monitor(window=4, interval=3600000, tz='UTC')
+    lines = [json.dumps({'bucket_start': 1480974900000 + i * 3600000,
+                         'bins': [{'topic_id': 0, 'c': i % 3 + 1, 'p': 1, 'n': 0}]}) for i in range(6)]
+    bad = [lines[0][:20], 'garbage', '{"bins": [{"topic_id": 0}]}', '[]', '{"bucket_start": 0, "bins": 7}']
+    facts = []
+    for line in lines[:2] + bad + lines[2:]:
+        facts.extend(monitor.feed(line))
+    assert monitor.skipped == len(bad)
+    assert monitor.trends.bins == len(lines)
+    assert facts
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+import json_parallel
+from json_methods import pearson_to, time_series_analysis
+from json_parallel import topic_analysis
+from json_synthetic import temporal_widget
+
+
+def _matrices(widget):
+    bins = widget['bins']
+    count, positive, negative = [np.array([elm[field] for elm in bins], dtype=float) for field in 'cpn']
+    sumx = np.sum(count, axis=0)
+    sumx = sumx[np.nonzero(sumx)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sumsentx = np.sum(np.divide(negative + positive, count), axis=0)
+    sumsentx[np.isnan(sumsentx)] = 0
+    sumsentx = sumsentx[np.nonzero(sumsentx)] / sumx
+    return count, positive, negative, sumx, sumsentx
+
+
+@pytest.mark.parametrize('ranges', [None, 3])
+def test_topic_analysis_matches_serial(ranges):
+    # 7 topics in 3 ranges (or 8 ranges of at most one topic): the ranges are uneven.
+    count, positive, negative, sumx, sumsentx = _matrices(temporal_widget(topics=7, slots=96, seed=6))
+    status, count_r, sent_r = topic_analysis(count, positive, negative, 'hour', sumx, sumsentx, workers=2,
+                                             ranges=ranges)
+
+    series = [x[np.nonzero(x)] for x in count]
+    assert status == [time_series_analysis(x, 'hour') for x in series]
+    assert np.array_equal(count_r, pearson_to(series, sumx), equal_nan=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sent = np.divide(negative + positive, count)
+    expected = pearson_to([s[np.nonzero(x)] / x[np.nonzero(x)] for s, x in zip(sent, count)], sumsentx)
+    assert np.array_equal(sent_r, expected, equal_nan=True)
+
+
+def test_shared_memory_is_unlinked_when_a_worker_raises(monkeypatch):
+    count, positive, negative, sumx, sumsentx = _matrices(temporal_widget(topics=4, slots=48, seed=6))
+    count[2] = 0
+    count[2, 5] = 1  # a series of one value: time_series_analysis raises in the worker
+
+    created = []
+
+    class Recorded(json_parallel.SharedMatrices):
+        def __init__(self, **matrices):
+            super().__init__(**matrices)
+            created.extend(block_name for block_name, shape in self.specs.values())
+
+    monkeypatch.setattr(json_parallel, 'SharedMatrices', Recorded)
+    with pytest.raises(ValueError):
+        topic_analysis(count, positive, negative, 'hour', sumx, sumsentx, workers=2)
+    assert len(created) == 3
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,35 @@
+import pytest
+from json_render import add_locale, compiled, lists, render, templates
+
+
+def test_external_templates_are_not_evaluated():
+    # quotes, backslashes and code in a template are only text.
+    locale = dict(templates['en'], space="\\'); __import__('os').system('false') #\n",
+                  keyword_share="{keyword} {share:.1%} \"{keyword}\"")
+    add_locale('test', locale)
+    assert all(isinstance(parts, list) for parts in compiled('test').sentences.values())
+
+    facts = [('space', {}), ('keyword_share', {'keyword': "it's", 'share': 0.25})]
+    assert render(facts, 'test') == "\\'); __import__('os').system('false') #\n\n" + "it's 25.0% \"it's\"\n"
+
+
+@pytest.mark.parametrize('template, message', [
+    ('{keyword!r}', 'list conversions'),
+    ('{keyword!s}', 'list conversions'),
+    ('{keyword!a}', 'list conversions'),
+    ('{keyword.upper}', 'not a name'),
+    ('{keyword[0]}', 'not a name'),
+    ('{0}', 'not a name'),
+    ('{}', 'not a name'),
+    ('{share:{width}}', 'nested field'),
+    ('{keyword', 'keyword_share'),
+])
+def test_unsupported_fields_are_rejected(template, message):
+    add_locale('test', dict(templates['en'], keyword_share=template))
+    with pytest.raises(ValueError, match=message):
+        compiled('test')
+
+
+def test_conversions_of_the_locale_are_accepted():
+    add_locale('test', dict(templates['en'], keyword_share='{keywords!r}'), dict(lists['en'], r=' / '.join))
+    assert render([('keyword_share', {'keywords': ['a', 'b']})], 'test') == 'a / b\n'
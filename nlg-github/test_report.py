@@ -0,0 +1,67 @@
+import io
+import os
+import pytest
+import json_process_sementic_topics_alpha as semantic
+import json_process_tempral_trend_func_version as temporal
+from json_cache import ResultCache
+from json_process_sementic_topics_alpha import SemanticTopicReport
+from json_profile import Profiler
+from json_stream import loads_fields
+from json_synthetic import semantic_widget, temporal_widget
+
+
+@pytest.fixture(scope='module')
+def widget_text():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'categories.json')) as f:
+        return f.readline()
+
+
+def test_cache_hit_skips_parsing_and_tables(widget_text, monkeypatch):
+    cache = ResultCache()
+    text = SemanticTopicReport(widget_text, cache=cache, tz='UTC').text
+    assert text == SemanticTopicReport(loads_fields(widget_text), tz='UTC').text
+
+    def fail(*args):
+        raise AssertionError('the widget was analyzed again')
+
+    for name in ('loads_fields', 'TopicTable', 'RegionTable'):
+        monkeypatch.setattr(semantic, name, fail)
+    # the same text, with its line end or not, is found before it is parsed.
+    assert SemanticTopicReport(widget_text.strip(), cache=cache, tz='UTC').text == text
+    assert cache.stats()['hits'] == 1
+
+
+def test_sketch_builds_no_vocabulary(monkeypatch):
+    widget = semantic_widget(topics=12, slots=30, buzzwords=20, vocabulary=500, seed=4)
+    exact = SemanticTopicReport(widget, tz='UTC')
+    sketched = SemanticTopicReport(widget, tz='UTC', sketch_capacity=1000)
+    assert sketched.table.terms is None
+    # with more counters than terms the sketch is exact, and the other sections are exact anyway.
+    assert [(row['term'], row['weighted_count']) for row in sketched.buzzwords] == \
+        [(row['term'], row['weighted_count']) for row in exact.buzzwords]
+    for name in ('summary', 'proportion', 'sentiment', 'geo', 'temporal'):
+        assert getattr(sketched, name) == getattr(exact, name)
+
+    timebin = temporal_widget(topics=8, slots=40, vocabulary=3000, seed=4)
+
+    def facts(**kwargs):
+        return temporal.temp_trend_facts(len(timebin['bins']), 40, timebin['bucket_start'], timebin['bucket_end'],
+                                         timebin['interval'], timebin, tz='UTC', **kwargs)
+
+    expected = facts()
+
+    def fail(*args):
+        raise AssertionError('the vocabulary of the widget was built')
+
+    monkeypatch.setattr(temporal, 'TermMatrix', fail)
+    assert facts(sketch_capacity=100000) == expected
+
+
+def test_temp_trend_stages_are_recorded_once():
+    timebin = temporal_widget(topics=5, slots=48, seed=1)
+    profiler = Profiler(memory=False)
+    with profiler:
+        temporal.temp_trend_widget(timebin, out=io.StringIO(), topic_pairs=2, tz='UTC')
+    stages = profiler.report()['stages']
+    for name in ('keywords', 'correlation', 'topic_pairs', 'sentiment_correlation'):
+        assert stages['temp_trend/' + name]['calls'] == 1
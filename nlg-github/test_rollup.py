@@ -0,0 +1,65 @@
+import datetime
+import pytest
+from json_methods import _tzinfo
+from json_rollup import Pyramid
+from json_synthetic import temporal_widget
+
+
+# the start of the bucket of every unit, from the wall-clock time of a slot.
+_keys = {
+    'day': lambda t: datetime.datetime(t.year, t.month, t.day),
+    'week': lambda t: datetime.datetime(t.year, t.month, t.day) - datetime.timedelta(days=t.weekday()),
+    'month': lambda t: datetime.datetime(t.year, t.month, 1),
+    'season': lambda t: datetime.datetime(t.year, t.month - (t.month - 1) % 3, 1),
+    'year': lambda t: datetime.datetime(t.year, 1, 1),
+}
+
+
+def _rebin(widget, tz, unit):
+    """ The buckets of unit over the hourly slots of widget, summed slot by slot.
+    """
+
+    begin = datetime.datetime.fromtimestamp(widget['bucket_start'] / 1000, _tzinfo(tz)).replace(tzinfo=None)
+    keys = [_keys[unit](begin + datetime.timedelta(hours=j)) for j in range(len(widget['bins'][0]['c']))]
+    starts = sorted(set(keys))
+    index = dict((key, i) for i, key in enumerate(starts))
+
+    bins = []
+    for elm in widget['bins']:
+        sums = dict((field, [0] * len(starts)) for field in ('c', 'p', 'n'))
+        terms = [{} for _ in starts]
+        for j, key in enumerate(keys):
+            for field in sums:
+                sums[field][index[key]] += elm[field][j]
+            for term in elm['terms'][j]:
+                terms[index[key]][term['text']] = terms[index[key]].get(term['text'], 0) + term['c']
+        bins.append(dict(sums, terms=terms))
+    ms = [widget['bucket_start'] + (key - begin) // datetime.timedelta(milliseconds=1) for key in starts]
+    return ms, bins
+
+
+@pytest.mark.parametrize('tz', ['UTC', 'America/New_York'])
+def test_levels_are_rebinned_sums_of_the_slots(tz):
+    # 400 days of hours, so that every unit has several buckets and the ends are partial.
+    widget = temporal_widget(topics=3, slots=24 * 400, terms_per_slot=2, seed=5)
+    pyramid = Pyramid(widget, tz=tz)
+    assert pyramid.units == ['day', 'week', 'month', 'season', 'year']
+
+    for unit in pyramid.units:
+        level = pyramid[unit]
+        starts, bins = _rebin(widget, tz, unit)
+        assert level['bucket_starts'] == starts
+        for elm, expected in zip(level['bins'], bins):
+            for field in ('c', 'p', 'n'):
+                assert elm[field] == expected[field]
+            assert [dict((term['text'], term['c']) for term in terms) for terms in elm['terms']] == expected['terms']
+            assert all(terms[i]['c'] >= terms[i + 1]['c'] for terms in elm['terms'] for i in range(len(terms) - 1))
+        for field in ('sum_c', 'sum_p', 'sum_n'):
+            assert level[field] == widget[field]
+
+
+def test_no_level_at_or_below_the_unit_of_the_widget():
+    pyramid = Pyramid(temporal_widget(topics=2, slots=48, seed=1), tz='UTC')
+    assert 'hour' not in pyramid
+    with pytest.raises(KeyError):
+        pyramid['hour']
@@ -0,0 +1,63 @@
+import http.client
+import os
+import threading
+import time
+import pytest
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer
+from json_service import NarrationService, make_handler
+
+
+@pytest.fixture(scope='module')
+def widget():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'categories.json')) as f:
+        return f.readline()
+
+
+@pytest.fixture
+def service():
+    service = NarrationService(workers=1, max_pending=1, timeout=0.001)
+    yield service
+    service.shutdown()
+
+
+def test_timed_out_job_keeps_its_slot(service, widget):
+    with pytest.raises(FutureTimeout):
+        service.narrate(widget, 'semantic')
+    # the job still runs in the pool, so the service is saturated until it is done.
+    assert service.narrate(widget, 'semantic') is None
+    deadline = time.time() + 60
+    while not service.slots.acquire(blocking=False):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    service.slots.release()
+
+
+def _post(port, headers, body=b''):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.putrequest('POST', '/narrate/semantic')
+    for key, value in headers:
+        connection.putheader(key, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    status = response.status
+    response.read()
+    connection.close()
+    return status
+
+
+def test_status_codes(service, widget):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+    try:
+        assert _post(port, []) == 411
+        assert _post(port, [('Content-Length', 'many')]) == 400
+        assert _post(port, [('Content-Length', '-5')]) == 400
+        assert _post(port, [('Content-Length', '1')], b'\xff') == 400
+        body = widget.encode('utf-8')
+        assert _post(port, [('Content-Length', str(len(body)))], body) == 504
+    finally:
+        server.shutdown()
+        server.server_close()
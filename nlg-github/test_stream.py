@@ -0,0 +1,25 @@
+import json
+import pytest
+from json_stream import TIMEBIN_FIELDS, loads_fields
+
+
+timebin = {'bucket_start': 1480974900000, 'bucket_end': 1481014500000, 'interval': 3600000, 'skipped': [{'a': [1]}],
+           'bins': [{'c': [1, 2], 'p': [1, 0], 'n': [0, -1], 'terms': [[{'text': 'a b', 'c': 1}], None]}]}
+
+
+def test_loads_fields_keeps_selected_fields():
+    expected = dict((key, value) for key, value in timebin.items() if key != 'skipped')
+    assert loads_fields(json.dumps(timebin), TIMEBIN_FIELDS) == expected
+
+
+@pytest.mark.parametrize('text', ['', ' ', '[{"c":1', '{"bins": [', '{"bins": [{"c": [1, 2', '{"interval"', '[1,'])
+def test_loads_fields_truncated(text):
+    with pytest.raises(ValueError):
+        loads_fields(text)
+
+
+def test_loads_fields_every_truncation():
+    text = json.dumps(timebin)
+    for end in range(len(text)):
+        with pytest.raises(ValueError):
+            loads_fields(text[:end], TIMEBIN_FIELDS)